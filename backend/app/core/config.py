@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 
 
@@ -16,10 +16,98 @@ class Settings(BaseSettings):
     # Agent settings
     DEFAULT_AGENT_COUNT: int = 3
     A2A_DISCUSSION_ROUNDS: int = 2
+    A2A_DISCUSSION_PLAN: str = "rounds"  # "rounds" or "pipelined"
+    A2A_PARALLEL_ROUNDS: bool = False  # agents in a round answer the previous round concurrently, not each other
+    A2A_EARLY_STOP_ENABLED: bool = False  # skip remaining rounds once responses stop changing
+    A2A_CONVERGENCE_THRESHOLD: float = 0.95  # mean cosine similarity between consecutive rounds
+    A2A_DUPLICATE_THRESHOLD: float = 0.9  # word-set Jaccard similarity treated as a repeat
+    A2A_INCREMENTAL_SYNTHESIS: bool = False  # fold messages into a running synthesis as they are saved
+    A2A_SYNTHESIS_UPDATE_FRAMES: bool = True  # send the running synthesis to clients as it changes
+    AGENT_CONCURRENCY_LIMIT: int = 3  # concurrent agent calls per discussion
+    DISCUSSION_MAX_CONCURRENT: int = 4  # discussions running at once across all threads
+    DISCUSSION_MAX_QUEUED: int = 100  # discussions waiting across all threads
+    DISCUSSION_MAX_QUEUED_PER_THREAD: int = 5
+    DISCUSSION_DRAIN_TIMEOUT: float = 30.0  # seconds to let discussions finish on shutdown
+    DISCUSSION_CANCEL_POLICY: str = "never"  # "supersede", "no_listeners" or "never"
+    DISCUSSION_NO_LISTENERS_GRACE: float = 10.0  # seconds for a client to reconnect before cancelling
+    
+    # MCP backend settings
+    MCP_BACKEND_ENABLED: bool = False  # simulate agent responses when off
+    MCP_API_BASE: str = "http://localhost:8001/mcp"
+    MCP_API_BASES: List[str] = []  # several backends to spread over; MCP_API_BASE when empty
+    MCP_HTTP2: bool = False  # requires the optional h2 package
+    MCP_MAX_CONNECTIONS: int = 100
+    MCP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    MCP_KEEPALIVE_EXPIRY: float = 30.0  # seconds an idle connection stays pooled
+    MCP_CONNECT_TIMEOUT: float = 5.0  # seconds
+    MCP_READ_TIMEOUT: float = 60.0  # seconds
+    MCP_MAX_RETRIES: int = 3
+    MCP_RETRY_BACKOFF: float = 0.2  # seconds, doubled per attempt before jitter
+    MCP_RETRY_MAX_BACKOFF: float = 5.0  # seconds
+    MCP_MODEL: str = "default"
+    MCP_TEMPERATURE: float = 0.0
+    MCP_BATCHING_ENABLED: bool = False  # coalesce concurrent requests into /batch calls
+    MCP_BATCH_MAX_SIZE: int = 8
+    MCP_BATCH_MAX_WAIT: float = 0.01  # seconds the first request of a batch waits for others
+    MCP_HEDGING_ENABLED: bool = False  # duplicate slow requests to a second backend
+    MCP_HEDGE_PERCENTILE: float = 0.95  # hedge once a request is slower than this share of recent ones
+    MCP_HEDGE_MIN_SAMPLES: int = 20  # latencies needed before the percentile is trusted
+    MCP_HEDGE_DELAY: float = 1.0  # seconds before hedging until then
+    MCP_BREAKER_WINDOW: int = 50  # recent requests a backend's health is judged on
+    MCP_BREAKER_MIN_REQUESTS: int = 10
+    MCP_BREAKER_ERROR_RATE: float = 0.5  # eject a backend failing this share of requests
+    MCP_BREAKER_MAX_LATENCY: float = 10.0  # or answering slower than this median; 0 disables
+    MCP_BREAKER_COOLDOWN: float = 30.0  # seconds before an ejected backend gets a trial request
+    
+    # Backend rate limiting, by call priority; 0 disables a limit
+    BACKEND_RATE_LIMIT_ENABLED: bool = False
+    BACKEND_RATE_LIMIT_QPS: float = 10.0
+    BACKEND_RATE_LIMIT_BURST: int = 10
+    BACKEND_RATE_LIMIT_MAX_CONCURRENT: int = 8
+    
+    # Response cache settings
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024  # in-memory tier
+    RESPONSE_CACHE_TTL: float = 24 * 60 * 60  # seconds; 0 keeps entries forever
+    RESPONSE_CACHE_DIR: Optional[str] = None  # on-disk tier, disabled when unset
+    RESPONSE_CACHE_DISK_MAX_ENTRIES: int = 10000  # on-disk tier; oldest files are evicted beyond it, 0 for no cap
+    RESPONSE_CACHE_SAMPLED: bool = False  # also cache generations with MCP_TEMPERATURE > 0
+    
+    # Prompt budget settings
+    PROMPT_BUDGET_ENABLED: bool = False  # cut prompts to a token budget; lossy, older messages keep only their first words
+    PROMPT_TOKENIZER: str = "approximate"  # or "tiktoken", if installed
+    PROMPT_TOKEN_BUDGET: int = 2048  # tokens per prompt
+    PROMPT_ROLE_BUDGETS: Dict[str, int] = {}  # per-role overrides, e.g. {"synthesis": 4096}
+    PROMPT_TEMPLATE_SHARE: float = 0.25  # most of the budget the role template may take
+    PROMPT_MESSAGE_SHARE: float = 0.25  # most of the budget the user message may take
+    PROMPT_CONTEXT_SHARE: float = 0.5  # of the rest, when the prompt also has history
+    PROMPT_MIN_DOCUMENT_TOKENS: int = 32  # documents that would be cut shorter are dropped
+    PROMPT_SUMMARY_SHARE: float = 0.25  # of the history budget, kept for the summary of older messages
+    PROMPT_SUMMARY_WORDS: int = 25  # words kept per older message; the rest is cut, not summarized
     
     # RAG settings
     VECTOR_DIMENSION: int = 768
     MAX_CONTEXT_DOCUMENTS: int = 5
+    ROLE_RETRIEVAL_ENABLED: bool = False  # each agent gets context searched for its role
+    ROLE_RETRIEVAL_PER_ROUND: bool = True  # search again every discussion round
+    ROLE_RETRIEVAL_RECENT_MESSAGES: int = 3  # latest messages a round's queries include
+    
+    # Search settings
+    SEARCH_DEFAULT_LIMIT: int = 20
+    SEARCH_MAX_LIMIT: int = 100
+    
+    # Conversation memory settings
+    MESSAGE_EMBEDDING_ENABLED: bool = True
+    MESSAGE_EMBEDDING_SYNTHESES_ONLY: bool = False
+    MESSAGE_EMBEDDING_BATCH_SIZE: int = 64
+    MESSAGE_EMBEDDING_FLUSH_INTERVAL: float = 1.0  # seconds
+    SYNTHESIS_MEMORY_ENABLED: bool = False
+    SYNTHESIS_MEMORY_MAX_RESULTS: int = 2
+    SYNTHESIS_MEMORY_MIN_SCORE: float = 0.6  # cosine similarity
+    
+    # Archive settings
+    ARCHIVE_EXPORT_CHUNK_LINES: int = 500
+    ARCHIVE_IMPORT_BATCH_SIZE: int = 1000
     
     # Authentication placeholder
     AUTH_ENABLED: bool = False
@@ -28,6 +116,13 @@ class Settings(BaseSettings):
     
     # WebSocket settings
     WS_PING_INTERVAL: float = 20.0  # seconds
+    WS_SEND_TIMEOUT: float = 5.0  # seconds
+    WS_OUTBOUND_QUEUE_SIZE: int = 256  # frames per connection
+    WS_SLOW_CONSUMER_POLICY: str = "drop"  # "drop", "coalesce" or "disconnect"
+    WS_PER_MESSAGE_DEFLATE: bool = True  # negotiated with clients that offer it
+    WS_RESUME_BUFFER_SIZE: int = 200  # recent messages kept per thread for reconnects
+    WS_RESUME_PAGE_SIZE: int = 500  # messages per catch-up frame when reading storage
+    WS_DELTA_INTERVAL: float = 0.05  # seconds between message_delta frames of a streamed message
     
     class Config:
         case_sensitive = True
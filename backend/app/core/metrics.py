@@ -0,0 +1,28 @@
+from typing import Dict, Any, Callable
+from collections import defaultdict
+
+
+class Metrics:
+    """Process-wide counters and gauges exposed by the metrics endpoint"""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, Callable[[], Any]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        """Add to a counter"""
+        self.counters[name] += value
+
+    def register_gauge(self, name: str, read: Callable[[], Any]):
+        """Register a callable that reports a current value"""
+        self.gauges[name] = read
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current value of every counter and gauge"""
+        return {
+            "counters": dict(self.counters),
+            "gauges": {name: read() for name, read in self.gauges.items()}
+        }
+
+
+metrics = Metrics()
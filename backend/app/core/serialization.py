@@ -0,0 +1,53 @@
+from typing import Any
+from datetime import datetime
+from enum import Enum
+import json
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+MSGPACK_AVAILABLE = msgpack is not None
+
+
+def _default(obj: Any) -> Any:
+    """Encode types the JSON encoders do not handle natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def packb(obj: Any) -> bytes:
+    """Serialize to MessagePack bytes; requires the optional msgpack package"""
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(obj, default=_default)
+
+
+def pack_map_header(size: int) -> bytes:
+    """MessagePack header for a map with the given number of entries"""
+    return msgpack.Packer().pack_map_header(size)
+
+
+def pack_array_header(size: int) -> bytes:
+    """MessagePack header for an array with the given number of items"""
+    return msgpack.Packer().pack_array_header(size)
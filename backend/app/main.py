@@ -1,16 +1,36 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import json
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union, Tuple, AsyncIterator
 
 from app.services.agent.agent_manager import AgentManager
+from app.services.agent.convergence import ConvergenceDetector
+from app.services.agent.discussion_plan import DiscussionExecutor, build_plan
+from app.services.agent.transcript import DiscussionTranscript
+from app.services.agent.rate_limiter import call_thread
+from app.services.agent.discussion_scheduler import (
+    DiscussionScheduler,
+    DiscussionRejected,
+    DiscussionCancelPolicy,
+    CancelReason
+)
 from app.services.chat.thread_manager import ThreadManager
+from app.services.chat.archive import ThreadArchive, ArchiveFormatError
+from app.services.chat.connection_manager import ConnectionManager
+from app.services.chat.frames import Frame, FrameEncoding, message_frame, history_frame, catchup_frame
+from app.services.chat.resume_buffer import ResumeBuffer
+from app.services.chat.message_stream import MessageStream
 from app.services.rag.knowledge_retrieval import KnowledgeRetrieval
+from app.services.rag.role_retrieval import RoleContextRetriever
+from app.services.rag.message_embeddings import MessageEmbeddingIndex
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.serialization import MSGPACK_AVAILABLE
 from app.schemas.chat import ChatMessage, ThreadCreate, AgentMessage
-from app.schemas.agent import AgentRole
+from app.schemas.agent import AgentRole, AgentTurn, TurnKind
 
 app = FastAPI(
     title="Multi-Agent Collaborative AI Chat Platform",
@@ -30,15 +50,33 @@ app.add_middleware(
 # Initialize services
 agent_manager = AgentManager()
 thread_manager = ThreadManager()
+thread_archive = ThreadArchive(thread_manager)
+resume_buffer = ResumeBuffer(thread_manager)
+thread_manager.add_message_listener(resume_buffer.append)
+thread_manager.add_delete_listener(resume_buffer.remove_thread)
 knowledge_retrieval = KnowledgeRetrieval()
+message_index = MessageEmbeddingIndex(knowledge_retrieval)
+thread_manager.add_message_listener(message_index.enqueue)
+thread_manager.add_delete_listener(message_index.remove_thread)
+
+# Active websocket connections, grouped by thread
+connection_manager = ConnectionManager()
 
-# Store active connections
-active_connections: Dict[str, WebSocket] = {}
+# Agent discussions, run with a global concurrency cap and queued fairly per thread
+discussion_scheduler = DiscussionScheduler()
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     await knowledge_retrieval.initialize()
+    message_index.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background services on shutdown"""
+    await discussion_scheduler.drain()
+    await message_index.stop()
+    await agent_manager.mcp_client.close()
 
 @app.get("/")
 async def root():
@@ -56,19 +94,60 @@ async def create_thread(thread_data: ThreadCreate):
     # Initialize agents for this thread
     await agent_manager.initialize_agents(thread_id, prompt_templates)
     
+    thread = await thread_manager.get_thread(thread_id)
     return {
         "thread_id": thread_id,
         "topic": thread_data.topic,
-        "created_at": thread_manager.get_thread(thread_id).created_at,
-        "prompt_templates": prompt_templates
+        "created_at": thread.created_at,
+        "prompt_templates": dict(prompt_templates)
     }
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Runtime metrics such as websocket queue depths"""
+    return metrics.snapshot()
+
 @app.get("/api/threads")
 async def list_threads():
     """List all discussion threads"""
     threads = await thread_manager.list_threads()
     return {"threads": threads}
 
+@app.get("/api/threads/export")
+async def export_threads(thread_id: Optional[List[str]] = Query(None)):
+    """Stream threads and their messages as NDJSON"""
+    if thread_id:
+        for requested_id in thread_id:
+            if requested_id not in thread_manager.threads:
+                raise HTTPException(status_code=404, detail=f"Thread {requested_id} not found")
+    
+    return StreamingResponse(
+        thread_archive.export_ndjson(thread_id),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/api/threads/import")
+async def import_threads(request: Request):
+    """Import threads and messages from a streamed NDJSON archive"""
+    created_threads: List[str] = []
+    try:
+        result = await thread_archive.import_ndjson(request.stream(), created_threads)
+    except ArchiveFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        # Imported threads get agents like newly created ones, including
+        # those created before a failed import stopped
+        for thread_id in created_threads:
+            thread = await thread_manager.get_thread(thread_id)
+            prompt_templates = await agent_manager.generate_prompt_templates(thread.topic)
+            await agent_manager.initialize_agents(thread_id, prompt_templates)
+    
+    return {
+        "threads": len(result["created_threads"]),
+        "messages": result["messages"],
+        "skipped_messages": result["skipped_messages"]
+    }
+
 @app.get("/api/threads/{thread_id}")
 async def get_thread(thread_id: str):
     """Get a specific thread and its messages"""
@@ -79,30 +158,147 @@ async def get_thread(thread_id: str):
         "messages": messages
     }
 
+@app.delete("/api/threads/{thread_id}")
+async def delete_thread(thread_id: str):
+    """Delete a thread and free everything held for it
+    
+    Connected clients are disconnected and the thread's discussions are
+    cancelled before its messages, indexes and agents are dropped. To
+    archive a thread, export it first.
+    """
+    if thread_id not in thread_manager.threads:
+        raise HTTPException(status_code=404, detail=f"Thread {thread_id} not found")
+    
+    await connection_manager.close_thread(thread_id)
+    await discussion_scheduler.close_thread(thread_id)
+    await thread_manager.delete_thread(thread_id)
+    agent_manager.release_thread(thread_id)
+    
+    return {"thread_id": thread_id, "deleted": True}
+
+@app.get("/api/search")
+async def search_messages(
+    q: str,
+    thread_id: Optional[str] = None,
+    sender_id: Optional[str] = None,
+    limit: int = Query(settings.SEARCH_DEFAULT_LIMIT, ge=1, le=settings.SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0)
+):
+    """Full-text search over message content across threads"""
+    results = await thread_manager.search_messages(
+        q,
+        thread_id=thread_id,
+        sender_id=sender_id,
+        limit=limit,
+        offset=offset
+    )
+    return {
+        "query": q,
+        "total": results["total"],
+        "limit": limit,
+        "offset": offset,
+        "hits": results["hits"]
+    }
+
+@app.get("/api/search/semantic")
+async def semantic_search_messages(
+    q: str,
+    thread_id: Optional[str] = None,
+    syntheses_only: bool = False,
+    limit: int = Query(settings.SEARCH_DEFAULT_LIMIT, ge=1, le=settings.SEARCH_MAX_LIMIT)
+):
+    """Search conversation history by meaning rather than exact terms"""
+    hits = await message_index.search(
+        q,
+        max_results=limit,
+        thread_id=thread_id,
+        syntheses_only=syntheses_only
+    )
+    return {
+        "query": q,
+        "hits": hits
+    }
+
+def negotiate_encoding(websocket: WebSocket) -> Tuple[str, Optional[str]]:
+    """Pick the frame encoding from the "msgpack" subprotocol or ?encoding= parameter
+    
+    Returns the encoding and the subprotocol to accept. Clients asking for
+    MessagePack get JSON if msgpack is not installed on the server.
+    """
+    if "msgpack" in websocket.scope.get("subprotocols", []):
+        if MSGPACK_AVAILABLE:
+            return FrameEncoding.MSGPACK, "msgpack"
+        return FrameEncoding.JSON, None
+    
+    if websocket.query_params.get("encoding") == FrameEncoding.MSGPACK and MSGPACK_AVAILABLE:
+        return FrameEncoding.MSGPACK, None
+    
+    return FrameEncoding.JSON, None
+
+def resume_position(websocket: WebSocket, thread_id: str) -> Optional[int]:
+    """Sequence number a reconnecting client has seen up to, if it sent one
+    
+    Clients resume with ?since_seq=<seq> or ?last_message_id=<id>.
+    """
+    since_seq = websocket.query_params.get("since_seq")
+    if since_seq is not None:
+        try:
+            return max(int(since_seq), 0)
+        except ValueError:
+            return None
+    
+    last_message_id = websocket.query_params.get("last_message_id")
+    if last_message_id:
+        return thread_manager.find_seq(thread_id, last_message_id)
+    
+    return None
+
 @app.websocket("/ws/{thread_id}")
 async def websocket_endpoint(websocket: WebSocket, thread_id: str):
-    """WebSocket endpoint for real-time chat"""
-    await websocket.accept()
+    """WebSocket endpoint for real-time chat
+    
+    Server frames are JSON text by default, or binary MessagePack when the
+    client negotiates it. Client messages are always JSON text.
+    
+    New clients receive the full thread history. Clients resuming with a
+    cursor only receive the messages they missed as thread_catchup frames.
+    """
+    encoding, subprotocol = negotiate_encoding(websocket)
+    await websocket.accept(subprotocol=subprotocol)
     
     # Store the connection
-    connection_id = f"{thread_id}_{id(websocket)}"
-    active_connections[connection_id] = websocket
+    connection = connection_manager.connect(thread_id, websocket, encoding)
     
     try:
-        # Send thread history to the client
         thread = await thread_manager.get_thread(thread_id)
-        messages = await thread_manager.get_messages(thread_id)
-        await websocket.send_json({
-            "type": "thread_history",
-            "thread": thread.dict(),
-            "messages": [msg.dict() for msg in messages]
-        })
+        after_seq = resume_position(websocket, thread_id)
+        
+        if after_seq is None:
+            # Send thread history to the client, reusing each message's cached JSON
+            connection.enqueue(history_frame(
+                thread,
+                thread_manager.iter_message_records(thread_id),
+                thread_manager.last_seq(thread_id)
+            ))
+        else:
+            # Send only what the client missed since its cursor
+            for records, last_seq, complete in resume_buffer.catchup(thread_id, after_seq):
+                connection.enqueue(catchup_frame(records, last_seq, complete))
         
         while True:
             # Receive message from client
             data = await websocket.receive_text()
             message_data = json.loads(data)
             
+            # Refuse new discussions while the scheduler is saturated
+            supersede = settings.DISCUSSION_CANCEL_POLICY == DiscussionCancelPolicy.SUPERSEDE
+            if not discussion_scheduler.has_capacity(thread_id, supersede):
+                connection.enqueue(Frame.from_dict({
+                    "type": "error",
+                    "error": "Too many discussions in progress, please try again shortly"
+                }))
+                continue
+            
             # Create user message
             user_message = ChatMessage(
                 thread_id=thread_id,
@@ -113,138 +309,213 @@ async def websocket_endpoint(websocket: WebSocket, thread_id: str):
             )
             
             # Save user message
-            saved_message = await thread_manager.add_message(user_message)
+            record = await thread_manager.store_message(user_message)
             
             # Broadcast user message to all clients in this thread
-            await broadcast_to_thread(thread_id, {
-                "type": "new_message",
-                "message": saved_message.dict()
-            })
+            await broadcast_to_thread(thread_id, message_frame(record))
             
-            # Process with agents using A2A protocol
-            asyncio.create_task(process_with_agents(thread_id, saved_message))
+            # Process with agents using A2A protocol, once a discussion slot is free
+            submit_discussion(thread_id, user_message, supersede)
             
     except WebSocketDisconnect:
+        pass
+    finally:
         # Remove the connection
-        if connection_id in active_connections:
-            del active_connections[connection_id]
+        connection_manager.disconnect(thread_id, connection.connection_id)
+        
+        # Stop discussions nobody is listening to, unless a client reconnects in time
+        if (
+            settings.DISCUSSION_CANCEL_POLICY == DiscussionCancelPolicy.NO_LISTENERS
+            and connection_manager.connection_count(thread_id) == 0
+        ):
+            asyncio.get_running_loop().call_later(
+                settings.DISCUSSION_NO_LISTENERS_GRACE,
+                cancel_unwatched_discussions,
+                thread_id
+            )
+
+def submit_discussion(thread_id: str, user_message: ChatMessage, supersede: bool = False):
+    """Schedule the agent discussion for a user message
+    
+    While the discussion waits for a slot, the thread's clients receive
+    discussion_status frames with its queue position, then "running"
+    once it starts, or "cancelled". With supersede, the thread's earlier
+    discussions are cancelled in favour of this one.
+    """
+    def notify(position: Optional[int]):
+        if position is None:
+            status = "cancelled"
+        else:
+            status = "queued" if position else "running"
+        connection_manager.publish(thread_id, {
+            "type": "discussion_status",
+            "message_id": user_message.id,
+            "status": status,
+            "position": position
+        }, coalesce_key=("discussion_status", user_message.id))
+    
+    try:
+        discussion_scheduler.submit(
+            thread_id,
+            lambda: process_with_agents(thread_id, user_message),
+            notify,
+            supersede=supersede
+        )
+    except DiscussionRejected:
+        # Capacity was checked before saving the message, but a shutdown may have started since
+        connection_manager.publish(thread_id, {
+            "type": "error",
+            "error": "The server is not accepting discussions right now"
+        })
+
+def cancel_unwatched_discussions(thread_id: str):
+    """Cancel a thread's discussions if no client has reconnected to it"""
+    if connection_manager.connection_count(thread_id) == 0:
+        discussion_scheduler.cancel_thread(thread_id, CancelReason.NO_LISTENERS)
 
-async def broadcast_to_thread(thread_id: str, message: Dict[str, Any]):
+async def broadcast_to_thread(thread_id: str, message: Union[Frame, Dict[str, Any]]):
     """Broadcast a message to all clients in a thread"""
-    for conn_id, websocket in active_connections.items():
-        if conn_id.startswith(f"{thread_id}_"):
-            try:
-                await websocket.send_json(message)
-            except Exception:
-                # Connection might be closed
-                if conn_id in active_connections:
-                    del active_connections[conn_id]
+    await connection_manager.broadcast(thread_id, message)
 
 async def process_with_agents(thread_id: str, user_message: ChatMessage):
     """Process user message with agents using A2A protocol"""
-    # Get relevant context using RAG
-    context = await knowledge_retrieval.retrieve_context(user_message.content)
+    # Backend calls made for this discussion share the thread's turns at the rate limiter
+    call_thread.set(thread_id)
+    
+    # Reuse conclusions from earlier discussions on similar questions
+    memory = []
+    if settings.SYNTHESIS_MEMORY_ENABLED:
+        memory = await message_index.retrieve_syntheses(user_message.content)
     
     # Get agents for this thread
     agents = await agent_manager.get_thread_agents(thread_id)
     
-    # Start agent discussion
-    discussion_messages = []
-    
-    # Initial agent responses
-    for agent in agents:
-        # Use MCP to provide context to agent
-        agent_response = await agent_manager.get_agent_response(
-            agent_id=agent.id,
-            thread_id=thread_id,
-            user_message=user_message,
-            context=context
-        )
-        
-        # Save agent message
-        agent_message = ChatMessage(
-            thread_id=thread_id,
-            sender_type="agent",
-            sender_id=agent.id,
-            content=agent_response.content,
-            parent_id=user_message.id,
-            metadata={"role": agent.role}
-        )
-        
-        saved_message = await thread_manager.add_message(agent_message)
-        discussion_messages.append(saved_message)
-        
-        # Broadcast agent message
-        await broadcast_to_thread(thread_id, {
-            "type": "new_message",
-            "message": saved_message.dict()
-        })
+    agents_by_id = {agent.id: agent for agent in agents}
+    
+    # Optionally stop the rounds early once responses stop changing
+    detector = ConvergenceDetector(knowledge_retrieval) if settings.A2A_EARLY_STOP_ENABLED else None
+    
+    # Each finished message is formatted once for the prompts of later turns
+    transcript = DiscussionTranscript()
+    
+    # Get relevant context using RAG, shared by every agent or searched per role
+    role_contexts = None
+    if settings.ROLE_RETRIEVAL_ENABLED:
+        role_contexts = RoleContextRetriever(knowledge_retrieval, agents, user_message.content, transcript, memory)
+    else:
+        context = await knowledge_retrieval.retrieve_context(user_message.content) + memory
+    
+    # Optionally keep a running synthesis, so the final one is ready soon after the last round
+    synthesizer = None
+    if settings.A2A_INCREMENTAL_SYNTHESIS:
+        def publish_synthesis(summary: str, folded: int):
+            if settings.A2A_SYNTHESIS_UPDATE_FRAMES:
+                connection_manager.publish(thread_id, {
+                    "type": "synthesis_update",
+                    "message_id": user_message.id,
+                    "content": summary,
+                    "folded": folded
+                }, coalesce_key=("synthesis_update", user_message.id))
         
-        # Small delay for UI rendering
-        await asyncio.sleep(0.5)
-    
-    # Agent-to-Agent discussion rounds
-    for round_num in range(settings.A2A_DISCUSSION_ROUNDS):
-        for agent in agents:
-            # Get all previous messages in this discussion
-            previous_messages = discussion_messages.copy()
-            
-            # Use A2A protocol for agent-to-agent communication
-            agent_response = await agent_manager.get_agent_discussion_response(
-                agent_id=agent.id,
+        synthesizer = agent_manager.incremental_synthesizer(publish_synthesis)
+    
+    async def turn_context(turn: AgentTurn) -> List[Dict[str, Any]]:
+        """Context documents for an agent's turn"""
+        if role_contexts is None:
+            return context
+        return await role_contexts.context_for(turn.agent_id, turn.round)
+    
+    async def run_turn(turn: AgentTurn, inputs: List[ChatMessage]) -> Optional[ChatMessage]:
+        """Generate one turn of the plan, streaming it to the thread's clients"""
+        if turn.kind == TurnKind.RESPONSE:
+            agent = agents_by_id[turn.agent_id]
+            message = ChatMessage(
                 thread_id=thread_id,
-                previous_messages=previous_messages,
-                context=context
+                sender_type="agent",
+                sender_id=agent.id,
+                content="",
+                parent_id=user_message.id,
+                metadata={"role": agent.role}
             )
-            
-            # Save agent message
-            agent_message = ChatMessage(
+            # Use MCP to provide context to agent
+            chunks = agent_manager.stream_agent_response(
+                agent_id=agent.id,
+                user_message=user_message,
+                context=await turn_context(turn)
+            )
+        elif not inputs:
+            # Nothing to discuss or summarize if every earlier turn failed
+            return None
+        elif turn.kind == TurnKind.DISCUSSION:
+            agent = agents_by_id[turn.agent_id]
+            message = ChatMessage(
                 thread_id=thread_id,
                 sender_type="agent",
                 sender_id=agent.id,
-                content=agent_response.content,
-                parent_id=previous_messages[-1].id,
+                content="",
+                parent_id=inputs[-1].id,
                 metadata={
                     "role": agent.role,
-                    "round": round_num + 1
+                    "round": turn.round
                 }
             )
-            
-            saved_message = await thread_manager.add_message(agent_message)
-            discussion_messages.append(saved_message)
-            
-            # Broadcast agent message
-            await broadcast_to_thread(thread_id, {
-                "type": "new_message",
-                "message": saved_message.dict()
-            })
-            
-            # Small delay for UI rendering
-            await asyncio.sleep(0.5)
+            # Use A2A protocol for agent-to-agent communication
+            chunks = agent_manager.stream_discussion_response(
+                agent_id=agent.id,
+                previous_messages=inputs,
+                context=await turn_context(turn),
+                transcript=transcript
+            )
+        else:
+            message = ChatMessage(
+                thread_id=thread_id,
+                sender_type="system",
+                sender_id="synthesis",
+                content="",
+                parent_id=inputs[-1].id,
+                metadata={"type": "synthesis"}
+            )
+            if synthesizer is not None:
+                chunks = synthesizer.stream_final(inputs)
+            else:
+                chunks = agent_manager.stream_synthesis(inputs, transcript)
+        
+        await stream_message(message, chunks)
+        transcript.append(message)
+        if synthesizer is not None and turn.kind != TurnKind.SYNTHESIS:
+            synthesizer.add(message)
+        return message
     
-    # Final synthesis
-    synthesis = await agent_manager.generate_synthesis(
-        thread_id=thread_id,
-        discussion_messages=discussion_messages
-    )
+    async def round_complete(round_num: int, round_messages: List[ChatMessage]) -> bool:
+        """Whether to skip the remaining rounds"""
+        converged = await detector.observe(round_messages)
+        return converged and round_num < settings.A2A_DISCUSSION_ROUNDS
     
-    # Save synthesis message
-    synthesis_message = ChatMessage(
-        thread_id=thread_id,
-        sender_type="system",
-        sender_id="synthesis",
-        content=synthesis,
-        parent_id=discussion_messages[-1].id,
-        metadata={"type": "synthesis"}
-    )
+    # Run the discussion plan; each turn starts once the turns it reads are done
+    plan = build_plan(settings.A2A_DISCUSSION_PLAN, agents, settings.A2A_DISCUSSION_ROUNDS)
+    executor = DiscussionExecutor(plan, run_turn, round_complete if detector else None)
+    try:
+        await executor.run()
+    finally:
+        if synthesizer is not None:
+            await synthesizer.close()
     
-    saved_synthesis = await thread_manager.add_message(synthesis_message)
+    if executor.stop_after_round is not None:
+        metrics.increment("discussions.early_stops")
+        metrics.increment("discussions.rounds_saved", executor.skipped_rounds)
+
+async def stream_message(message: ChatMessage, chunks: AsyncIterator[str]):
+    """Stream generated text to the thread's clients, then save and broadcast the message
     
-    # Broadcast synthesis
-    await broadcast_to_thread(thread_id, {
-        "type": "new_message",
-        "message": saved_synthesis.dict()
-    })
+    The message's content is filled in once the stream is complete.
+    """
+    return await MessageStream(thread_manager, connection_manager, message).relay(chunks)
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE
+    )
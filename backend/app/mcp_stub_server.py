@@ -0,0 +1,158 @@
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+import uvicorn
+import asyncio
+import json
+import os
+import random
+from typing import Dict, List, Optional
+
+from app.services.agent.streaming import split_tokens
+
+
+class StubProfile(BaseModel):
+    """Latency and error behaviour of the stub MCP server"""
+    latency: float = 0.0  # seconds before the first token
+    latency_jitter: float = 0.0  # extra random seconds added to latency
+    token_interval: float = 0.0  # seconds between streamed tokens
+    stall_rate: float = 0.0  # share of requests delayed by stall, for a heavy latency tail
+    stall: float = 0.0  # extra seconds before the first token of a stalled request
+    error_rate: float = 0.0  # share of requests answered with error_status
+    error_status: int = 503
+    fail_first: int = 0  # fail this many requests before any succeed
+    retry_after: Optional[float] = None  # Retry-After header sent with errors
+
+
+PROFILES: Dict[str, StubProfile] = {
+    "instant": StubProfile(),
+    "realistic": StubProfile(latency=0.4, latency_jitter=0.3, token_interval=0.02),
+    "stalling": StubProfile(latency=0.2, latency_jitter=0.1, token_interval=0.02, stall_rate=0.02, stall=3.0),
+    "flaky": StubProfile(latency=0.2, latency_jitter=0.2, token_interval=0.01, error_rate=0.2),
+    "overloaded": StubProfile(latency=1.5, latency_jitter=1.0, token_interval=0.05, error_rate=0.3, error_status=429, retry_after=1.0),
+}
+
+
+class GenerateRequest(BaseModel):
+    """Schema for a generation request"""
+    kind: str
+    prompt: str
+    role: Optional[str] = None
+    stream: bool = False
+    model: Optional[str] = None
+    temperature: float = 0.0
+
+
+class BatchRequest(BaseModel):
+    """Schema for a batch of generation requests, answered together"""
+    requests: List[GenerateRequest]
+    stream: bool = False
+
+
+def stub_response(request: GenerateRequest) -> str:
+    """Deterministic text for a request, long enough to stream in several chunks"""
+    speaker = (request.role or request.kind).capitalize()
+    last_line = request.prompt.strip().splitlines()[-1] if request.prompt.strip() else ""
+    return f"{speaker} stub response about: {last_line[:120]} [{request.kind}]"
+
+
+def create_app(profile: Optional[StubProfile] = None, seed: Optional[int] = None) -> FastAPI:
+    """
+    Stub MCP server for tests and benchmarks
+    
+    Serves POST /mcp/generate with the latency and errors of the given
+    profile, as JSON or, for streaming requests, NDJSON deltas.
+    POST /mcp/batch answers several requests for the latency of one, as a
+    batched inference server would; streamed batches interleave deltas
+    tagged with each request's index.
+    """
+    profile = profile or PROFILES["instant"]
+    rng = random.Random(seed)
+    app = FastAPI(title="Stub MCP Server")
+    app.state.requests = 0
+    app.state.batches = 0
+
+    def error_response() -> Optional[JSONResponse]:
+        """Error to inject for this request, if any"""
+        app.state.requests += 1
+        if app.state.requests <= profile.fail_first or rng.random() < profile.error_rate:
+            headers = {"Retry-After": str(profile.retry_after)} if profile.retry_after is not None else None
+            return JSONResponse({"error": "injected failure"}, status_code=profile.error_status, headers=headers)
+        return None
+
+    def first_token_delay() -> float:
+        """Seconds before a request's first token"""
+        delay = profile.latency + rng.random() * profile.latency_jitter
+        if rng.random() < profile.stall_rate:
+            delay += profile.stall
+        return delay
+
+    @app.get("/mcp/health")
+    async def health():
+        return {"status": "ok", "requests": app.state.requests}
+
+    @app.post("/mcp/generate")
+    async def generate(request: GenerateRequest):
+        error = error_response()
+        if error is not None:
+            return error
+
+        await asyncio.sleep(first_token_delay())
+        content = stub_response(request)
+
+        if not request.stream:
+            # Non-streaming responses arrive after the whole generation time
+            await asyncio.sleep(profile.token_interval * len(split_tokens(content)))
+            return {"content": content}
+
+        async def stream():
+            for index, token in enumerate(split_tokens(content)):
+                if index:
+                    await asyncio.sleep(profile.token_interval)
+                yield json.dumps({"delta": token}) + "\n"
+            yield json.dumps({"done": True}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/mcp/batch")
+    async def batch(request: BatchRequest):
+        error = error_response()
+        if error is not None:
+            return error
+        app.state.batches += 1
+
+        await asyncio.sleep(first_token_delay())
+        tokens = [split_tokens(stub_response(item)) for item in request.requests]
+        steps = max((len(item_tokens) for item_tokens in tokens), default=0)
+
+        if not request.stream:
+            # The batch takes as long as its longest generation
+            await asyncio.sleep(profile.token_interval * steps)
+            return {"responses": [{"content": "".join(item_tokens)} for item_tokens in tokens]}
+
+        async def stream():
+            # Each step produces the next token of every unfinished request
+            for step in range(steps):
+                if step:
+                    await asyncio.sleep(profile.token_interval)
+                for index, item_tokens in enumerate(tokens):
+                    if step < len(item_tokens):
+                        yield json.dumps({"index": index, "delta": item_tokens[step]}) + "\n"
+                    elif step == len(item_tokens):
+                        yield json.dumps({"index": index, "done": True}) + "\n"
+            for index, item_tokens in enumerate(tokens):
+                if len(item_tokens) == steps:
+                    yield json.dumps({"index": index, "done": True}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+if __name__ == "__main__":
+    # python -m app.mcp_stub_server; pick a profile with MCP_STUB_PROFILE
+    uvicorn.run(
+        create_app(PROFILES[os.environ.get("MCP_STUB_PROFILE", "realistic")]),
+        host="0.0.0.0",
+        port=int(os.environ.get("MCP_STUB_PORT", "8001"))
+    )
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, Any, List
 from enum import Enum
 import uuid
@@ -14,6 +14,21 @@ class AgentRole(str, Enum):
     GENERALIST = "generalist"
 
 
+class RoleDefinition(BaseModel):
+    """Schema for a role shared by every agent that plays it"""
+    model_config = ConfigDict(frozen=True)
+    
+    role: AgentRole
+    name: str
+    description: str
+    prompt_template: str  # with a {topic} placeholder
+    retrieval_focus: str = ""  # what the role looks for in the knowledge base
+    
+    def render(self, topic: str) -> str:
+        """Prompt template for an agent discussing a topic"""
+        return self.prompt_template.format(topic=topic)
+
+
 class Agent(BaseModel):
     """Schema for an agent"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -29,3 +44,19 @@ class AgentResponse(BaseModel):
     content: str
     confidence: float = 1.0
     metadata: Dict[str, Any] = {}
+
+
+class TurnKind(str, Enum):
+    """Enum for the kinds of turn in a discussion plan"""
+    RESPONSE = "response"  # first answer to the user message, via MCP
+    DISCUSSION = "discussion"  # reply to other agents, via A2A
+    SYNTHESIS = "synthesis"  # final summary of the discussion
+
+
+class AgentTurn(BaseModel):
+    """Schema for one turn in a discussion plan"""
+    id: str
+    kind: TurnKind
+    agent_id: Optional[str] = None  # None for the synthesis
+    round: Optional[int] = None  # 0 for first responses, None for the synthesis
+    reads: List[str] = []  # ids of earlier turns whose messages this turn sees
@@ -0,0 +1,17 @@
+import uvicorn
+
+from app.core.config import settings
+
+
+def main():
+    """Run the API server with the uvicorn options taken from settings"""
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE
+    )
+
+
+if __name__ == "__main__":
+    main()
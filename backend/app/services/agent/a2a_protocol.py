@@ -1,23 +1,31 @@
-from typing import List, Dict, Any
-import asyncio
+from typing import List, Dict, Any, AsyncIterator, Iterable, Iterator, Optional, Tuple
 import json
 
 from app.schemas.agent import Agent
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+from app.services.agent.mcp_client import MCPClient
+from app.services.agent.prompt_assembler import summarize_line
 
 
 class A2AProtocol:
     """Implementation of Agent-to-Agent (A2A) protocol"""
     
-    def __init__(self):
-        # In a real implementation, this would connect to actual agent services
-        # For now, we'll simulate the A2A functionality
-        pass
+    # Most recent messages an agent sees when it joins a discussion
+    DISCUSSION_WINDOW = 5
+    
+    def __init__(self, mcp_client: Optional[MCPClient] = None):
+        # Discussion turns go through the MCP client, which uses its pooled
+        # connections when MCP_BACKEND_ENABLED is set, simulates otherwise,
+        # and serves repeated prompts from its response cache
+        self.mcp_client = mcp_client or MCPClient()
     
     async def process_discussion(
         self,
         agent: Agent,
         messages: List[Dict[str, Any]],
-        context: List[Dict[str, Any]]
+        context: List[Dict[str, Any]],
+        bypass_cache: bool = False
     ) -> str:
         """
         Process a discussion between agents using A2A protocol
@@ -27,42 +35,134 @@ class A2AProtocol:
         # In a real implementation, this would facilitate actual agent-to-agent communication
         # For now, we'll simulate the discussion processing
         
-        # Extract the most recent messages (up to 5)
-        recent_messages = messages[-5:] if len(messages) > 5 else messages
+        # Extract the most recent messages (up to 5), summarizing earlier ones
+        history, older = self._history(messages)
         
-        # Format messages for the agent
-        formatted_messages = self._format_messages(recent_messages)
+        return await self.process_history_discussion(agent, history, context, older, bypass_cache)
+    
+    async def process_history_discussion(
+        self,
+        agent: Agent,
+        history: List[Tuple[str, str]],
+        context: List[Dict[str, Any]],
+        older: Iterable[str] = (),
+        bypass_cache: bool = False
+    ) -> str:
+        """
+        Process a discussion given its recent messages in formatted form
         
-        # Simulate processing delay
-        await asyncio.sleep(0.3)
+        history holds (formatted message, summary line) pairs, oldest first;
+        older yields summary lines of earlier messages, newest first.
+        """
+        formatted_messages = "".join(entry for entry, _ in history)
+        return await self.mcp_client.complete(
+            "discussion",
+            self._discussion_prompt(agent, history, older, context),
+            agent.role.value,
+            # Generate a simulated response based on the agent's role and previous messages
+            simulate=lambda: self._simulate_discussion_response(agent, formatted_messages, context),
+            simulated_delay=0.3,
+            bypass_cache=bypass_cache
+        )
+    
+    def stream_discussion(
+        self,
+        agent: Agent,
+        messages: List[Dict[str, Any]],
+        context: List[Dict[str, Any]],
+        bypass_cache: bool = False
+    ) -> AsyncIterator[str]:
+        """Stream an agent's discussion response as text chunks"""
+        history, older = self._history(messages)
         
-        # Generate a simulated response based on the agent's role and previous messages
-        response = self._simulate_discussion_response(agent, formatted_messages, context)
+        return self.stream_history_discussion(agent, history, context, older, bypass_cache)
+    
+    def stream_history_discussion(
+        self,
+        agent: Agent,
+        history: List[Tuple[str, str]],
+        context: List[Dict[str, Any]],
+        older: Iterable[str] = (),
+        bypass_cache: bool = False
+    ) -> AsyncIterator[str]:
+        """Stream a discussion response given its recent messages in formatted form"""
+        formatted_messages = "".join(entry for entry, _ in history)
+        return self.mcp_client.stream_complete(
+            "discussion",
+            self._discussion_prompt(agent, history, older, context),
+            agent.role.value,
+            simulate=lambda: self._simulate_discussion_response(agent, formatted_messages, context),
+            simulated_delay=0.3,
+            bypass_cache=bypass_cache
+        )
+    
+    def _history(self, messages: List[Dict[str, Any]]) -> Tuple[List[Tuple[str, str]], Iterator[str]]:
+        """The recent-message window as history pairs, and summary lines of earlier messages"""
+        window = messages[-self.DISCUSSION_WINDOW:]
+        history = [(self.format_message(msg), self.summarize_message(msg)) for msg in window]
+        older = (self.summarize_message(messages[i]) for i in range(len(messages) - len(window) - 1, -1, -1))
+        return history, older
+    
+    def _discussion_prompt(
+        self,
+        agent: Agent,
+        history: List[Tuple[str, str]],
+        older: Iterable[str],
+        context: List[Dict[str, Any]]
+    ) -> str:
+        """Prompt asking an agent to continue the discussion, within its token budget"""
+        if settings.PROMPT_BUDGET_ENABLED:
+            parts = self.mcp_client.assembler.assemble(
+                agent.role.value,
+                agent.prompt_template,
+                context=context,
+                history=history,
+                older=older
+            )
+            return f"{parts.template}\n\nDiscussion so far:\n{parts.history}Context:\n{parts.context_text}"
         
-        return response
+        formatted_messages = "".join(entry for entry, _ in history)
+        context_str = "\n".join(f"- {item.get('content', 'No content')}" for item in context)
+        return f"{agent.prompt_template}\n\nDiscussion so far:\n{formatted_messages}Context:\n{context_str}"
     
     def _format_messages(self, messages: List[Dict[str, Any]]) -> str:
         """Format messages for agent consumption"""
-        formatted = ""
+        return "".join(self.format_message(msg) for msg in messages)
+    
+    @staticmethod
+    def speaker(msg: Dict[str, Any]) -> str:
+        """Name a message's sender is shown with"""
+        sender_type = msg.get("sender_type", "unknown")
         
-        for msg in messages:
-            sender_type = msg.get("sender_type", "unknown")
-            sender_id = msg.get("sender_id", "unknown")
-            content = msg.get("content", "")
-            
-            if sender_type == "user":
-                formatted += f"User: {content}\n\n"
-            elif sender_type == "agent":
-                # Try to get role from metadata
-                role = "Agent"
-                if "metadata" in msg and "role" in msg["metadata"]:
-                    role = msg["metadata"]["role"].capitalize()
-                
-                formatted += f"{role}: {content}\n\n"
-            else:
-                formatted += f"{sender_type.capitalize()}: {content}\n\n"
-        
-        return formatted
+        if sender_type == "user":
+            return "User"
+        elif sender_type == "agent":
+            # Try to get role from metadata
+            if "metadata" in msg and "role" in msg["metadata"]:
+                return msg["metadata"]["role"].capitalize()
+            return "Agent"
+        else:
+            return sender_type.capitalize()
+    
+    @staticmethod
+    def message_dict(message: ChatMessage) -> Dict[str, Any]:
+        """The fields of a chat message the protocol reads"""
+        return {
+            "content": message.content,
+            "sender_id": message.sender_id,
+            "sender_type": message.sender_type,
+            "metadata": message.metadata
+        }
+    
+    @classmethod
+    def format_message(cls, msg: Dict[str, Any]) -> str:
+        """Format one message for agent consumption"""
+        return f"{cls.speaker(msg)}: {msg.get('content', '')}\n\n"
+    
+    @classmethod
+    def summarize_message(cls, msg: Dict[str, Any]) -> str:
+        """One-line digest of a message for the summary of older history"""
+        return summarize_line(cls.speaker(msg), msg.get("content", ""))
     
     def _simulate_discussion_response(
         self,
@@ -98,14 +198,92 @@ class A2AProtocol:
         else:  # generalist
             return f"Considering all viewpoints shared about {topic}, I see merit in multiple approaches. We could synthesize these ideas by... [balanced contribution]"
     
-    async def generate_synthesis(self, messages: List[Dict[str, Any]]) -> str:
+    async def generate_synthesis(self, messages: List[Dict[str, Any]], bypass_cache: bool = False) -> str:
         """Generate a synthesis of the agent discussion"""
-        # In a real implementation, this would use a dedicated model or agent
-        # For now, we'll simulate the synthesis generation
+        history = [(self.format_message(msg), self.summarize_message(msg)) for msg in messages]
+        return await self.mcp_client.complete(
+            "synthesis",
+            self._synthesis_prompt(history),
+            simulate=lambda: self._simulate_synthesis(messages),
+            bypass_cache=bypass_cache
+        )
+    
+    def stream_synthesis(
+        self,
+        messages: List[Dict[str, Any]],
+        history: Optional[List[Tuple[str, str]]] = None,
+        bypass_cache: bool = False
+    ) -> AsyncIterator[str]:
+        """Stream a synthesis of the agent discussion as text chunks
+        
+        Pass history when the messages are already formatted, e.g. from a
+        discussion transcript.
+        """
+        if history is None:
+            history = [(self.format_message(msg), self.summarize_message(msg)) for msg in messages]
+        
+        return self.mcp_client.stream_complete(
+            "synthesis",
+            self._synthesis_prompt(history),
+            simulate=lambda: self._simulate_synthesis(messages),
+            bypass_cache=bypass_cache
+        )
+    
+    async def update_synthesis(
+        self,
+        summary: str,
+        messages: List[Dict[str, Any]],
+        bypass_cache: bool = False
+    ) -> str:
+        """Fold new discussion messages into a running synthesis"""
+        history = [(self.format_message(msg), self.summarize_message(msg)) for msg in messages]
+        
+        return await self.mcp_client.complete(
+            "synthesis_update",
+            self._synthesis_update_prompt(summary, history),
+            simulate=lambda: self._simulate_synthesis_update(summary, messages),
+            # An update reads only the new messages, so it is quicker than a full synthesis
+            simulated_delay=min(0.1 * len(messages), 0.5),
+            bypass_cache=bypass_cache
+        )
+    
+    def _synthesis_update_prompt(self, summary: str, history: List[Tuple[str, str]]) -> str:
+        """Prompt asking to revise a running synthesis with new messages"""
+        instructions = (
+            "Revise the running summary of this discussion to include the new messages. "
+            "Keep the key points, consensus view and next steps."
+        )
+        if settings.PROMPT_BUDGET_ENABLED:
+            # The summary is rewritten from this prompt, so it is never cut; the
+            # new messages fit in what it leaves, but keep at least a message share
+            assembler = self.mcp_client.assembler
+            budget = assembler.budget_for("synthesis")
+            reserved = min(
+                assembler.tokenizer.count(summary),
+                int(budget * (1 - settings.PROMPT_TEMPLATE_SHARE - settings.PROMPT_MESSAGE_SHARE))
+            )
+            parts = assembler.assemble("synthesis", instructions, history=history, reserved=reserved)
+            return f"{parts.template}\n\nRunning summary:\n{summary}\n\nNew messages:\n{parts.history}"
         
-        # Simulate processing delay
-        await asyncio.sleep(0.5)
+        return f"{instructions}\n\nRunning summary:\n{summary}\n\nNew messages:\n" + "".join(entry for entry, _ in history)
+    
+    def _synthesis_prompt(self, history: List[Tuple[str, str]]) -> str:
+        """Prompt asking for a synthesis of the whole discussion"""
+        instructions = "Summarize the key points, consensus view and next steps of this discussion."
+        if settings.PROMPT_BUDGET_ENABLED:
+            parts = self.mcp_client.assembler.assemble("synthesis", instructions, history=history)
+            return f"{parts.template}\n\n{parts.history}"
         
+        return f"{instructions}\n\n" + "".join(entry for entry, _ in history)
+    
+    def _simulate_synthesis_update(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        """Simulate revising a running synthesis: one key point per new message"""
+        if not summary:
+            summary = "# Discussion Summary\n\n## Key Points\n\n"
+        return summary + "".join(f"- {self.summarize_message(msg)}\n" for msg in messages)
+    
+    def _simulate_synthesis(self, messages: List[Dict[str, Any]]) -> str:
+        """Simulate a synthesis of the discussion"""
         # Count messages by role for simulation purposes
         role_counts = {}
         for msg in messages:
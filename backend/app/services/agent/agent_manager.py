@@ -1,89 +1,83 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Mapping
 import uuid
 import asyncio
 from datetime import datetime
 
 from app.schemas.agent import Agent, AgentRole, AgentResponse
 from app.schemas.chat import ChatMessage
-from app.core.config import settings
+from app.core.metrics import metrics
 from app.services.agent.mcp_client import MCPClient
 from app.services.agent.a2a_protocol import A2AProtocol
+from app.services.agent.transcript import DiscussionTranscript
+from app.services.agent.synthesizer import IncrementalSynthesizer
+from app.services.agent.roles import ROLE_DEFINITIONS, PromptTemplates, ThreadAgent, selected_roles
 
 
 class AgentManager:
     """Manager for AI agents in the platform"""
     
     def __init__(self):
-        self.agents: Dict[str, Agent] = {}
+        self.agents: Dict[str, ThreadAgent] = {}
         self.thread_agents: Dict[str, List[str]] = {}  # Maps thread_id to list of agent_ids
         self.mcp_client = MCPClient()
-        self.a2a_protocol = A2AProtocol()
+        self.a2a_protocol = A2AProtocol(self.mcp_client)
+        
+        metrics.register_gauge("agents.count", lambda: len(self.agents))
     
-    async def generate_prompt_templates(self, topic: str) -> Dict[AgentRole, str]:
-        """Generate prompt templates based on discussion topic"""
+    async def generate_prompt_templates(
+        self,
+        topic: str,
+        roles: Optional[List[AgentRole]] = None
+    ) -> PromptTemplates:
+        """Generate prompt templates based on discussion topic
+        
+        Only the given roles are included, by default those a new thread
+        uses. Templates are rendered from the shared role definitions when
+        read, not up front.
+        """
         # This would typically call an LLM to generate role-specific prompts
         # For now, using predefined templates with topic insertion
-        
-        templates = {
-            AgentRole.RESEARCHER: f"You are a research specialist focusing on {topic}. "
-                                 f"Your role is to provide factual information, cite sources, "
-                                 f"and ensure discussions are grounded in evidence. "
-                                 f"When contributing, focus on finding and sharing relevant information.",
-            
-            AgentRole.CRITIC: f"You are a critical thinker examining {topic}. "
-                             f"Your role is to identify potential issues, challenge assumptions, "
-                             f"and ensure logical consistency. "
-                             f"When contributing, focus on finding flaws or alternative perspectives.",
-            
-            AgentRole.CREATIVE: f"You are a creative thinker exploring {topic}. "
-                               f"Your role is to suggest novel approaches, make unexpected connections, "
-                               f"and think outside conventional boundaries. "
-                               f"When contributing, focus on innovative ideas and possibilities.",
-            
-            AgentRole.SUMMARIZER: f"You are a synthesis specialist for discussions about {topic}. "
-                                 f"Your role is to consolidate information, identify key points, "
-                                 f"and create coherent summaries. "
-                                 f"When contributing, focus on bringing together different perspectives.",
-            
-            AgentRole.ANALYST: f"You are an analytical expert examining {topic}. "
-                              f"Your role is to break down complex issues, identify patterns, "
-                              f"and provide structured analysis. "
-                              f"When contributing, focus on systematic evaluation of information.",
-            
-            AgentRole.GENERALIST: f"You are a generalist with broad knowledge about {topic}. "
-                                 f"Your role is to provide balanced perspectives, connect different domains, "
-                                 f"and ensure comprehensive coverage. "
-                                 f"When contributing, focus on integrating diverse viewpoints."
-        }
-        
-        return templates
+        return PromptTemplates(topic, roles if roles is not None else selected_roles())
     
-    async def initialize_agents(self, thread_id: str, prompt_templates: Dict[AgentRole, str]) -> List[Agent]:
-        """Initialize agents for a new thread based on prompt templates"""
-        # Select which agent roles to use for this thread
-        selected_roles = list(AgentRole)[:settings.DEFAULT_AGENT_COUNT]
+    async def initialize_agents(self, thread_id: str, prompt_templates: Mapping[AgentRole, str]) -> List[Agent]:
+        """Initialize agents for a new thread based on prompt templates
+        
+        Templates from generate_prompt_templates are kept as a reference to
+        the shared role definition plus the topic; any other mapping is
+        taken as custom templates and stored as given.
+        """
+        # Agents from an earlier initialization would otherwise be orphaned
+        self.release_thread(thread_id)
         
         thread_agents = []
-        for role in selected_roles:
+        for role in prompt_templates:
             agent_id = str(uuid.uuid4())
-            agent = Agent(
-                id=agent_id,
-                name=f"{role.value.capitalize()} Agent",
-                role=role,
-                description=f"Specialist in {role.value} thinking",
-                prompt_template=prompt_templates[role]
-            )
+            if isinstance(prompt_templates, PromptTemplates):
+                agent = ThreadAgent(agent_id, ROLE_DEFINITIONS[role], topic=prompt_templates.topic)
+            else:
+                agent = ThreadAgent(agent_id, ROLE_DEFINITIONS[role], template=prompt_templates[role])
             
             self.agents[agent_id] = agent
             thread_agents.append(agent_id)
         
         self.thread_agents[thread_id] = thread_agents
-        return [self.agents[agent_id] for agent_id in thread_agents]
+        return [self.agents[agent_id].to_agent() for agent_id in thread_agents]
+    
+    def release_thread(self, thread_id: str) -> int:
+        """Forget a thread's agents, e.g. when it is deleted; returns how many"""
+        agent_ids = self.thread_agents.pop(thread_id, [])
+        for agent_id in agent_ids:
+            self.agents.pop(agent_id, None)
+        return len(agent_ids)
+    
+    def get_agent(self, agent_id: str) -> Agent:
+        """Get an agent by ID"""
+        return self.agents[agent_id].to_agent()
     
     async def get_thread_agents(self, thread_id: str) -> List[Agent]:
         """Get all agents for a specific thread"""
         agent_ids = self.thread_agents.get(thread_id, [])
-        return [self.agents[agent_id] for agent_id in agent_ids]
+        return [self.agents[agent_id].to_agent() for agent_id in agent_ids]
     
     async def get_agent_response(
         self, 
@@ -93,7 +87,7 @@ class AgentManager:
         context: List[Dict[str, Any]]
     ) -> AgentResponse:
         """Get response from an agent using MCP"""
-        agent = self.agents[agent_id]
+        agent = self.get_agent(agent_id)
         
         # Use MCP to provide context to the agent
         response = await self.mcp_client.get_agent_response(
@@ -112,6 +106,19 @@ class AgentManager:
             }
         )
     
+    def stream_agent_response(
+        self,
+        agent_id: str,
+        user_message: ChatMessage,
+        context: List[Dict[str, Any]]
+    ) -> AsyncIterator[str]:
+        """Stream an agent's initial response to a user message as text chunks"""
+        return self.mcp_client.stream_agent_response(
+            agent=self.get_agent(agent_id),
+            user_message=user_message.content,
+            context=context
+        )
+    
     async def get_agent_discussion_response(
         self,
         agent_id: str,
@@ -120,18 +127,10 @@ class AgentManager:
         context: List[Dict[str, Any]]
     ) -> AgentResponse:
         """Get agent response in a discussion using A2A protocol"""
-        agent = self.agents[agent_id]
+        agent = self.get_agent(agent_id)
         
         # Format previous messages for A2A protocol
-        formatted_messages = [
-            {
-                "content": msg.content,
-                "sender_id": msg.sender_id,
-                "sender_type": msg.sender_type,
-                "metadata": msg.metadata
-            }
-            for msg in previous_messages
-        ]
+        formatted_messages = [A2AProtocol.message_dict(msg) for msg in previous_messages]
         
         # Use A2A protocol for agent-to-agent communication
         response = await self.a2a_protocol.process_discussion(
@@ -150,6 +149,29 @@ class AgentManager:
             }
         )
     
+    def stream_discussion_response(
+        self,
+        agent_id: str,
+        previous_messages: List[ChatMessage],
+        context: List[Dict[str, Any]],
+        transcript: Optional[DiscussionTranscript] = None
+    ) -> AsyncIterator[str]:
+        """Stream an agent's discussion response as text chunks
+        
+        With a transcript, the recent messages are rendered from their
+        stored formatted form instead of being formatted again.
+        """
+        if transcript is None:
+            transcript = DiscussionTranscript()
+        
+        history, older = transcript.history(previous_messages, last=A2AProtocol.DISCUSSION_WINDOW)
+        return self.a2a_protocol.stream_history_discussion(
+            agent=self.get_agent(agent_id),
+            history=history,
+            context=context,
+            older=older
+        )
+    
     async def generate_synthesis(
         self,
         thread_id: str,
@@ -157,17 +179,29 @@ class AgentManager:
     ) -> str:
         """Generate a synthesis of the agent discussion"""
         # Format messages for synthesis
-        formatted_messages = [
-            {
-                "content": msg.content,
-                "sender_id": msg.sender_id,
-                "sender_type": msg.sender_type,
-                "metadata": msg.metadata
-            }
-            for msg in discussion_messages
-        ]
+        formatted_messages = [A2AProtocol.message_dict(msg) for msg in discussion_messages]
         
         # Use a dedicated synthesizer (could be a specific agent or a separate model)
         synthesis = await self.a2a_protocol.generate_synthesis(formatted_messages)
         
         return synthesis
+    
+    def stream_synthesis(
+        self,
+        discussion_messages: List[ChatMessage],
+        transcript: Optional[DiscussionTranscript] = None
+    ) -> AsyncIterator[str]:
+        """Stream a synthesis of the agent discussion as text chunks"""
+        formatted_messages = [A2AProtocol.message_dict(msg) for msg in discussion_messages]
+        
+        return self.a2a_protocol.stream_synthesis(
+            formatted_messages,
+            transcript.history(discussion_messages)[0] if transcript is not None else None
+        )
+    
+    def incremental_synthesizer(
+        self,
+        on_update: Optional[Callable[[str, int], None]] = None
+    ) -> IncrementalSynthesizer:
+        """Running synthesis for one discussion, revised as its messages are saved"""
+        return IncrementalSynthesizer(self.a2a_protocol, on_update)
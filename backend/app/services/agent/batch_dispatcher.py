@@ -0,0 +1,185 @@
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Set
+import asyncio
+import json
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class BatchItemError(Exception):
+    """Raised to a caller whose request failed inside an otherwise successful batch"""
+
+
+class BatchItem:
+    """One request waiting in, or being served by, a batch"""
+
+    __slots__ = ("payload", "future", "queue", "abandoned")
+
+    def __init__(self, payload: Dict[str, Any], stream: bool):
+        self.payload = payload
+        # Non-streaming callers await the future; streaming callers read deltas from the queue
+        self.future: Optional[asyncio.Future] = None if stream else asyncio.get_running_loop().create_future()
+        self.queue: Optional[asyncio.Queue] = asyncio.Queue() if stream else None
+        self.abandoned = False
+
+    @property
+    def waiting(self) -> bool:
+        """Whether anyone still wants the result"""
+        if self.future is not None:
+            return not self.future.done()
+        return not self.abandoned
+
+
+class BatchDispatcher:
+    """Coalesces concurrent generation requests into batched backend calls
+
+    Requests arriving within MCP_BATCH_MAX_WAIT of the first pending one
+    are sent together, up to MCP_BATCH_MAX_SIZE per batch, as one POST to
+    the backend's /batch endpoint. Streaming and non-streaming requests
+    are batched separately. Batched responses are split back to their
+    callers: one content per request, or for streams NDJSON lines tagged
+    with the request's index.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any], bool], Awaitable[httpx.Response]],
+        max_batch_size: Optional[int] = None,
+        max_wait: Optional[float] = None
+    ):
+        # Posts a batch body and returns the response, retrying transient failures
+        self.send = send
+        self.max_batch_size = max_batch_size or settings.MCP_BATCH_MAX_SIZE
+        self.max_wait = max_wait if max_wait is not None else settings.MCP_BATCH_MAX_WAIT
+        self.pending: Dict[bool, List[BatchItem]] = {False: [], True: []}  # by stream flag
+        self._timers: Dict[bool, Optional[asyncio.TimerHandle]] = {False: None, True: None}
+        self._tasks: Set[asyncio.Task] = set()
+
+        metrics.register_gauge("mcp.batch_pending", lambda: sum(len(items) for items in self.pending.values()))
+
+    async def generate(self, payload: Dict[str, Any]) -> str:
+        """Complete a request as part of the next batch"""
+        item = BatchItem(payload, stream=False)
+        self._enqueue(False, item)
+        return await item.future
+
+    async def stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream a request's output as part of the next streaming batch"""
+        item = BatchItem(payload, stream=True)
+        self._enqueue(True, item)
+        try:
+            while True:
+                delta = await item.queue.get()
+                if delta is None:
+                    return
+                if isinstance(delta, Exception):
+                    raise delta
+                yield delta
+        finally:
+            # The rest of the batch carries on; this item's deltas are discarded
+            item.abandoned = True
+
+    async def close(self):
+        """Fail pending requests and cancel batches in flight"""
+        for stream in (False, True):
+            if self._timers[stream] is not None:
+                self._timers[stream].cancel()
+                self._timers[stream] = None
+            self._fail(self.pending[stream], BatchItemError("MCP client closed"))
+            self.pending[stream] = []
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _enqueue(self, stream: bool, item: BatchItem):
+        pending = self.pending[stream]
+        pending.append(item)
+        if len(pending) >= self.max_batch_size:
+            self._flush(stream)
+        elif self._timers[stream] is None:
+            self._timers[stream] = asyncio.get_running_loop().call_later(self.max_wait, self._flush, stream)
+
+    def _flush(self, stream: bool):
+        """Send up to a batch of pending requests"""
+        if self._timers[stream] is not None:
+            self._timers[stream].cancel()
+            self._timers[stream] = None
+
+        pending = self.pending[stream]
+        items = [item for item in pending[:self.max_batch_size] if item.waiting]
+        del pending[:self.max_batch_size]
+        if pending:
+            # More arrived than fit; they start their own window
+            self._timers[stream] = asyncio.get_running_loop().call_later(self.max_wait, self._flush, stream)
+
+        if not items:
+            return
+        task = asyncio.create_task(self._run_batch(stream, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, stream: bool, items: List[BatchItem]):
+        metrics.increment("mcp.batches")
+        metrics.increment("mcp.batched_requests", len(items))
+        body = {
+            "requests": [{key: value for key, value in item.payload.items() if key != "stream"} for item in items],
+            "stream": stream
+        }
+        try:
+            if stream:
+                await self._run_stream_batch(body, items)
+            else:
+                response = await self.send(body, False)
+                for item, result in zip(items, response.json()["responses"]):
+                    self._resolve(item, result)
+                # A short response list must not leave callers waiting forever
+                self._fail(items, BatchItemError("Missing response in batch"))
+        except asyncio.CancelledError:
+            self._fail(items, BatchItemError("Batch cancelled"))
+            raise
+        except Exception as e:
+            self._fail(items, e)
+
+    async def _run_stream_batch(self, body: Dict[str, Any], items: List[BatchItem]):
+        """Route tagged NDJSON lines of a streamed batch to each item's queue"""
+        response = await self.send(body, True)
+        try:
+            finished = 0
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                item = items[data["index"]]
+                if "delta" in data:
+                    if not item.abandoned:
+                        item.queue.put_nowait(data["delta"])
+                elif "error" in data:
+                    item.queue.put_nowait(BatchItemError(data["error"]))
+                    finished += 1
+                elif data.get("done"):
+                    item.queue.put_nowait(None)
+                    finished += 1
+                if finished == len(items) or all(item.abandoned for item in items):
+                    break
+        finally:
+            await response.aclose()
+        if finished < len(items):
+            self._fail(items, BatchItemError("Batch stream ended early"))
+
+    def _resolve(self, item: BatchItem, result: Dict[str, Any]):
+        if not item.waiting:
+            return
+        if "error" in result:
+            item.future.set_exception(BatchItemError(result["error"]))
+        else:
+            item.future.set_result(result["content"])
+
+    def _fail(self, items: List[BatchItem], error: Exception):
+        """Fail every item that has not been answered"""
+        for item in items:
+            if item.future is not None:
+                if not item.future.done():
+                    item.future.set_exception(error)
+            elif not item.abandoned:
+                item.queue.put_nowait(error)
@@ -0,0 +1,84 @@
+from typing import Dict, List, Optional, FrozenSet
+import numpy as np
+import asyncio
+
+from app.core.config import settings
+from app.schemas.chat import ChatMessage
+from app.services.chat.search_index import tokenize
+from app.services.rag.knowledge_retrieval import KnowledgeRetrieval
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """Overlap of two term sets, from 0 (disjoint) to 1 (identical)"""
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+class ConvergenceDetector:
+    """Tells when a discussion's rounds have stopped changing
+
+    Each round's agent messages are compared with the same agents'
+    messages from the previous round. The discussion has converged when
+    every agent repeats itself almost word for word, or when the mean
+    cosine similarity between consecutive responses passes
+    A2A_CONVERGENCE_THRESHOLD. Each round is embedded in one batch and
+    kept for the next comparison. Without a loaded embedding model only
+    the word-level check applies.
+
+    One detector follows one discussion.
+    """
+
+    def __init__(self, knowledge_retrieval: KnowledgeRetrieval):
+        # Reuse the sentence transformer already loaded for RAG
+        self.knowledge_retrieval = knowledge_retrieval
+        self.previous_terms: Dict[str, FrozenSet[str]] = {}
+        self.previous_embeddings: Dict[str, np.ndarray] = {}
+
+    async def observe(self, round_messages: List[ChatMessage]) -> bool:
+        """Record a completed round; returns True if it repeats the previous one"""
+        terms = {msg.sender_id: frozenset(tokenize(msg.content)) for msg in round_messages}
+        embeddings = await self._embed(round_messages)
+
+        shared = [sender_id for sender_id in terms if sender_id in self.previous_terms]
+        converged = bool(shared) and (
+            self._near_duplicates(shared, terms) or self._similar(shared, embeddings)
+        )
+
+        self.previous_terms = terms
+        self.previous_embeddings = embeddings
+        return converged
+
+    def _near_duplicates(self, shared: List[str], terms: Dict[str, FrozenSet[str]]) -> bool:
+        """Whether every agent's response nearly duplicates its previous one"""
+        return all(
+            jaccard(terms[sender_id], self.previous_terms[sender_id]) >= settings.A2A_DUPLICATE_THRESHOLD
+            for sender_id in shared
+        )
+
+    def _similar(self, shared: List[str], embeddings: Dict[str, np.ndarray]) -> bool:
+        """Whether responses mean, on average, what they meant last round"""
+        pairs = [
+            (embeddings[sender_id], self.previous_embeddings[sender_id])
+            for sender_id in shared
+            if sender_id in embeddings and sender_id in self.previous_embeddings
+        ]
+        if not pairs or len(pairs) < len(shared):
+            return False
+
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        similarity = float(np.mean([np.dot(current, previous) for current, previous in pairs]))
+        return similarity >= settings.A2A_CONVERGENCE_THRESHOLD
+
+    async def _embed(self, round_messages: List[ChatMessage]) -> Dict[str, np.ndarray]:
+        """Embed a round's messages in one batch, keyed by sender"""
+        model = self.knowledge_retrieval.model
+        if model is None or not round_messages:
+            return {}
+
+        embeddings = await asyncio.to_thread(
+            model.encode,
+            [msg.content for msg in round_messages],
+            normalize_embeddings=True
+        )
+        return {msg.sender_id: embedding for msg, embedding in zip(round_messages, embeddings)}
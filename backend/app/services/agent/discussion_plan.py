@@ -0,0 +1,214 @@
+from typing import Dict, List, Optional, Callable, Awaitable
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.schemas.agent import Agent, AgentTurn, TurnKind
+from app.schemas.chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class DiscussionPlanKind:
+    """Built-in discussion plans"""
+    ROUNDS = "rounds"  # every agent, then whole rounds of every agent
+    PIPELINED = "pipelined"  # each agent moves on once its neighbour has spoken
+
+
+def rounds_plan(agents: List[Agent], rounds: int, parallel_rounds: bool = False) -> List[AgentTurn]:
+    """
+    First responses from every agent, then discussion rounds, then a synthesis
+    
+    With parallel_rounds, each agent in a round reads everything said in
+    earlier rounds, so a round's turns run concurrently. Otherwise each
+    turn reads every turn before it and the discussion runs one turn at a
+    time.
+    """
+    turns = [
+        AgentTurn(id=f"r0:{agent.id}", kind=TurnKind.RESPONSE, agent_id=agent.id, round=0)
+        for agent in agents
+    ]
+
+    for round_num in range(1, rounds + 1):
+        earlier = [turn.id for turn in turns]
+        for agent in agents:
+            reads = earlier if parallel_rounds else [turn.id for turn in turns]
+            turns.append(AgentTurn(
+                id=f"r{round_num}:{agent.id}",
+                kind=TurnKind.DISCUSSION,
+                agent_id=agent.id,
+                round=round_num,
+                reads=reads
+            ))
+
+    return turns + [_synthesis_turn(turns)]
+
+
+def pipelined_plan(agents: List[Agent], rounds: int) -> List[AgentTurn]:
+    """
+    Discussion rounds without a barrier between them
+    
+    An agent's turn in a round reads its own previous turn and the previous
+    turn of the agent before it, so the critic can answer the researcher
+    without waiting for the creative agent. The synthesis reads everything.
+    """
+    turns = [
+        AgentTurn(id=f"r0:{agent.id}", kind=TurnKind.RESPONSE, agent_id=agent.id, round=0)
+        for agent in agents
+    ]
+
+    for round_num in range(1, rounds + 1):
+        for index, agent in enumerate(agents):
+            neighbour = agents[index - 1]
+            reads = [f"r{round_num - 1}:{neighbour.id}", f"r{round_num - 1}:{agent.id}"]
+            turns.append(AgentTurn(
+                id=f"r{round_num}:{agent.id}",
+                kind=TurnKind.DISCUSSION,
+                agent_id=agent.id,
+                round=round_num,
+                # A single agent reads its own previous turn only once
+                reads=list(dict.fromkeys(reads))
+            ))
+
+    return turns + [_synthesis_turn(turns)]
+
+
+def _synthesis_turn(turns: List[AgentTurn]) -> AgentTurn:
+    """Synthesis reading every agent turn"""
+    return AgentTurn(id="synthesis", kind=TurnKind.SYNTHESIS, reads=[turn.id for turn in turns])
+
+
+def build_plan(kind: str, agents: List[Agent], rounds: int) -> List[AgentTurn]:
+    """Built-in plan by name"""
+    if kind == DiscussionPlanKind.PIPELINED:
+        return pipelined_plan(agents, rounds)
+    if kind == DiscussionPlanKind.ROUNDS:
+        return rounds_plan(agents, rounds, settings.A2A_PARALLEL_ROUNDS)
+    raise ValueError(f"Unknown discussion plan: {kind}")
+
+
+class DiscussionExecutor:
+    """Runs a discussion plan, starting each turn as soon as its inputs are ready
+
+    run_turn receives a turn and the messages of the turns it reads, in
+    the order they completed, and returns the turn's message, or None if it
+    produced nothing. At most AGENT_CONCURRENCY_LIMIT turns run at once. A
+    failed turn is reported and treated as producing nothing, so turns that
+    read it still run with their other inputs.
+
+    When every turn of a round has finished, on_round_complete may ask to
+    stop; if it fails, the discussion goes on. Turns of later rounds that
+    have not started are then skipped; the synthesis always runs.
+    """
+
+    def __init__(
+        self,
+        turns: List[AgentTurn],
+        run_turn: Callable[[AgentTurn, List[ChatMessage]], Awaitable[Optional[ChatMessage]]],
+        on_round_complete: Optional[Callable[[int, List[ChatMessage]], Awaitable[bool]]] = None
+    ):
+        self.turns = turns
+        self.run_turn = run_turn
+        self.on_round_complete = on_round_complete
+        self._validate()
+
+        self.results: Dict[str, Optional[ChatMessage]] = {}
+        self.completion_order: Dict[str, int] = {}
+        self.skipped: List[str] = []
+        self.stop_after_round: Optional[int] = None
+        self._done: Dict[str, asyncio.Event] = {}
+        self._round_remaining: Dict[int, int] = {}
+        for turn in turns:
+            if turn.round is not None:
+                self._round_remaining[turn.round] = self._round_remaining.get(turn.round, 0) + 1
+
+    def _validate(self):
+        """Turn ids must be unique and turns may only read turns listed before them"""
+        seen = set()
+        for turn in self.turns:
+            if turn.id in seen:
+                raise ValueError(f"Duplicate turn id: {turn.id}")
+            for read in turn.reads:
+                if read not in seen:
+                    raise ValueError(f"Turn {turn.id} reads {read}, which is not an earlier turn")
+            seen.add(turn.id)
+
+    @property
+    def skipped_rounds(self) -> int:
+        """Number of rounds none of whose turns ran"""
+        skipped = set(self.skipped)
+        rounds: Dict[int, bool] = {}
+        for turn in self.turns:
+            if turn.round is not None:
+                rounds[turn.round] = rounds.get(turn.round, True) and turn.id in skipped
+        return sum(rounds.values())
+
+    async def run(self) -> List[ChatMessage]:
+        """Run every turn; returns the messages produced, in completion order"""
+        self._done = {turn.id: asyncio.Event() for turn in self.turns}
+        semaphore = asyncio.Semaphore(max(settings.AGENT_CONCURRENCY_LIMIT, 1))
+
+        await asyncio.gather(*(self._run_turn(turn, semaphore) for turn in self.turns))
+
+        produced = [
+            (self.completion_order[turn_id], message)
+            for turn_id, message in self.results.items()
+            if message is not None
+        ]
+        return [message for _, message in sorted(produced, key=lambda item: item[0])]
+
+    async def _run_turn(self, turn: AgentTurn, semaphore: asyncio.Semaphore):
+        """Wait for the turn's inputs, run it, then release the turns that read it"""
+        for read in turn.reads:
+            await self._done[read].wait()
+
+        message = None
+        async with semaphore:
+            if self._should_skip(turn):
+                self.skipped.append(turn.id)
+            else:
+                inputs = sorted(
+                    (read for read in turn.reads if self.results.get(read) is not None),
+                    key=self.completion_order.__getitem__
+                )
+                try:
+                    message = await self.run_turn(turn, [self.results[read] for read in inputs])
+                except Exception:
+                    logger.exception("Agent turn %s failed", turn.id)
+
+        self.results[turn.id] = message
+        self.completion_order[turn.id] = len(self.completion_order)
+
+        try:
+            if turn.round is not None:
+                self._round_remaining[turn.round] -= 1
+                if self._round_remaining[turn.round] == 0:
+                    await self._finish_round(turn.round)
+        finally:
+            # Turns reading this one must never wait forever
+            self._done[turn.id].set()
+
+    def _should_skip(self, turn: AgentTurn) -> bool:
+        """Whether an early stop rules out this turn"""
+        return (
+            self.stop_after_round is not None
+            and turn.round is not None
+            and turn.round > self.stop_after_round
+        )
+
+    async def _finish_round(self, round_num: int):
+        """Offer a completed round to on_round_complete, which may stop later rounds"""
+        if self.on_round_complete is None or self.stop_after_round is not None:
+            return
+        finished = sorted(
+            (turn.id for turn in self.turns if turn.round == round_num and self.results.get(turn.id) is not None),
+            key=self.completion_order.__getitem__
+        )
+        try:
+            stop = await self.on_round_complete(round_num, [self.results[turn_id] for turn_id in finished])
+        except Exception:
+            # A failed check is treated as "keep going"
+            logger.exception("Round %s completion check failed", round_num)
+            return
+        if stop:
+            self.stop_after_round = round_num
@@ -0,0 +1,271 @@
+from typing import Dict, List, Optional, Callable, Awaitable, Iterator
+from collections import deque
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DiscussionRejected(Exception):
+    """Raised when the scheduler cannot accept another discussion"""
+
+
+class DiscussionCancelPolicy:
+    """When to abandon a discussion before it finishes"""
+    SUPERSEDE = "supersede"  # a new message in the thread replaces it
+    NO_LISTENERS = "no_listeners"  # the thread has no connected clients
+    NEVER = "never"  # always run to completion
+
+
+class CancelReason:
+    """Why a discussion was cancelled; recorded on partial messages"""
+    SUPERSEDED = "superseded"
+    NO_LISTENERS = "no_listeners"
+    SHUTDOWN = "shutdown"
+    THREAD_DELETED = "thread_deleted"
+
+
+class DiscussionJob:
+    """Handle to a discussion waiting for, or holding, a scheduler slot"""
+
+    __slots__ = ("scheduler", "thread_id", "run", "notify", "position", "task", "cancel_reason")
+
+    def __init__(
+        self,
+        scheduler: "DiscussionScheduler",
+        thread_id: str,
+        run: Callable[[], Awaitable[None]],
+        notify: Optional[Callable[[Optional[int]], None]] = None
+    ):
+        self.scheduler = scheduler
+        self.thread_id = thread_id
+        self.run = run
+        self.notify = notify
+        # None until first queued or started; 0 once running, otherwise 1-based queue position
+        self.position: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_reason is not None
+
+    def cancel(self, reason: str):
+        """Remove the discussion from the queue, or cancel it if running"""
+        self.scheduler.cancel(self, reason)
+
+
+class DiscussionScheduler:
+    """Runs agent discussions with bounded concurrency and fair queueing
+
+    At most DISCUSSION_MAX_CONCURRENT discussions run at once, and at most
+    one per thread, since a thread's discussions build on each other.
+    Waiting threads are served round-robin, so one busy thread cannot
+    starve the others. Admission is refused once the queues are full,
+    which keeps latency predictable under overload instead of letting
+    every discussion slow down together.
+
+    Queued jobs are told their position through their notify callback
+    whenever it changes, 0 when they start and None if cancelled.
+    Cancelling a running job cancels its task with the reason as the
+    message, so the reason reaches whatever the discussion is awaiting.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        max_queued_per_thread: Optional[int] = None
+    ):
+        self.max_concurrent = max_concurrent or settings.DISCUSSION_MAX_CONCURRENT
+        self.max_queued = max_queued if max_queued is not None else settings.DISCUSSION_MAX_QUEUED
+        self.max_queued_per_thread = (
+            max_queued_per_thread if max_queued_per_thread is not None
+            else settings.DISCUSSION_MAX_QUEUED_PER_THREAD
+        )
+        self.pending: Dict[str, deque] = {}  # jobs waiting, by thread
+        self.ready: deque = deque()  # threads with waiting jobs and nothing running, in turn order
+        self.running: Dict[str, DiscussionJob] = {}  # the running job, by thread
+        self.queued = 0
+        self.accepting = True
+
+        metrics.register_gauge("discussions.running", lambda: len(self.running))
+        metrics.register_gauge("discussions.queued", lambda: self.queued)
+
+    def has_capacity(self, thread_id: str, supersede: bool = False) -> bool:
+        """Whether a discussion for the thread would be admitted now
+
+        When superseding, the thread's own waiting jobs do not count, since
+        they are cancelled to make room.
+        """
+        if not self.accepting:
+            return False
+        waiting = len(self.pending.get(thread_id, ()))
+        if supersede:
+            return self.queued - waiting < self.max_queued
+        return self.queued < self.max_queued and waiting < self.max_queued_per_thread
+
+    def submit(
+        self,
+        thread_id: str,
+        run: Callable[[], Awaitable[None]],
+        notify: Optional[Callable[[Optional[int]], None]] = None,
+        supersede: bool = False
+    ) -> DiscussionJob:
+        """
+        Schedule a discussion for a thread and return its handle
+        
+        The handle's position is 0 if it started immediately, otherwise its
+        queue position. With supersede, the thread's earlier discussions are
+        cancelled first. Raises DiscussionRejected if the scheduler is full
+        or draining.
+        """
+        if not self.has_capacity(thread_id, supersede):
+            metrics.increment("discussions.rejected")
+            raise DiscussionRejected("Too many discussions in progress")
+
+        if supersede:
+            self.cancel_thread(thread_id, CancelReason.SUPERSEDED)
+
+        job = DiscussionJob(self, thread_id, run, notify)
+        queue = self.pending.get(thread_id)
+        if queue is None:
+            queue = self.pending[thread_id] = deque()
+            if thread_id not in self.running:
+                self.ready.append(thread_id)
+        queue.append(job)
+        self.queued += 1
+
+        self._dispatch()
+        return job
+
+    def cancel(self, job: DiscussionJob, reason: str):
+        """Cancel a queued or running discussion"""
+        if job.cancelled or (job.task is not None and job.task.done()):
+            return
+        job.cancel_reason = reason
+
+        if job.task is not None:
+            # _finished reports the cancellation once the task has unwound
+            job.task.cancel(reason)
+            return
+
+        queue = self.pending.get(job.thread_id)
+        if queue is None or job not in queue:
+            return
+        queue.remove(job)
+        self.queued -= 1
+        if not queue:
+            del self.pending[job.thread_id]
+            if job.thread_id in self.ready:
+                self.ready.remove(job.thread_id)
+
+        metrics.increment("discussions.cancelled")
+        if job.notify:
+            job.notify(None)
+        self._dispatch()
+
+    def cancel_thread(self, thread_id: str, reason: str) -> int:
+        """Cancel every queued and running discussion of a thread; returns how many"""
+        jobs = list(self.pending.get(thread_id, ()))
+        if thread_id in self.running:
+            jobs.append(self.running[thread_id])
+        for job in jobs:
+            job.cancel(reason)
+        return len(jobs)
+
+    async def close_thread(self, thread_id: str, reason: str = CancelReason.THREAD_DELETED) -> int:
+        """Cancel a thread's discussions and wait for the running one to unwind"""
+        running = self.running.get(thread_id)
+        count = self.cancel_thread(thread_id, reason)
+        if running is not None and running.task is not None:
+            await asyncio.wait([running.task])
+        return count
+
+    def _dispatch(self):
+        """Start waiting jobs while slots are free, then refresh queue positions"""
+        while self.ready and len(self.running) < self.max_concurrent:
+            thread_id = self.ready.popleft()
+            queue = self.pending[thread_id]
+            job = queue.popleft()
+            if not queue:
+                del self.pending[thread_id]
+            self.queued -= 1
+
+            was_queued = job.position is not None
+            job.position = 0
+            self.running[thread_id] = job
+            job.task = asyncio.create_task(job.run())
+            job.task.add_done_callback(lambda task, job=job: self._finished(job, task))
+            metrics.increment("discussions.started")
+            if was_queued and job.notify:
+                job.notify(0)
+
+        for position, job in enumerate(self._queue_order(), 1):
+            if job.position != position:
+                job.position = position
+                if job.notify:
+                    job.notify(position)
+
+    def _queue_order(self) -> Iterator[DiscussionJob]:
+        """Waiting jobs in the order they are expected to start
+
+        Threads take turns, one job each; threads with a running job take
+        their next turn after those already waiting.
+        """
+        threads = list(self.ready) + [thread_id for thread_id in self.running if thread_id in self.pending]
+        depth = 0
+        while threads:
+            threads = [thread_id for thread_id in threads if depth < len(self.pending[thread_id])]
+            for thread_id in threads:
+                yield self.pending[thread_id][depth]
+            depth += 1
+
+    def _finished(self, job: DiscussionJob, task: asyncio.Task):
+        """Record how a job ended, then hand its slot to the next thread in turn
+
+        Runs as a done callback, since a task cancelled before it starts
+        never executes any of its own code.
+        """
+        if task.cancelled():
+            metrics.increment("discussions.cancelled")
+            if job.notify:
+                job.notify(None)
+        elif task.exception() is not None:
+            metrics.increment("discussions.failed")
+            logger.error("Discussion failed for thread %s", job.thread_id, exc_info=task.exception())
+        else:
+            metrics.increment("discussions.completed")
+
+        del self.running[job.thread_id]
+        if job.thread_id in self.pending:
+            self.ready.append(job.thread_id)
+        self._dispatch()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """
+        Stop admitting discussions and wait for accepted ones to finish
+        
+        Discussions still queued or running after the timeout are cancelled.
+        """
+        self.accepting = False
+        timeout = timeout if timeout is not None else settings.DISCUSSION_DRAIN_TIMEOUT
+
+        try:
+            await asyncio.wait_for(self._wait_idle(), timeout)
+        except asyncio.TimeoutError:
+            for thread_id in list(self.pending):
+                self.cancel_thread(thread_id, CancelReason.SHUTDOWN)
+            tasks: List[asyncio.Task] = [job.task for job in self.running.values()]
+            for job in list(self.running.values()):
+                job.cancel(CancelReason.SHUTDOWN)
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _wait_idle(self):
+        """Wait until no discussions are running or queued"""
+        # asyncio.wait, unlike gather, leaves the tasks running if this wait is cancelled
+        while self.running:
+            await asyncio.wait([job.task for job in self.running.values()])
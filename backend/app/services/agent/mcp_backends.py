@@ -0,0 +1,161 @@
+from typing import List, Optional, Iterable
+from collections import deque
+import logging
+import time
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # pragma: no cover - HTTP/2 support is optional
+    h2 = None
+
+HTTP2_AVAILABLE = h2 is not None
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState:
+    """Circuit breaker states of a backend"""
+    CLOSED = "closed"  # healthy, taking traffic
+    OPEN = "open"  # ejected until its cooldown ends
+    HALF_OPEN = "half_open"  # cooled down, one trial request decides
+
+
+class MCPBackend:
+    """One MCP endpoint: its connection pool, recent health and circuit breaker
+
+    Outcomes of the last MCP_BREAKER_WINDOW requests are kept. Once at
+    least MCP_BREAKER_MIN_REQUESTS are known, the breaker opens when the
+    error rate reaches MCP_BREAKER_ERROR_RATE or the median latency
+    exceeds MCP_BREAKER_MAX_LATENCY. After MCP_BREAKER_COOLDOWN one trial
+    request is let through, which closes the breaker again or reopens it.
+    """
+
+    def __init__(self, api_base: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_base = api_base
+        # A custom transport lets tests talk to stub servers in-process
+        self._transport = transport
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.latencies: deque = deque(maxlen=settings.MCP_BREAKER_WINDOW)  # seconds to response start, successes only
+        self.outcomes: deque = deque(maxlen=settings.MCP_BREAKER_WINDOW)  # True for success
+        self.state = BreakerState.CLOSED
+        self.opened_at = 0.0
+        self.in_flight = 0
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """The backend's connection pool, created on first use"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                base_url=self.api_base,
+                http2=settings.MCP_HTTP2 and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=settings.MCP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.MCP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.MCP_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(settings.MCP_READ_TIMEOUT, connect=settings.MCP_CONNECT_TIMEOUT),
+                transport=self._transport
+            )
+        return self._http_client
+
+    async def close(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend may take a request now"""
+        if self.state == BreakerState.OPEN:
+            return time.monotonic() - self.opened_at >= settings.MCP_BREAKER_COOLDOWN
+        if self.state == BreakerState.HALF_OPEN:
+            # Only the trial request until it decides
+            return self.in_flight == 0
+        return True
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Latency below which the given share of recent successes started, if known"""
+        if len(self.latencies) < settings.MCP_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(percentile * len(ordered)), len(ordered) - 1)]
+
+    def begin(self):
+        """Note a request starting; a request to an ejected backend is its trial"""
+        self.in_flight += 1
+        if self.state == BreakerState.OPEN:
+            self.state = BreakerState.HALF_OPEN
+
+    def finish(self):
+        self.in_flight -= 1
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        """Count a request's outcome, opening or closing the breaker as needed"""
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+
+        if self.state == BreakerState.HALF_OPEN:
+            if ok:
+                self._close()
+            else:
+                self._open()
+        elif self._degraded():
+            self._open()
+
+    def _degraded(self) -> bool:
+        if len(self.outcomes) < settings.MCP_BREAKER_MIN_REQUESTS:
+            return False
+        error_rate = self.outcomes.count(False) / len(self.outcomes)
+        if error_rate >= settings.MCP_BREAKER_ERROR_RATE:
+            return True
+        if settings.MCP_BREAKER_MAX_LATENCY and self.latencies:
+            median = sorted(self.latencies)[len(self.latencies) // 2]
+            return median > settings.MCP_BREAKER_MAX_LATENCY
+        return False
+
+    def _open(self):
+        metrics.increment("mcp.breaker_opened")
+        logger.warning("MCP backend %s ejected", self.api_base)
+        self.state = BreakerState.OPEN
+        self.opened_at = time.monotonic()
+
+    def _close(self):
+        metrics.increment("mcp.breaker_closed")
+        logger.info("MCP backend %s rejoined", self.api_base)
+        self.state = BreakerState.CLOSED
+        # Judge the backend afresh from here on
+        self.outcomes.clear()
+        self.latencies.clear()
+
+
+class BackendPool:
+    """The MCP endpoints a client spreads its requests over"""
+
+    def __init__(self, backends: List[MCPBackend]):
+        self.backends = backends
+        metrics.register_gauge("mcp.backends_available", lambda: sum(backend.available for backend in self.backends))
+
+    def choose(self, exclude: Iterable[MCPBackend] = ()) -> Optional[MCPBackend]:
+        """
+        Least-loaded available backend, or None if only excluded ones remain
+
+        Healthy backends are preferred over one on trial. If every backend
+        is ejected, the one ejected longest ago is tried rather than
+        failing outright.
+        """
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+        available = [backend for backend in candidates if backend.available]
+        if not available:
+            return min(candidates, key=lambda backend: backend.opened_at)
+        return min(available, key=lambda backend: (backend.state != BreakerState.CLOSED, backend.in_flight))
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
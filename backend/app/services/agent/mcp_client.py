@@ -1,52 +1,424 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional
 import httpx
 import json
+import random
 import asyncio
+import time
+from contextlib import nullcontext
 
 from app.schemas.agent import Agent
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.agent.batch_dispatcher import BatchDispatcher
+from app.services.agent.mcp_backends import MCPBackend, BackendPool
+from app.services.agent.prompt_assembler import PromptAssembler
+from app.services.agent.rate_limiter import CallPriority, PriorityRateLimiter, backend_limiter, call_thread
+from app.services.agent.response_cache import ResponseCache
+from app.services.agent.streaming import simulate_token_stream, split_tokens
+
+# Statuses worth retrying: rate limiting and transient gateway failures
+RETRYABLE_STATUSES = {429, 502, 503, 504}
 
 
 class MCPClient:
-    """Client for Model Context Protocol (MCP)"""
+    """Client for Model Context Protocol (MCP)
+    
+    Requests go through pooled httpx.AsyncClients, one per backend,
+    created on first use and shared by every call, so connections are kept
+    alive and reused instead of paying TCP/TLS setup per call. Transient
+    failures are retried with jittered exponential backoff.
+    
+    With several MCP_API_BASES, requests go to the least-loaded healthy
+    backend, and circuit breakers eject backends whose errors or latency
+    degrade. With MCP_HEDGING_ENABLED on, a request slower than
+    MCP_HEDGE_PERCENTILE of its backend's recent ones is duplicated to a
+    second backend; the first answer wins and the other is cancelled.
+    
+    With MCP_BACKEND_ENABLED off, responses are simulated locally.
+    With RESPONSE_CACHE_ENABLED on, completions are served from a
+    response cache keyed by the rendered prompt and model parameters.
+    With MCP_BATCHING_ENABLED on, concurrent requests are coalesced into
+    batched backend calls. With BACKEND_RATE_LIMIT_ENABLED on, backend
+    calls wait for the shared limiter, first responses ahead of discussion
+    turns and syntheses; every retry and hedge takes a token as well.
+    """
+    
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache: Optional[ResponseCache] = None,
+        limiter: Optional[PriorityRateLimiter] = None,
+        backends: Optional[List[MCPBackend]] = None
+    ):
+        if backends is None:
+            # A custom transport lets tests talk to the stub server in-process
+            backends = [MCPBackend(api_base, transport) for api_base in settings.MCP_API_BASES or [settings.MCP_API_BASE]]
+        self.pool = BackendPool(backends)
+        if cache is None and settings.RESPONSE_CACHE_ENABLED:
+            cache = ResponseCache()
+        self.cache = cache
+        if limiter is None and settings.BACKEND_RATE_LIMIT_ENABLED:
+            limiter = backend_limiter
+        self.limiter = limiter
+        self.batcher: Optional[BatchDispatcher] = None
+        if settings.MCP_BATCHING_ENABLED:
+            self.batcher = BatchDispatcher(lambda body, stream: self._send(body, stream, "/batch"))
+        # Keeps prompts within their per-role token budget
+        self.assembler = PromptAssembler()
+    
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Connection pool of the first backend"""
+        return self.pool.backends[0].http_client
+    
+    async def close(self):
+        """Close pooled connections"""
+        if self.batcher is not None:
+            await self.batcher.close()
+        await self.pool.close()
     
-    def __init__(self):
-        # In a real implementation, this would connect to actual LLM services
-        # For now, we'll simulate the MCP functionality
-        self.api_base = "http://localhost:8001/mcp"  # Would be a real API endpoint in production
+    @property
+    def model_params(self) -> Dict[str, Any]:
+        """Model parameters sent with every request"""
+        return {"model": settings.MCP_MODEL, "temperature": settings.MCP_TEMPERATURE}
+    
+    def cache_key(
+        self,
+        kind: str,
+        prompt: str,
+        role: Optional[str] = None,
+        bypass_cache: bool = False,
+        simulated: bool = False
+    ) -> Optional[str]:
+        """
+        Response cache key for a request, or None when it must not be cached
+        
+        Sampled generations (temperature above zero) are not reproducible,
+        so they skip the cache unless RESPONSE_CACHE_SAMPLED is set. The key
+        records where the answer comes from, so simulated answers and those
+        of other backends are never served as this backend's.
+        """
+        if self.cache is None or bypass_cache:
+            return None
+        params = self.model_params
+        if params["temperature"] > 0 and not settings.RESPONSE_CACHE_SAMPLED:
+            return None
+        params["source"] = "simulation" if simulated else sorted(backend.api_base for backend in self.pool.backends)
+        return self.cache.key(kind, prompt, role, params)
+    
+    async def complete(
+        self,
+        kind: str,
+        prompt: str,
+        role: Optional[str] = None,
+        simulate: Optional[Callable[[], str]] = None,
+        simulated_delay: float = 0.5,
+        bypass_cache: bool = False
+    ) -> str:
+        """
+        Complete a prompt from the cache, the MCP backend or the simulation
+        
+        simulate produces the response when MCP_BACKEND_ENABLED is off.
+        """
+        simulated = simulate is not None and not settings.MCP_BACKEND_ENABLED
+        key = self.cache_key(kind, prompt, role, bypass_cache, simulated)
+        if key is None:
+            metrics.increment("response_cache.bypassed")
+        else:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        if simulated:
+            await asyncio.sleep(simulated_delay)
+            content = simulate()
+        else:
+            content = await self.generate(kind, prompt, role)
+        
+        if key is not None:
+            await self.cache.set(key, content)
+        return content
+    
+    async def stream_complete(
+        self,
+        kind: str,
+        prompt: str,
+        role: Optional[str] = None,
+        simulate: Optional[Callable[[], str]] = None,
+        simulated_delay: float = 0.5,
+        bypass_cache: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of complete
+        
+        A cache hit is replayed token by token without delay. A stream is
+        only cached once it finishes, so abandoned streams leave no entry.
+        """
+        simulated = simulate is not None and not settings.MCP_BACKEND_ENABLED
+        key = self.cache_key(kind, prompt, role, bypass_cache, simulated)
+        if key is None:
+            metrics.increment("response_cache.bypassed")
+        else:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                for token in split_tokens(cached):
+                    yield token
+                return
+        
+        if simulated:
+            chunks = simulate_token_stream(simulate(), simulated_delay)
+        else:
+            chunks = self.stream_generate(kind, prompt, role)
+        
+        parts = []
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            await chunks.aclose()
+        
+        if key is not None:
+            await self.cache.set(key, "".join(parts))
+    
+    async def generate(self, kind: str, prompt: str, role: Optional[str] = None) -> str:
+        """Complete a prompt on the MCP backend"""
+        payload = self._payload(kind, prompt, role, stream=False)
+        async with self._call_slot(kind):
+            if self.batcher is not None:
+                return await self.batcher.generate(payload)
+            response = await self._send(payload)
+            return response.json()["content"]
+    
+    async def stream_generate(self, kind: str, prompt: str, role: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Complete a prompt on the MCP backend, yielding text as it is produced
+        
+        The backend answers with NDJSON lines carrying a "delta" each.
+        Closing the generator closes the response, abandoning the request.
+        A batched stream instead keeps running for the rest of its batch.
+        """
+        payload = self._payload(kind, prompt, role, stream=True)
+        # The slot is held until the stream ends or is abandoned
+        async with self._call_slot(kind):
+            if self.batcher is not None:
+                async for delta in self.batcher.stream(payload):
+                    yield delta
+                return
+            
+            response = await self._send(payload, stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    delta = json.loads(line).get("delta")
+                    if delta:
+                        yield delta
+            finally:
+                await response.aclose()
+    
+    def _call_slot(self, kind: str):
+        """Rate limiter slot for a backend call, prioritized by its kind"""
+        if self.limiter is None:
+            return nullcontext()
+        return self.limiter.slot(CallPriority.for_kind(kind), call_thread.get())
+    
+    def _payload(self, kind: str, prompt: str, role: Optional[str], stream: bool) -> Dict[str, Any]:
+        return {"kind": kind, "role": role, "prompt": prompt, "stream": stream, **self.model_params}
+    
+    async def _send(self, payload: Dict[str, Any], stream: bool = False, path: str = "/generate") -> httpx.Response:
+        """
+        POST a generation or batch request, retrying transient failures
+        
+        Connection errors, timeouts and retryable statuses are retried up to
+        MCP_MAX_RETRIES times, on another backend when there is one. Streams
+        are only retried before the response starts, so no output is ever
+        duplicated.
+        """
+        attempt = 0
+        failed: List[MCPBackend] = []
+        while True:
+            metrics.increment("mcp.requests")
+            backend = self.pool.choose(exclude=failed) or self.pool.choose()
+            try:
+                response = await self._attempt(backend, payload, stream, path)
+            except httpx.TransportError:
+                if attempt >= settings.MCP_MAX_RETRIES:
+                    metrics.increment("mcp.failures")
+                    raise
+                delay = self._retry_delay(attempt)
+            else:
+                if response.status_code not in RETRYABLE_STATUSES or attempt >= settings.MCP_MAX_RETRIES:
+                    if response.is_error:
+                        metrics.increment("mcp.failures")
+                        await response.aclose()
+                        response.raise_for_status()
+                    return response
+                delay = self._retry_delay(attempt, response)
+                await response.aclose()
+            
+            failed.append(backend)
+            metrics.increment("mcp.retries")
+            await asyncio.sleep(delay)
+            if self.limiter is not None:
+                await self.limiter.charge()
+            attempt += 1
+    
+    async def _attempt(self, backend: MCPBackend, payload: Dict[str, Any], stream: bool, path: str) -> httpx.Response:
+        """One try of a request, hedged to a second backend if the first is slow"""
+        if not settings.MCP_HEDGING_ENABLED:
+            backend.begin()
+            try:
+                return await self._request(backend, payload, stream, path)
+            finally:
+                backend.finish()
+        
+        tasks = [self._start_request(backend, payload, stream, path)]
+        try:
+            delay = backend.latency_percentile(settings.MCP_HEDGE_PERCENTILE)
+            done, _ = await asyncio.wait(tasks, timeout=settings.MCP_HEDGE_DELAY if delay is None else delay)
+            if not done:
+                second = self.pool.choose(exclude=[backend])
+                # Hedge only with a token to spare, so overload does not double the load
+                if second is not None and second.available and (self.limiter is None or self.limiter.try_charge()):
+                    metrics.increment("mcp.hedges")
+                    tasks.append(self._start_request(second, payload, stream, path))
+            return await self._first_answer(tasks)
+        finally:
+            # Cancel the loser, closing its response if it answered meanwhile
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            for result in await asyncio.gather(*losers, return_exceptions=True):
+                if isinstance(result, httpx.Response):
+                    await result.aclose()
+    
+    async def _first_answer(self, tasks: List[asyncio.Task]) -> httpx.Response:
+        """
+        The first successful response of the racing requests
+        
+        If every request fails, the last error response is returned or
+        the last exception raised, for _send to retry.
+        """
+        pending = set(tasks)
+        failure: Optional[httpx.Response] = None
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                response = task.result()
+                if response.is_error:
+                    if failure is not None:
+                        await failure.aclose()
+                    failure = response
+                    continue
+                if task is not tasks[0]:
+                    metrics.increment("mcp.hedge_wins")
+                if failure is not None:
+                    await failure.aclose()
+                # A request that finished in the same step lost the race too
+                for other in done:
+                    if other is not task and other.exception() is None and not other.result().is_error:
+                        await other.result().aclose()
+                return response
+        if failure is not None:
+            return failure
+        raise error
+    
+    def _start_request(self, backend: MCPBackend, payload: Dict[str, Any], stream: bool, path: str) -> asyncio.Task:
+        """Send a request to a backend in its own task, to race it against a hedge"""
+        # Counted as in flight from here, so concurrent callers spread over backends;
+        # the callback also runs for a task cancelled before it starts
+        backend.begin()
+        task = asyncio.create_task(self._request(backend, payload, stream, path))
+        task.add_done_callback(lambda _: backend.finish())
+        return task
+    
+    async def _request(self, backend: MCPBackend, payload: Dict[str, Any], stream: bool, path: str) -> httpx.Response:
+        """Send a request to one backend, recording the outcome for its breaker"""
+        start = time.monotonic()
+        try:
+            request = backend.http_client.build_request("POST", path, json=payload)
+            response = await backend.http_client.send(request, stream=stream)
+        except httpx.TransportError:
+            backend.record(False)
+            raise
+        backend.record(response.status_code not in RETRYABLE_STATUSES and response.status_code < 500, time.monotonic() - start)
+        return response
+    
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Seconds to wait before a retry: Retry-After if given, else full-jitter backoff"""
+        if response is not None:
+            try:
+                return min(float(response.headers["retry-after"]), settings.MCP_RETRY_MAX_BACKOFF)
+            except (KeyError, ValueError):
+                pass
+        ceiling = min(settings.MCP_RETRY_MAX_BACKOFF, settings.MCP_RETRY_BACKOFF * 2 ** attempt)
+        return random.uniform(0, ceiling)
     
     async def get_agent_response(
         self,
         agent: Agent,
         user_message: str,
-        context: List[Dict[str, Any]]
+        context: List[Dict[str, Any]],
+        bypass_cache: bool = False
     ) -> str:
         """
         Get a response from an agent using MCP
         
         MCP standardizes how agents access external data sources and tools
         """
-        # In a real implementation, this would make API calls to an MCP-compliant service
-        # For now, we'll simulate the response generation
-        
         # Format the prompt with the agent's template
-        prompt = self._format_prompt(agent.prompt_template, user_message, context)
+        prompt = self._format_prompt(agent.prompt_template, user_message, context, agent.role.value)
         
-        # Simulate API call delay
-        await asyncio.sleep(0.5)
+        return await self.complete(
+            "response",
+            prompt,
+            agent.role.value,
+            # Generate a simulated response based on the agent's role
+            simulate=lambda: self._simulate_agent_response(agent, user_message, context),
+            bypass_cache=bypass_cache
+        )
+    
+    def stream_agent_response(
+        self,
+        agent: Agent,
+        user_message: str,
+        context: List[Dict[str, Any]],
+        bypass_cache: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from an agent using MCP
         
-        # Generate a simulated response based on the agent's role
-        response = self._simulate_agent_response(agent, user_message, context)
+        Yields text chunks as the model produces them; joined, they equal
+        the response get_agent_response would return.
+        """
+        prompt = self._format_prompt(agent.prompt_template, user_message, context, agent.role.value)
         
-        return response
+        return self.stream_complete(
+            "response",
+            prompt,
+            agent.role.value,
+            simulate=lambda: self._simulate_agent_response(agent, user_message, context),
+            bypass_cache=bypass_cache
+        )
     
     def _format_prompt(
         self,
         template: str,
         user_message: str,
-        context: List[Dict[str, Any]]
+        context: List[Dict[str, Any]],
+        role: Optional[str] = None
     ) -> str:
         """Format a prompt using the template, user message, and context"""
+        if settings.PROMPT_BUDGET_ENABLED:
+            # Cut the pieces to the role's token budget
+            parts = self.assembler.assemble(role, template, user_message, context)
+            return f"{parts.template}\n\nUser message: {parts.user_message}\n\nContext:\n{parts.context_text}"
+        
         # Extract relevant information from context
         context_str = "\n".join([
             f"- {item.get('content', 'No content')}"
@@ -0,0 +1,256 @@
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+from functools import lru_cache
+from itertools import chain
+import logging
+import re
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - exact token counts are optional
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Marks text cut short to fit the budget; counts as one token
+TRUNCATION_MARKER = "…"
+
+
+class ApproximateTokenizer:
+    """Fast local token estimate, close to BPE tokenizers on English text
+
+    Punctuation marks count as one token each and words as one token per
+    four characters.
+    """
+
+    PATTERN = re.compile(r"\w+|[^\w\s]")
+
+    def count(self, text: str) -> int:
+        return sum(self._cost(match.group()) for match in self.PATTERN.finditer(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens, marking the cut"""
+        if max_tokens <= 0:
+            return ""
+        used = 0
+        for match in self.PATTERN.finditer(text):
+            used += self._cost(match.group())
+            if used > max_tokens - 1:
+                return text[:match.start()].rstrip() + TRUNCATION_MARKER
+        return text
+
+    @staticmethod
+    def _cost(token: str) -> int:
+        return (len(token) + 3) // 4
+
+
+class TiktokenTokenizer:
+    """Exact token counts from a tiktoken encoding"""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens, marking the cut"""
+        if max_tokens <= 0:
+            return ""
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens - 1]).rstrip() + TRUNCATION_MARKER
+
+
+def get_tokenizer(name: Optional[str] = None):
+    """Tokenizer by name, falling back to the approximation"""
+    return _tokenizer(name or settings.PROMPT_TOKENIZER)
+
+
+@lru_cache(maxsize=None)
+def _tokenizer(name: str):
+    # Tokenizers are stateless, so each is built once and shared, and a fallback is logged once
+    if name == "tiktoken":
+        if tiktoken is not None:
+            return TiktokenTokenizer()
+        logger.warning("tiktoken is not installed; using the approximate tokenizer")
+    return ApproximateTokenizer()
+
+
+class PromptParts:
+    """Pieces of a prompt, each cut to its share of the budget"""
+
+    __slots__ = ("template", "user_message", "context", "history", "tokens")
+
+    def __init__(self, template: str, user_message: Optional[str], context: List[str], history: str, tokens: int):
+        self.template = template
+        self.user_message = user_message
+        self.context = context  # document contents, most relevant first
+        self.history = history  # summary of older messages, then recent messages verbatim
+        self.tokens = tokens
+
+    @property
+    def context_text(self) -> str:
+        return "\n".join(f"- {content}" for content in self.context)
+
+
+class PromptAssembler:
+    """Fits agent prompts into a per-role token budget
+
+    The role template and the user message come first, each capped at a
+    share of the budget. Context documents and discussion history split
+    the rest. Context documents are taken most relevant first, by their
+    "relevance" (cosine similarity to the query; documents without one
+    come last, in their given order): the first that does not fit is
+    truncated and the rest are dropped. The newest history messages are
+    kept verbatim. Older ones are replaced by a digest of one line per
+    message, newest lines first, in a share of the history budget kept
+    for it plus whatever the verbatim messages leave. Each line is the
+    message's first PROMPT_SUMMARY_WORDS words: head truncation, not a
+    generated summary, so the rest of those messages is lost.
+    """
+
+    SUMMARY_HEADER = "Earlier in the discussion:\n"
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer or get_tokenizer()
+
+    def budget_for(self, role: Optional[str]) -> int:
+        """Token budget of a role, or of a call kind such as "synthesis" """
+        return settings.PROMPT_ROLE_BUDGETS.get(role or "", settings.PROMPT_TOKEN_BUDGET)
+
+    def assemble(
+        self,
+        role: Optional[str],
+        template: str,
+        user_message: Optional[str] = None,
+        context: Sequence[Dict[str, Any]] = (),
+        history: Sequence[Tuple[str, str]] = (),
+        older: Iterable[str] = (),
+        reserved: int = 0
+    ) -> PromptParts:
+        """
+        Cut a prompt's pieces to the role's budget
+
+        history holds (formatted message, summary line) pairs, oldest first.
+        older yields the summary lines of messages before history, newest
+        first, and is only read as far as the budget allows. reserved
+        tokens are kept for text the caller adds uncut, such as a running
+        summary, and come out of what context and history would get.
+        """
+        budget = self.budget_for(role)
+        count = self.tokenizer.count
+
+        template = self._fit(template, int(budget * settings.PROMPT_TEMPLATE_SHARE))
+        used = count(template)
+        if user_message is not None:
+            user_message = self._fit(user_message, int(budget * settings.PROMPT_MESSAGE_SHARE))
+            used += count(user_message)
+
+        remaining = max(budget - used - reserved, 0)
+        context_budget = int(remaining * settings.PROMPT_CONTEXT_SHARE) if history else remaining
+        documents, context_tokens = self._fit_context(context, context_budget)
+
+        # History also gets whatever the context left unused
+        history_text, history_tokens = self._fit_history(history, older, remaining - context_tokens)
+
+        tokens = used + context_tokens + history_tokens
+        metrics.increment("prompt.assembled")
+        metrics.increment("prompt.tokens", tokens)
+        return PromptParts(template, user_message, documents, history_text, tokens)
+
+    def _fit(self, text: str, max_tokens: int) -> str:
+        if self.tokenizer.count(text) <= max_tokens:
+            return text
+        metrics.increment("prompt.truncations")
+        return self.tokenizer.truncate(text, max_tokens)
+
+    def _fit_context(self, context: Sequence[Dict[str, Any]], budget: int) -> Tuple[List[str], int]:
+        """Keep the most relevant documents that fit, truncating the first that does not"""
+        ranked = sorted(context, key=lambda document: -document.get("relevance", float("-inf")))
+        documents: List[str] = []
+        used = 0
+        for index, document in enumerate(ranked):
+            content = document.get("content", "No content")
+            # Each document is listed as "- content" on its own line
+            cost = self.tokenizer.count(content) + 2
+            if used + cost <= budget:
+                documents.append(content)
+                used += cost
+                continue
+
+            room = budget - used - 2
+            if room >= settings.PROMPT_MIN_DOCUMENT_TOKENS:
+                content = self.tokenizer.truncate(content, room)
+                documents.append(content)
+                used += self.tokenizer.count(content) + 2
+                metrics.increment("prompt.truncated_documents")
+                index += 1
+            metrics.increment("prompt.dropped_documents", len(ranked) - index)
+            break
+        return documents, used
+
+    def _fit_history(
+        self,
+        history: Sequence[Tuple[str, str]],
+        older: Iterable[str],
+        budget: int
+    ) -> Tuple[str, int]:
+        """Newest messages verbatim, then a summary of earlier ones, within the budget"""
+        count = self.tokenizer.count
+        older = iter(older)
+        first_older = next(older, None)
+        if first_older is not None:
+            older = chain([first_older], older)
+
+        # With anything to summarize, part of the budget is kept for the summary
+        verbatim_budget = budget
+        if first_older is not None or len(history) > 1:
+            verbatim_budget -= int(budget * settings.PROMPT_SUMMARY_SHARE)
+
+        verbatim: List[str] = []
+        used = 0
+        index = len(history)
+        while index > 0:
+            cost = count(history[index - 1][0])
+            if used + cost > verbatim_budget:
+                break
+            verbatim.append(history[index - 1][0])
+            used += cost
+            index -= 1
+
+        if not verbatim and history:
+            # Even the newest message is too long; keep its beginning
+            newest = self.tokenizer.truncate(history[-1][0], verbatim_budget)
+            verbatim.append(newest + "\n\n" if newest else "")
+            used += count(newest)
+            index -= 1
+        verbatim.reverse()
+
+        summary: List[str] = []
+        header_cost = count(self.SUMMARY_HEADER)
+        overflow = (line for _, line in reversed(history[:max(index, 0)]))
+        for line in chain(overflow, older):
+            cost = count(line) + (0 if summary else header_cost)
+            if used + cost > budget:
+                break
+            summary.append(line)
+            used += cost
+        if summary:
+            metrics.increment("prompt.summarized_messages", len(summary))
+            summary.reverse()
+            return self.SUMMARY_HEADER + "\n".join(summary) + "\n\n" + "".join(verbatim), used
+        return "".join(verbatim), used
+
+
+def summarize_line(speaker: str, content: str, max_words: Optional[int] = None) -> str:
+    """One-line digest of a message for older history: its opening words only"""
+    max_words = max_words or settings.PROMPT_SUMMARY_WORDS
+    words = content.split()
+    digest = " ".join(words[:max_words])
+    if len(words) > max_words:
+        digest += TRUNCATION_MARKER
+    return f"{speaker}: {digest}"
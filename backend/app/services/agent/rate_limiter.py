@@ -0,0 +1,187 @@
+from typing import Dict, List, Optional, AsyncIterator
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# Thread whose discussion is making backend calls; set by process_with_agents
+# and inherited by the tasks it starts, so fairness needs no extra arguments
+call_thread: ContextVar[Optional[str]] = ContextVar("call_thread", default=None)
+
+
+class CallPriority:
+    """Priority classes of backend calls, most urgent first"""
+    INITIAL_RESPONSE = 0  # an agent's first answer, the latency users notice
+    DISCUSSION = 1
+    SYNTHESIS = 2
+    BACKGROUND = 3  # MCP work nobody is waiting on
+
+    NAMES = ("initial_response", "discussion", "synthesis", "background")
+
+    @classmethod
+    def for_kind(cls, kind: str) -> int:
+        """Priority of an MCP request kind"""
+        return {
+            "response": cls.INITIAL_RESPONSE,
+            "synthesis": cls.SYNTHESIS,
+            "synthesis_update": cls.SYNTHESIS
+        }.get(kind, cls.DISCUSSION)
+
+
+class PriorityRateLimiter:
+    """Token-bucket rate limit and concurrency cap for backend calls
+
+    A call needs a token, refilled at BACKEND_RATE_LIMIT_QPS up to
+    BACKEND_RATE_LIMIT_BURST, and one of BACKEND_RATE_LIMIT_MAX_CONCURRENT
+    slots, held until it finishes; 0 disables either limit. Waiting calls
+    are granted by priority class, so a user's first agent response never
+    queues behind discussion rounds, syntheses or background work. Within
+    a class, threads take turns, one call each, so one busy thread cannot
+    starve the others. Retries and hedged duplicates of a call hold no
+    slot of their own but each take a token, so they count against the
+    request rate too.
+
+    Time spent waiting is counted per class as
+    rate_limit.<class>.wait_seconds over rate_limit.<class>.acquired.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrent: Optional[int] = None
+    ):
+        self.rate = rate if rate is not None else settings.BACKEND_RATE_LIMIT_QPS
+        self.burst = burst or settings.BACKEND_RATE_LIMIT_BURST
+        self.max_concurrent = max_concurrent if max_concurrent is not None else settings.BACKEND_RATE_LIMIT_MAX_CONCURRENT
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        # Per class, waiting calls by thread; dict order is the threads' turn order
+        self.waiting: List[Dict[Optional[str], deque]] = [{} for _ in CallPriority.NAMES]
+        self.queued = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        metrics.register_gauge("rate_limit.in_flight", lambda: self.in_flight)
+        metrics.register_gauge("rate_limit.queued", lambda: self.queued)
+
+    @asynccontextmanager
+    async def slot(self, priority: int, thread_id: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold a call slot for the duration of the block"""
+        await self.acquire(priority, thread_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: int, thread_id: Optional[str] = None):
+        """Wait until a call of the given class may start; pair with release"""
+        start = time.monotonic()
+        if not self.queued and self._available():
+            self._take()
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiting[priority].setdefault(thread_id, deque()).append(waiter)
+            self.queued += 1
+            try:
+                self._dispatch()
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Granted just as the caller gave up; pass the slot on
+                    self.release()
+                else:
+                    self._remove(priority, thread_id, waiter)
+                raise
+
+        name = CallPriority.NAMES[priority]
+        metrics.increment(f"rate_limit.{name}.acquired")
+        metrics.increment(f"rate_limit.{name}.wait_seconds", time.monotonic() - start)
+
+    def release(self):
+        """Free a slot taken by acquire"""
+        self.in_flight -= 1
+        self._dispatch()
+
+    def try_charge(self) -> bool:
+        """Take a token for an extra request of a call holding a slot, if one is left"""
+        self._refill()
+        if self.rate:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+        metrics.increment("rate_limit.extra_requests")
+        return True
+
+    async def charge(self):
+        """Wait for a token for an extra request of a call holding a slot"""
+        while not self.try_charge():
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _has_slot(self) -> bool:
+        return not self.max_concurrent or self.in_flight < self.max_concurrent
+
+    def _available(self) -> bool:
+        self._refill()
+        return self._has_slot() and (not self.rate or self.tokens >= 1)
+
+    def _take(self):
+        self.in_flight += 1
+        if self.rate:
+            self.tokens -= 1
+
+    def _dispatch(self):
+        """Grant waiting calls while tokens and slots allow"""
+        while self.queued and self._available():
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._take()
+            waiter.set_result(None)
+
+        if self.queued and self.rate and self._has_slot() and self._timer is None:
+            # Out of tokens: try again once the next one has been refilled
+            delay = (1 - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        """Oldest waiter of the next thread in turn in the most urgent class"""
+        for queues in self.waiting:
+            while queues:
+                thread_id = next(iter(queues))
+                queue = queues.pop(thread_id)
+                waiter = queue.popleft()
+                if queue:
+                    # The thread's next call waits for the other threads' turns
+                    queues[thread_id] = queue
+                self.queued -= 1
+                if not waiter.cancelled():
+                    return waiter
+        return None
+
+    def _remove(self, priority: int, thread_id: Optional[str], waiter: asyncio.Future):
+        queue = self.waiting[priority].get(thread_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self.queued -= 1
+        if not queue:
+            del self.waiting[priority][thread_id]
+
+
+# Shared by every backend caller, so the limits hold process-wide
+backend_limiter = PriorityRateLimiter()
@@ -0,0 +1,182 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Content-addressed cache of generated responses
+
+    Entries are keyed by a hash of the fully rendered prompt plus the
+    model parameters, so identical requests from any thread share one
+    answer. Recent entries live in an in-memory LRU; with a directory
+    configured, every entry is also written to disk as one JSON file per
+    key and survives restarts. Entries older than the TTL are ignored, and
+    their files deleted when read. Once the disk tier holds more than
+    RESPONSE_CACHE_DISK_MAX_ENTRIES files, the oldest are evicted down to
+    nine tenths of it, so the directory is scanned only now and then.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        directory: Optional[str] = None,
+        disk_max_entries: Optional[int] = None
+    ):
+        self.max_entries = max_entries if max_entries is not None else settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else settings.RESPONSE_CACHE_TTL
+        self.directory = directory if directory is not None else settings.RESPONSE_CACHE_DIR
+        self.disk_max_entries = disk_max_entries if disk_max_entries is not None else settings.RESPONSE_CACHE_DISK_MAX_ENTRIES
+        # Files in the disk tier, counted on the first write
+        self.disk_entries: Optional[int] = None
+        self._evicting = False
+        # key -> (content, created_at), least recently used first
+        self.entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        metrics.register_gauge("response_cache.entries", lambda: len(self.entries))
+
+    @staticmethod
+    def key(kind: str, prompt: str, role: Optional[str], params: Dict[str, Any]) -> str:
+        """Hash identifying a generation request"""
+        request = {"kind": kind, "role": role, "prompt": prompt, "params": params}
+        encoded = json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Cached content for a key, or None on a miss"""
+        entry = self.entries.get(key)
+        if entry is not None and self._fresh(entry[1]):
+            self.entries.move_to_end(key)
+            metrics.increment("response_cache.memory_hits")
+            return entry[0]
+        self.entries.pop(key, None)
+
+        if self.directory:
+            entry, removed = await asyncio.to_thread(self._read, key)
+            if removed and self.disk_entries:
+                self.disk_entries -= 1
+            if entry is not None:
+                self._remember(key, entry)
+                metrics.increment("response_cache.disk_hits")
+                return entry[0]
+
+        metrics.increment("response_cache.misses")
+        return None
+
+    async def set(self, key: str, content: str):
+        """Store content under a key in both tiers"""
+        entry = (content, time.time())
+        self._remember(key, entry)
+        if self.directory:
+            try:
+                if self.disk_entries is None:
+                    self.disk_entries = await asyncio.to_thread(self._count_files)
+                if await asyncio.to_thread(self._write, key, entry):
+                    self.disk_entries += 1
+            except OSError as e:
+                # The memory tier still holds the entry; the disk tier is best effort
+                metrics.increment("response_cache.write_errors")
+                logger.warning("Error writing response cache entry: %s", e)
+                return
+            if self.disk_max_entries and self.disk_entries > self.disk_max_entries and not self._evicting:
+                self._evicting = True
+                try:
+                    self.disk_entries = await asyncio.to_thread(self._evict_files, int(self.disk_max_entries * 0.9))
+                finally:
+                    self._evicting = False
+
+    def clear(self):
+        """Drop the in-memory tier"""
+        self.entries.clear()
+
+    def _fresh(self, created_at: float) -> bool:
+        return self.ttl <= 0 or time.time() - created_at < self.ttl
+
+    def _remember(self, key: str, entry: Tuple[str, float]):
+        """Insert into the memory tier, evicting the least recently used entries"""
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            metrics.increment("response_cache.evictions")
+
+    def _path(self, key: str) -> str:
+        # Fan out by prefix so no single directory grows too large
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read(self, key: str) -> Tuple[Optional[Tuple[str, float]], bool]:
+        """A fresh entry from disk, and whether an expired or unreadable file was deleted"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entry = data["content"], data["created_at"]
+        except OSError:
+            return None, False
+        except (ValueError, KeyError):
+            entry = None
+        if entry is not None and self._fresh(entry[1]):
+            return entry, False
+        return None, self._remove_file(path)
+
+    def _remove_file(self, path: str) -> bool:
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        metrics.increment("response_cache.disk_evictions")
+        return True
+
+    def _files(self) -> List[str]:
+        """Paths of the entries in the disk tier"""
+        paths = []
+        for prefix in os.listdir(self.directory):
+            folder = os.path.join(self.directory, prefix)
+            if os.path.isdir(folder):
+                paths.extend(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".json"))
+        return paths
+
+    def _count_files(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+        return len(self._files())
+
+    def _evict_files(self, keep: int) -> int:
+        """Delete the oldest files beyond keep; returns how many are left"""
+        files = []
+        for path in self._files():
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        files.sort()
+        excess = files[:max(len(files) - keep, 0)]
+        removed = sum(self._remove_file(path) for _, path in excess)
+        return len(files) - removed
+
+    def _write(self, key: str, entry: Tuple[str, float]) -> bool:
+        """Write an entry to disk; returns whether it added a file"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        added = not os.path.exists(path)
+        # Write then rename so readers never see a partial file; the temp
+        # file is unique, since writes of one key may run concurrently
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"content": entry[0], "created_at": entry[1]}, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+        return added
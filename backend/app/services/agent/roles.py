@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional, Iterator, Mapping, Sequence
+from functools import lru_cache
+
+from app.schemas.agent import Agent, AgentRole, RoleDefinition
+from app.core.config import settings
+
+
+# Shared, immutable role definitions; per-thread agents only reference them
+ROLE_DEFINITIONS: Dict[AgentRole, RoleDefinition] = {
+    AgentRole.RESEARCHER: RoleDefinition(
+        role=AgentRole.RESEARCHER,
+        name="Researcher Agent",
+        description="Specialist in researcher thinking",
+        prompt_template="You are a research specialist focusing on {topic}. "
+                        "Your role is to provide factual information, cite sources, "
+                        "and ensure discussions are grounded in evidence. "
+                        "When contributing, focus on finding and sharing relevant information.",
+        retrieval_focus="Evidence, facts, data and sources."
+    ),
+    AgentRole.CRITIC: RoleDefinition(
+        role=AgentRole.CRITIC,
+        name="Critic Agent",
+        description="Specialist in critic thinking",
+        prompt_template="You are a critical thinker examining {topic}. "
+                        "Your role is to identify potential issues, challenge assumptions, "
+                        "and ensure logical consistency. "
+                        "When contributing, focus on finding flaws or alternative perspectives.",
+        retrieval_focus="Limitations, risks, criticisms and counterarguments."
+    ),
+    AgentRole.CREATIVE: RoleDefinition(
+        role=AgentRole.CREATIVE,
+        name="Creative Agent",
+        description="Specialist in creative thinking",
+        prompt_template="You are a creative thinker exploring {topic}. "
+                        "Your role is to suggest novel approaches, make unexpected connections, "
+                        "and think outside conventional boundaries. "
+                        "When contributing, focus on innovative ideas and possibilities.",
+        retrieval_focus="Novel ideas, analogies and alternative approaches."
+    ),
+    AgentRole.SUMMARIZER: RoleDefinition(
+        role=AgentRole.SUMMARIZER,
+        name="Summarizer Agent",
+        description="Specialist in summarizer thinking",
+        prompt_template="You are a synthesis specialist for discussions about {topic}. "
+                        "Your role is to consolidate information, identify key points, "
+                        "and create coherent summaries. "
+                        "When contributing, focus on bringing together different perspectives.",
+        retrieval_focus="Key points, definitions and conclusions."
+    ),
+    AgentRole.ANALYST: RoleDefinition(
+        role=AgentRole.ANALYST,
+        name="Analyst Agent",
+        description="Specialist in analyst thinking",
+        prompt_template="You are an analytical expert examining {topic}. "
+                        "Your role is to break down complex issues, identify patterns, "
+                        "and provide structured analysis. "
+                        "When contributing, focus on systematic evaluation of information.",
+        retrieval_focus="Structure, components, patterns, causes and metrics."
+    ),
+    AgentRole.GENERALIST: RoleDefinition(
+        role=AgentRole.GENERALIST,
+        name="Generalist Agent",
+        description="Specialist in generalist thinking",
+        prompt_template="You are a generalist with broad knowledge about {topic}. "
+                        "Your role is to provide balanced perspectives, connect different domains, "
+                        "and ensure comprehensive coverage. "
+                        "When contributing, focus on integrating diverse viewpoints.",
+        retrieval_focus="Overview, context and connections across domains."
+    ),
+}
+
+
+def selected_roles(count: Optional[int] = None) -> List[AgentRole]:
+    """Roles given to the agents of a new thread"""
+    return list(AgentRole)[:count if count is not None else settings.DEFAULT_AGENT_COUNT]
+
+
+@lru_cache(maxsize=1024)
+def render_prompt(role: AgentRole, topic: str) -> str:
+    """Prompt template of a role for a topic, shared by threads on the same topic"""
+    return ROLE_DEFINITIONS[role].render(topic)
+
+
+def retrieval_query(role: AgentRole, question: str, recent: Sequence[str] = ()) -> str:
+    """
+    Knowledge base query for what an agent of a role needs next
+    
+    The question comes first and the role's focus second, so both survive
+    the embedding model's input limit; recent holds one-line summaries
+    of the latest messages, for discussion rounds.
+    """
+    parts = [question, ROLE_DEFINITIONS[role].retrieval_focus, *recent]
+    return "\n".join(part for part in parts if part)
+
+
+class PromptTemplates(Mapping[AgentRole, str]):
+    """Read-only mapping of role -> prompt template for a topic
+
+    Templates are rendered when read, so building one costs nothing and
+    threads keep only the topic.
+    """
+
+    def __init__(self, topic: str, roles: List[AgentRole]):
+        self.topic = topic
+        self.roles = roles
+
+    def __getitem__(self, role: AgentRole) -> str:
+        if role not in self.roles:
+            raise KeyError(role)
+        return render_prompt(role, self.topic)
+
+    def __iter__(self) -> Iterator[AgentRole]:
+        return iter(self.roles)
+
+    def __len__(self) -> int:
+        return len(self.roles)
+
+
+class ThreadAgent:
+    """Compact per-thread agent: an id, a shared role definition and a topic
+
+    An explicit prompt template overrides the role's, e.g. for custom
+    templates. Materialize with to_agent when the full schema is needed.
+    """
+
+    __slots__ = ("id", "definition", "topic", "template")
+
+    def __init__(
+        self,
+        id: str,
+        definition: RoleDefinition,
+        topic: Optional[str] = None,
+        template: Optional[str] = None
+    ):
+        self.id = id
+        self.definition = definition
+        self.topic = topic
+        self.template = template
+
+    @property
+    def role(self) -> AgentRole:
+        return self.definition.role
+
+    @property
+    def prompt_template(self) -> str:
+        if self.template is not None:
+            return self.template
+        return render_prompt(self.definition.role, self.topic or "")
+
+    def to_agent(self) -> Agent:
+        """Full Agent schema, with the prompt rendered"""
+        return Agent(
+            id=self.id,
+            name=self.definition.name,
+            role=self.definition.role,
+            description=self.definition.description,
+            prompt_template=self.prompt_template
+        )
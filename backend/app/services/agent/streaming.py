@@ -0,0 +1,38 @@
+from typing import AsyncIterator
+import asyncio
+import re
+
+
+# Words with their trailing whitespace, so joining the chunks restores the text
+_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def split_tokens(text: str):
+    """Split text into word-sized chunks that join back to the original"""
+    return _TOKEN_PATTERN.findall(text)
+
+
+async def simulate_token_stream(
+    text: str,
+    total_delay: float,
+    first_token_share: float = 0.2
+) -> AsyncIterator[str]:
+    """
+    Yield a simulated response the way an LLM API streams it
+    
+    The first token arrives after a share of the total delay and the rest
+    are spread evenly over the remainder, so a streamed response takes as
+    long as the equivalent non-streaming call but starts much earlier.
+    """
+    tokens = split_tokens(text)
+    if not tokens:
+        await asyncio.sleep(total_delay)
+        return
+    
+    await asyncio.sleep(total_delay * first_token_share)
+    yield tokens[0]
+    
+    interval = total_delay * (1 - first_token_share) / max(len(tokens) - 1, 1)
+    for token in tokens[1:]:
+        await asyncio.sleep(interval)
+        yield token
@@ -0,0 +1,104 @@
+from typing import List, AsyncIterator, Callable, Optional, Sequence, Set
+import asyncio
+import logging
+
+from app.schemas.chat import ChatMessage
+from app.core.metrics import metrics
+from app.services.agent.a2a_protocol import A2AProtocol
+from app.services.agent.streaming import split_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalSynthesizer:
+    """Running synthesis of one discussion, revised as agent messages are saved
+
+    Each saved message is folded into the running summary in the
+    background while later turns run. Messages saved while a fold is in
+    progress are folded together in the next one, so at most one fold
+    runs at a time and a burst of messages costs one call. After each fold
+    on_update receives the summary and how many messages it covers.
+
+    The final synthesis only has to wait for the fold of the last
+    messages, instead of reading the whole discussion after the last round.
+    A fold still running when it is asked for, which misses some of those
+    messages, is cancelled and redone with them rather than waited for.
+    """
+
+    def __init__(
+        self,
+        a2a_protocol: A2AProtocol,
+        on_update: Optional[Callable[[str, int], None]] = None
+    ):
+        self.a2a_protocol = a2a_protocol
+        self.on_update = on_update
+        self.summary = ""
+        self.folded: Set[str] = set()  # ids of messages in the summary
+        self.queued: Set[str] = set()  # ids of messages added, folded or not
+        self.pending: List[ChatMessage] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, message: ChatMessage):
+        """Queue a saved message to be folded into the summary"""
+        if not message.content or message.id in self.queued:
+            return
+        self.queued.add(message.id)
+        self.pending.append(message)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._fold_pending())
+
+    async def final(self, messages: Sequence[ChatMessage]) -> str:
+        """The synthesis, once every given message is folded in"""
+        for message in messages:
+            self.add(message)
+        if self._task is not None and not self._task.done():
+            if self.pending:
+                # The fold in progress misses the latest messages; one fold of everything is quicker
+                await self.close()
+            else:
+                # Shielded, so a cancelled caller does not leave a fold half-applied
+                await asyncio.shield(self._task)
+        if self.pending:
+            # Fold what is left here, letting errors reach the caller
+            await self._fold(self._take_pending())
+        return self.summary
+
+    async def stream_final(self, messages: Sequence[ChatMessage]) -> AsyncIterator[str]:
+        """Stream the final synthesis as text chunks"""
+        for token in split_tokens(await self.final(messages)):
+            yield token
+
+    async def close(self):
+        """Stop the fold in progress; its messages stay pending"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _fold_pending(self):
+        while self.pending:
+            batch = self._take_pending()
+            try:
+                await self._fold(batch)
+            except asyncio.CancelledError:
+                self.pending = batch + self.pending
+                raise
+            except Exception as e:
+                # Keep the messages for the final synthesis to retry
+                logger.warning("Synthesis update failed: %s", e)
+                self.pending = batch + self.pending
+                return
+
+    async def _fold(self, batch: List[ChatMessage]):
+        self.summary = await self.a2a_protocol.update_synthesis(self.summary, [A2AProtocol.message_dict(msg) for msg in batch])
+        self.folded.update(msg.id for msg in batch)
+        metrics.increment("synthesis.updates")
+        metrics.increment("synthesis.folded_messages", len(batch))
+        if self.on_update is not None:
+            self.on_update(self.summary, len(self.folded))
+
+    def _take_pending(self) -> List[ChatMessage]:
+        batch, self.pending = self.pending, []
+        return batch
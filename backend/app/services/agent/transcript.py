@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Iterator
+
+from app.schemas.chat import ChatMessage
+from app.services.agent.a2a_protocol import A2AProtocol
+
+
+class DiscussionTranscript:
+    """Formatted messages of one discussion, for building A2A prompts
+
+    Each message is formatted once, when it is appended, together with
+    the one-line digest used in summaries of older history. Turns then
+    render a window of the messages they read by joining the stored
+    strings, so a turn's formatting cost depends on the window size,
+    not on how long the discussion has grown.
+    """
+
+    def __init__(self, messages: Sequence[ChatMessage] = ()):
+        self.entries: List[str] = []
+        self.summaries: List[str] = []  # opening words of each entry, for the digest of older history
+        self.positions: Dict[str, int] = {}  # message id -> index in entries
+        for message in messages:
+            self.append(message)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self.positions
+
+    def append(self, message: ChatMessage):
+        """Format a message and add it to the transcript"""
+        if message.id in self.positions:
+            return
+        msg = A2AProtocol.message_dict(message)
+        self.positions[message.id] = len(self.entries)
+        self.entries.append(A2AProtocol.format_message(msg))
+        self.summaries.append(A2AProtocol.summarize_message(msg))
+
+    def render(self, messages: Sequence[ChatMessage], last: Optional[int] = None) -> str:
+        """
+        Formatted text of the given messages, or of only the last few
+
+        Messages not yet in the transcript are appended first.
+        """
+        window = messages[-last:] if last else messages
+        return "".join(self._pair(message)[0] for message in window)
+
+    def history(
+        self,
+        messages: Sequence[ChatMessage],
+        last: Optional[int] = None
+    ) -> Tuple[List[Tuple[str, str]], Iterator[str]]:
+        """
+        A window of messages as (formatted, summary line) pairs, oldest first,
+        and the summary lines of the messages before it, newest first
+
+        The summary lines are produced lazily, so prompt assembly only
+        touches as much older history as its budget has room for.
+        """
+        window = messages[-last:] if last else messages
+        history = [self._pair(message) for message in window]
+        older = (self._pair(messages[i])[1] for i in range(len(messages) - len(window) - 1, -1, -1))
+        return history, older
+
+    def _pair(self, message: ChatMessage) -> Tuple[str, str]:
+        if message.id not in self.positions:
+            self.append(message)
+        position = self.positions[message.id]
+        return self.entries[position], self.summaries[position]
+
+    def tail(self, count: int) -> str:
+        """Formatted text of the most recent messages"""
+        return "".join(self.entries[-count:]) if count > 0 else ""
@@ -0,0 +1,143 @@
+from typing import List, Dict, Any, Optional, AsyncIterator, Set
+import json
+import asyncio
+
+from app.schemas.chat import ChatMessage, Thread
+from app.core.config import settings
+from app.services.chat.thread_manager import ThreadManager
+
+
+class ArchiveFormatError(ValueError):
+    """Raised when an NDJSON archive line cannot be imported"""
+
+    def __init__(self, line_number: int, reason: str):
+        super().__init__(f"Line {line_number}: {reason}")
+        self.line_number = line_number
+
+
+class ThreadArchive:
+    """Streaming NDJSON export and import of threads
+
+    An archive is one JSON object per line. Each thread is written as a
+    {"type": "thread", "thread": {...}} line followed by one
+    {"type": "message", "message": {...}} line per message. Both directions
+    work in fixed-size chunks, so memory use does not grow with the archive.
+    """
+
+    def __init__(self, thread_manager: ThreadManager):
+        self.thread_manager = thread_manager
+
+    async def export_ndjson(self, thread_ids: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+        """Stream threads and their messages as NDJSON chunks"""
+        if thread_ids is None:
+            thread_ids = list(self.thread_manager.threads.keys())
+
+        chunk_lines = settings.ARCHIVE_EXPORT_CHUNK_LINES
+        lines: List[str] = []
+
+        for thread_id in thread_ids:
+            thread = await self.thread_manager.get_thread(thread_id)
+            lines.append(json.dumps({"type": "thread", "thread": thread.model_dump(mode="json")}))
+
+            for record in self.thread_manager.iter_message_records(thread_id):
+                lines.append(json.dumps({"type": "message", "message": record.to_dict()}))
+
+                if len(lines) >= chunk_lines:
+                    yield ("\n".join(lines) + "\n").encode()
+                    lines = []
+                    # Let other requests run between chunks
+                    await asyncio.sleep(0)
+
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+    async def import_ndjson(
+        self,
+        chunks: AsyncIterator[bytes],
+        created_threads: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Import an NDJSON archive from a stream of byte chunks
+
+        Messages are inserted in batches. Threads that already exist are
+        kept and imported messages are appended to them; messages whose id
+        is already in such a thread are skipped, so importing an archive
+        twice adds nothing. Threads the import creates are not checked. On a malformed line an ArchiveFormatError is
+        raised; batches before it stay imported. The ids of created threads
+        are appended to created_threads as they are created, so a caller
+        sees them even when the import fails.
+        """
+        batch_size = settings.ARCHIVE_IMPORT_BATCH_SIZE
+        if created_threads is None:
+            created_threads = []
+        created = set(created_threads)
+        message_count = 0
+        skipped_count = 0
+        batch: List[ChatMessage] = []
+        buffer = b""
+        line_number = 0
+
+        async def flush():
+            nonlocal message_count, skipped_count, batch
+            messages, batch = batch, []
+            # Messages for threads that existed before may already be stored there
+            existing: Dict[str, Set[str]] = {}
+            for thread_id in {message.thread_id for message in messages if message.thread_id not in created}:
+                existing[thread_id] = self.thread_manager.existing_message_ids(thread_id, [
+                    message.id for message in messages if message.thread_id == thread_id
+                ])
+            kept = []
+            for message in messages:
+                seen = existing.get(message.thread_id)
+                if seen is not None:
+                    if message.id in seen:
+                        skipped_count += 1
+                        continue
+                    seen.add(message.id)
+                kept.append(message)
+            message_count += await self.thread_manager.add_messages(kept)
+
+        async def import_line(line: bytes):
+            try:
+                record = json.loads(line)
+                record_type = record.get("type")
+                if record_type == "thread":
+                    # Flush so messages never precede their thread
+                    if batch:
+                        await flush()
+                    thread = Thread(**record["thread"])
+                    if await self.thread_manager.import_thread(thread):
+                        created_threads.append(thread.id)
+                        created.add(thread.id)
+                elif record_type == "message":
+                    message = ChatMessage(**record["message"])
+                    if message.thread_id not in self.thread_manager.threads:
+                        raise ValueError(f"thread {message.thread_id} not found")
+                    batch.append(message)
+                    if len(batch) >= batch_size:
+                        await flush()
+                else:
+                    raise ValueError(f"unknown record type {record_type!r}")
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                raise ArchiveFormatError(line_number, str(e)) from e
+
+        async for chunk in chunks:
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_number += 1
+                if line.strip():
+                    await import_line(line)
+
+        if buffer.strip():
+            line_number += 1
+            await import_line(buffer)
+
+        if batch:
+            await flush()
+
+        return {
+            "created_threads": created_threads,
+            "messages": message_count,
+            "skipped_messages": skipped_count
+        }
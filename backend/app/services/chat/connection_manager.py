@@ -0,0 +1,220 @@
+from typing import Dict, Any, Optional, Hashable, Union
+from collections import deque
+import asyncio
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.chat.frames import Frame, FrameEncoding
+
+
+class SlowConsumerPolicy:
+    """What to do when a client's outbound queue is full"""
+    DROP = "drop"  # drop intermediate frames, keep final ones
+    COALESCE = "coalesce"  # replace a queued frame with the same coalesce key, else drop
+    DISCONNECT = "disconnect"  # close the connection
+
+
+class ClientConnection:
+    """A websocket with a bounded outbound queue drained by its own writer task
+
+    Producers only enqueue frames and never wait on the network. The writer
+    sends each frame in the encoding the client negotiated. Frames enqueued
+    with a coalesce key are intermediate: a later frame with the same key
+    supersedes them, so they may be dropped or replaced when the client
+    falls behind.
+    """
+
+    def __init__(
+        self,
+        connection_id: str,
+        thread_id: str,
+        websocket: WebSocket,
+        manager: "ConnectionManager",
+        encoding: str = FrameEncoding.JSON
+    ):
+        self.connection_id = connection_id
+        self.thread_id = thread_id
+        self.websocket = websocket
+        self.encoding = encoding
+        self.manager = manager
+        self.queue: deque = deque()
+        self.max_depth = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, frame: Frame, coalesce_key: Optional[Hashable] = None):
+        """Queue a frame for sending, applying the slow consumer policy when full"""
+        if self.closed:
+            return
+
+        if len(self.queue) >= settings.WS_OUTBOUND_QUEUE_SIZE and not self._make_room(coalesce_key, frame):
+            return
+
+        self.queue.append((coalesce_key, frame))
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self._ready.set()
+
+    def _make_room(self, coalesce_key: Optional[Hashable], frame: Frame) -> bool:
+        """Handle a full queue; returns True if the new frame should still be appended"""
+        policy = settings.WS_SLOW_CONSUMER_POLICY
+
+        if policy == SlowConsumerPolicy.COALESCE and coalesce_key is not None:
+            for index, (queued_key, _) in enumerate(self.queue):
+                if queued_key == coalesce_key:
+                    self.queue[index] = (coalesce_key, frame)
+                    metrics.increment("ws.frames_coalesced")
+                    return False
+
+        if policy in (SlowConsumerPolicy.DROP, SlowConsumerPolicy.COALESCE):
+            if coalesce_key is not None:
+                metrics.increment("ws.frames_dropped")
+                return False
+            # Final frames evict the oldest intermediate frame
+            for index, (queued_key, _) in enumerate(self.queue):
+                if queued_key is not None:
+                    del self.queue[index]
+                    metrics.increment("ws.frames_dropped")
+                    return True
+
+        # Nothing can be dropped without losing final messages
+        metrics.increment("ws.slow_consumer_disconnects")
+        self.manager.disconnect(self.thread_id, self.connection_id)
+        asyncio.create_task(self.close())
+        return False
+
+    async def _write_loop(self):
+        """Send queued frames in order until the connection is closed"""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self.queue:
+                _, frame = self.queue.popleft()
+                try:
+                    payload = frame.encode(self.encoding)
+                    if isinstance(payload, bytes):
+                        send = self.websocket.send_bytes(payload)
+                    else:
+                        send = self.websocket.send_text(payload)
+                    await asyncio.wait_for(send, timeout=settings.WS_SEND_TIMEOUT)
+                except Exception:
+                    # Connection might be closed or too slow to keep up
+                    self.manager.disconnect(self.thread_id, self.connection_id)
+                    await self.close()
+                    return
+
+    def stop(self):
+        """Stop the writer task and discard queued frames"""
+        self.closed = True
+        self.queue.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    async def close(self):
+        """Stop writing and close the socket, ignoring errors from dead sockets"""
+        self.stop()
+        try:
+            await asyncio.wait_for(self.websocket.close(), timeout=settings.WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """Registry of websocket connections keyed by thread
+
+    Broadcasting only touches the connections of the target thread and hands
+    each frame to the per-connection queues, so the caller never waits on a
+    client's network speed.
+    """
+
+    def __init__(self):
+        self.thread_connections: Dict[str, Dict[str, ClientConnection]] = {}
+
+        metrics.register_gauge("ws.connections", self.total_connections)
+        metrics.register_gauge("ws.queue_depth", self.queue_depth_stats)
+
+    def connect(
+        self,
+        thread_id: str,
+        websocket: WebSocket,
+        encoding: str = FrameEncoding.JSON
+    ) -> ClientConnection:
+        """Register an accepted websocket and start its writer"""
+        connection_id = f"{thread_id}_{id(websocket)}"
+        connection = ClientConnection(connection_id, thread_id, websocket, self, encoding)
+        self.thread_connections.setdefault(thread_id, {})[connection_id] = connection
+        return connection
+
+    def disconnect(self, thread_id: str, connection_id: str):
+        """Remove a connection from the registry and stop its writer"""
+        connections = self.thread_connections.get(thread_id)
+        if connections is None:
+            return
+        connection = connections.pop(connection_id, None)
+        if connection is not None:
+            connection.stop()
+        if not connections:
+            del self.thread_connections[thread_id]
+
+    async def close_thread(self, thread_id: str) -> int:
+        """Disconnect and close every client of a thread; returns how many"""
+        connections = list(self.thread_connections.pop(thread_id, {}).values())
+        await asyncio.gather(*(connection.close() for connection in connections))
+        return len(connections)
+
+    def connection_count(self, thread_id: str) -> int:
+        """Number of clients connected to a thread"""
+        return len(self.thread_connections.get(thread_id, {}))
+
+    def total_connections(self) -> int:
+        """Number of clients connected to any thread"""
+        return sum(len(connections) for connections in self.thread_connections.values())
+
+    def queue_depth_stats(self) -> Dict[str, int]:
+        """Current and peak outbound queue depths across connections"""
+        current = [
+            len(connection.queue)
+            for connections in self.thread_connections.values()
+            for connection in connections.values()
+        ]
+        peak = [
+            connection.max_depth
+            for connections in self.thread_connections.values()
+            for connection in connections.values()
+        ]
+        return {
+            "total": sum(current),
+            "max": max(current, default=0),
+            "peak": max(peak, default=0)
+        }
+
+    async def broadcast(
+        self,
+        thread_id: str,
+        message: Union[Frame, Dict[str, Any]],
+        coalesce_key: Optional[Hashable] = None
+    ):
+        """Queue a message for every client of a thread
+
+        The frame is shared by all clients, so it is encoded at most once
+        per wire encoding.
+        """
+        self.publish(thread_id, message, coalesce_key)
+
+    def publish(
+        self,
+        thread_id: str,
+        message: Union[Frame, Dict[str, Any]],
+        coalesce_key: Optional[Hashable] = None
+    ):
+        """Synchronous form of broadcast, for callbacks that cannot await"""
+        connections = list(self.thread_connections.get(thread_id, {}).values())
+        if not connections:
+            return
+
+        frame = message if isinstance(message, Frame) else Frame.from_dict(message)
+
+        # Iterate over the snapshot, since a full queue can disconnect its client
+        for connection in connections:
+            connection.enqueue(frame, coalesce_key)
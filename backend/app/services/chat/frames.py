@@ -0,0 +1,127 @@
+from typing import Any, Callable, Dict, Iterable, List, Union
+
+from app.schemas.chat import Thread
+from app.core.serialization import dumps, packb, pack_map_header, pack_array_header
+from app.services.chat.message_store import StoredMessage
+
+
+# Websocket frames are assembled from the cached encodings of stored
+# messages, so a message is never serialized more than once per wire
+# encoding regardless of how many clients receive it.
+
+
+class FrameEncoding:
+    """Wire encodings a websocket client can negotiate"""
+    JSON = "json"  # text frames
+    MSGPACK = "msgpack"  # binary frames
+
+
+class Frame:
+    """A websocket frame encoded lazily, at most once per wire encoding
+
+    JSON frames are text and MessagePack frames are bytes; the first
+    connection that needs an encoding builds it and the rest reuse it.
+    """
+
+    __slots__ = ("_builders", "_encoded")
+
+    def __init__(self, builders: Dict[str, Callable[[], Union[str, bytes]]]):
+        self._builders = builders
+        self._encoded: Dict[str, Union[str, bytes]] = {}
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, Any]) -> "Frame":
+        """Frame for an arbitrary JSON-compatible message"""
+        return cls({
+            FrameEncoding.JSON: lambda: dumps(message).decode(),
+            FrameEncoding.MSGPACK: lambda: packb(message),
+        })
+
+    def encode(self, encoding: str) -> Union[str, bytes]:
+        """Frame payload in the given encoding"""
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            encoded = self._encoded[encoding] = self._builders[encoding]()
+        return encoded
+
+
+def message_frame(record: StoredMessage) -> Frame:
+    """Frame announcing a newly saved message with its sequence number"""
+    return Frame({
+        FrameEncoding.JSON: lambda: (
+            b'{"type":"new_message","seq":' + dumps(record.seq)
+            + b',"message":' + record.to_json() + b"}"
+        ).decode(),
+        FrameEncoding.MSGPACK: lambda: (
+            pack_map_header(3)
+            + packb("type") + packb("new_message")
+            + packb("seq") + packb(record.seq)
+            + packb("message") + record.to_msgpack()
+        ),
+    })
+
+
+def delta_frame(draft: StoredMessage, offset: int, delta: str) -> Frame:
+    """Frame carrying text appended to a message that is still being generated
+
+    The draft is the message with empty content; its cached encoding is
+    reused for every delta of the message. offset is the length of the
+    content before this delta, so clients can detect frames they missed.
+    """
+    return Frame({
+        FrameEncoding.JSON: lambda: (
+            b'{"type":"message_delta","message":' + draft.to_json()
+            + b',"offset":' + dumps(offset) + b',"delta":' + dumps(delta) + b"}"
+        ).decode(),
+        FrameEncoding.MSGPACK: lambda: (
+            pack_map_header(4)
+            + packb("type") + packb("message_delta")
+            + packb("message") + draft.to_msgpack()
+            + packb("offset") + packb(offset)
+            + packb("delta") + packb(delta)
+        ),
+    })
+
+
+def _records_frame(header: Dict[str, Any], records: Iterable[StoredMessage]) -> Frame:
+    """Frame made of header fields followed by a "messages" list of stored messages"""
+    snapshot: List[StoredMessage] = list(records)
+
+    def build_json() -> str:
+        # Splice the cached message encodings into the encoded header object
+        messages = b",".join(record.to_json() for record in snapshot)
+        return (dumps(header)[:-1] + b',"messages":[' + messages + b"]}").decode()
+
+    def build_msgpack() -> bytes:
+        fields = b"".join(packb(key) + packb(value) for key, value in header.items())
+        return (
+            pack_map_header(len(header) + 1) + fields
+            + packb("messages") + pack_array_header(len(snapshot))
+            + b"".join(record.to_msgpack() for record in snapshot)
+        )
+
+    return Frame({
+        FrameEncoding.JSON: build_json,
+        FrameEncoding.MSGPACK: build_msgpack,
+    })
+
+
+def history_frame(thread: Thread, records: Iterable[StoredMessage], last_seq: int) -> Frame:
+    """Frame carrying a thread and its full message history"""
+    return _records_frame({
+        "type": "thread_history",
+        "thread": thread.model_dump(mode="json"),
+        "last_seq": last_seq,
+    }, records)
+
+
+def catchup_frame(records: List[StoredMessage], last_seq: int, complete: bool) -> Frame:
+    """Frame carrying messages a resuming client missed
+
+    Large gaps are sent as several pages; complete is set on the last one.
+    """
+    return _records_frame({
+        "type": "thread_catchup",
+        "last_seq": last_seq,
+        "complete": complete,
+    }, records)
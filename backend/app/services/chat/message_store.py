@@ -0,0 +1,190 @@
+from typing import Dict, Any, Mapping, Optional, Union
+from datetime import datetime, timedelta
+from types import MappingProxyType
+import sys
+import uuid
+
+from app.schemas.chat import ChatMessage
+from app.core.serialization import dumps, packb
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+EMPTY_METADATA: Mapping[str, Any] = MappingProxyType({})
+
+# Metadata with the same content shares one read-only instance, e.g. every
+# {"role": "critic", "round": 2} message points at the same mapping
+_shared_metadata: Dict[tuple, Mapping[str, Any]] = {}
+MAX_SHARED_METADATA_SHAPES = 4096
+
+
+def pack_id(value: Optional[str]) -> Union[int, str, None]:
+    """Store canonical UUID strings as 128-bit integers"""
+    if value is None:
+        return None
+    try:
+        parsed = uuid.UUID(value)
+    except (ValueError, AttributeError, TypeError):
+        return value
+    return parsed.int if str(parsed) == value else value
+
+
+def unpack_id(value: Union[int, str, None]) -> Optional[str]:
+    """Restore an id packed by pack_id"""
+    if isinstance(value, int):
+        return str(uuid.UUID(int=value))
+    return value
+
+
+def normalize_timestamp(value: datetime) -> datetime:
+    """Convert timezone-aware datetimes to naive local time like datetime.now()"""
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def pack_timestamp(value: datetime) -> int:
+    """Store a datetime as integer microseconds since the epoch"""
+    return (normalize_timestamp(value) - EPOCH) // MICROSECOND
+
+
+def unpack_timestamp(value: int) -> datetime:
+    """Restore a datetime packed by pack_timestamp"""
+    return EPOCH + timedelta(microseconds=value)
+
+
+def share_metadata(metadata: Dict[str, Any]) -> Mapping[str, Any]:
+    """Return a read-only instance for metadata, shared when its values are hashable"""
+    if not metadata:
+        return EMPTY_METADATA
+    try:
+        # Include value types so that e.g. True and 1 are not merged
+        key = tuple(sorted((k, type(v), v) for k, v in metadata.items()))
+        hash(key)
+    except TypeError:
+        # Nested or unhashable values cannot be shared
+        return MappingProxyType(dict(metadata))
+
+    shared = _shared_metadata.get(key)
+    if shared is None:
+        if len(_shared_metadata) >= MAX_SHARED_METADATA_SHAPES:
+            # Mostly unique metadata gains nothing from sharing
+            return MappingProxyType(dict(metadata))
+        shared = _shared_metadata[key] = MappingProxyType(dict(metadata))
+    return shared
+
+
+class StoredMessage:
+    """Compact in-memory form of a chat message
+
+    Thread and sender strings are interned, ids are packed into integers,
+    timestamps are integer microseconds and metadata is shared between
+    messages with the same shape. Stored messages are treated as immutable;
+    ChatMessage models are only built when a message leaves the store, and
+    the JSON encoding is computed once and reused for every client.
+    """
+
+    __slots__ = (
+        "_id",
+        "thread_id",
+        "sender_type",
+        "sender_id",
+        "content",
+        "_parent_id",
+        "_created_at",
+        "metadata",
+        "_json",
+        "_msgpack",
+        "seq",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        thread_id: str,
+        sender_type: str,
+        sender_id: str,
+        content: str,
+        parent_id: Optional[str],
+        created_at: datetime,
+        metadata: Dict[str, Any]
+    ):
+        self._id = pack_id(id)
+        self.thread_id = sys.intern(thread_id)
+        self.sender_type = sys.intern(sender_type)
+        self.sender_id = sys.intern(sender_id)
+        self.content = content
+        self._parent_id = pack_id(parent_id)
+        self._created_at = pack_timestamp(created_at)
+        self.metadata = share_metadata(metadata)
+        self._json: Optional[bytes] = None
+        self._msgpack: Optional[bytes] = None
+        # Position in the thread, starting at 1; assigned when stored
+        self.seq = 0
+
+    @classmethod
+    def from_message(cls, message: ChatMessage) -> "StoredMessage":
+        """Build a stored message from a ChatMessage"""
+        return cls(
+            id=message.id,
+            thread_id=message.thread_id,
+            sender_type=message.sender_type,
+            sender_id=message.sender_id,
+            content=message.content,
+            parent_id=message.parent_id,
+            created_at=message.created_at,
+            metadata=message.metadata
+        )
+
+    @property
+    def id(self) -> str:
+        return unpack_id(self._id)
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        return unpack_id(self._parent_id)
+
+    @property
+    def created_at(self) -> datetime:
+        return unpack_timestamp(self._created_at)
+
+    def to_json(self) -> bytes:
+        """JSON encoding of the message, serialized on first use and cached"""
+        if self._json is None:
+            self._json = dumps(self.to_dict())
+        return self._json
+
+    def to_msgpack(self) -> bytes:
+        """MessagePack encoding of the message, serialized on first use and cached"""
+        if self._msgpack is None:
+            self._msgpack = packb(self.to_dict())
+        return self._msgpack
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the message to a JSON-compatible dict without building a model"""
+        return {
+            "id": self.id,
+            "thread_id": self.thread_id,
+            "sender_type": self.sender_type,
+            "sender_id": self.sender_id,
+            "content": self.content,
+            "parent_id": self.parent_id,
+            "created_at": self.created_at.isoformat(),
+            # A copy, since the stored mapping may be shared with other messages
+            "metadata": dict(self.metadata)
+        }
+
+    def to_message(self) -> ChatMessage:
+        """Materialize the message as a ChatMessage"""
+        # Fields were validated when the message was stored
+        return ChatMessage.model_construct(
+            id=self.id,
+            thread_id=self.thread_id,
+            sender_type=self.sender_type,
+            sender_id=self.sender_id,
+            content=self.content,
+            parent_id=self.parent_id,
+            created_at=self.created_at,
+            metadata=dict(self.metadata)
+        )
@@ -0,0 +1,95 @@
+from typing import AsyncIterator, List
+import asyncio
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.schemas.chat import ChatMessage
+from app.services.chat.message_store import StoredMessage
+from app.services.chat.thread_manager import ThreadManager
+from app.services.chat.connection_manager import ConnectionManager
+from app.services.chat.frames import delta_frame, message_frame
+
+
+class MessageStream:
+    """Relays a message to a thread's clients while it is generated
+
+    Text chunks are forwarded as message_delta frames, batched so that a
+    thread gets at most one frame per WS_DELTA_INTERVAL per message. The
+    first chunk is always sent immediately. Once the stream ends the
+    message is stored and broadcast once as a regular new_message frame,
+    which clients treat as authoritative.
+
+    Cancelled streams keep what was generated, marked as partial.
+    """
+
+    def __init__(
+        self,
+        thread_manager: ThreadManager,
+        connection_manager: ConnectionManager,
+        message: ChatMessage
+    ):
+        self.thread_manager = thread_manager
+        self.connection_manager = connection_manager
+        self.message = message
+        self.draft = StoredMessage.from_message(message.model_copy(update={"content": ""}))
+        self.offset = 0
+        self.parts: List[str] = []
+
+    async def relay(self, chunks: AsyncIterator[str]) -> StoredMessage:
+        """Forward chunks as they arrive, then store and broadcast the full message
+
+        If the relay is cancelled, the stream is closed so the request behind
+        it is abandoned, and any text received so far is stored as a partial
+        message with the cancellation reason in its metadata.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        last_sent = None
+        pending: List[str] = []
+
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                pending.append(chunk)
+
+                now = loop.time()
+                if last_sent is None:
+                    metrics.increment("stream.messages")
+                    metrics.increment("stream.time_to_first_delta_seconds", now - started)
+                elif now - last_sent < settings.WS_DELTA_INTERVAL:
+                    continue
+
+                await self._send("".join(pending))
+                pending.clear()
+                last_sent = now
+        except asyncio.CancelledError as e:
+            self.parts.extend(pending)
+            if self.parts:
+                reason = e.args[0] if e.args else "cancelled"
+                self.message.metadata = {**self.message.metadata, "partial": True, "cancel_reason": reason}
+                await self._store()
+            raise
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        if pending:
+            await self._send("".join(pending))
+
+        return await self._store()
+
+    async def _store(self) -> StoredMessage:
+        """Store the message with the text relayed so far and broadcast it"""
+        self.message.content = "".join(self.parts)
+        record = await self.thread_manager.store_message(self.message)
+        await self.connection_manager.broadcast(self.message.thread_id, message_frame(record))
+        return record
+
+    async def _send(self, delta: str):
+        """Broadcast one delta; it may be dropped for slow clients, which the final message repairs"""
+        frame = delta_frame(self.draft, self.offset, delta)
+        self.parts.append(delta)
+        self.offset += len(delta)
+        await self.connection_manager.broadcast(self.message.thread_id, frame, coalesce_key=self.draft.id)
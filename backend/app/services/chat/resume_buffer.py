@@ -0,0 +1,68 @@
+from typing import Dict, List, Optional, Iterator, Tuple
+from collections import deque
+from itertools import islice
+
+from app.core.config import settings
+from app.services.chat.message_store import StoredMessage
+from app.services.chat.thread_manager import ThreadManager
+
+
+class ResumeBuffer:
+    """Per-thread ring buffer of the most recent messages, by sequence number
+
+    Reconnecting clients usually missed only a few messages, which this
+    buffer serves without touching thread storage. Gaps older than the
+    buffer fall back to paginated reads from ThreadManager.
+    """
+
+    def __init__(self, thread_manager: ThreadManager, size: Optional[int] = None):
+        self.thread_manager = thread_manager
+        self.size = size if size is not None else settings.WS_RESUME_BUFFER_SIZE
+        self.threads: Dict[str, deque] = {}
+
+    def append(self, record: StoredMessage):
+        """Remember a saved message; registered as a ThreadManager listener"""
+        buffer = self.threads.get(record.thread_id)
+        if buffer is None:
+            buffer = self.threads[record.thread_id] = deque(maxlen=self.size)
+        buffer.append(record)
+
+    def remove_thread(self, thread_id: str):
+        """Forget a deleted thread; registered as a ThreadManager delete listener"""
+        self.threads.pop(thread_id, None)
+
+    def since(self, thread_id: str, after_seq: int) -> Optional[List[StoredMessage]]:
+        """Messages after after_seq, or None if the buffer does not reach back that far"""
+        buffer = self.threads.get(thread_id)
+        if not buffer:
+            return [] if after_seq == 0 else None
+
+        oldest = buffer[0].seq
+        if after_seq < oldest - 1:
+            return None
+
+        # Sequence numbers in the buffer are consecutive
+        start = max(after_seq - oldest + 1, 0)
+        return list(islice(buffer, start, None))
+
+    def catchup(self, thread_id: str, after_seq: int) -> Iterator[Tuple[List[StoredMessage], int, bool]]:
+        """
+        Yield pages of missed messages as (messages, last_seq, complete)
+
+        Recent gaps come from the buffer as one page; older gaps are read
+        from thread storage in pages of WS_RESUME_PAGE_SIZE.
+        """
+        latest = self.thread_manager.last_seq(thread_id)
+
+        records = self.since(thread_id, after_seq)
+        if records is not None:
+            yield records, latest, True
+            return
+
+        while True:
+            page = self.thread_manager.get_message_records(thread_id, after_seq, settings.WS_RESUME_PAGE_SIZE)
+            after_seq += len(page)
+            complete = not page or after_seq >= latest
+            yield page, after_seq, complete
+            if complete:
+                return
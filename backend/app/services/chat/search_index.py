@@ -0,0 +1,190 @@
+from typing import List, Dict, Any, Optional, Tuple
+import heapq
+import math
+import re
+
+from app.services.chat.message_store import StoredMessage
+
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase index terms"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    """Incremental inverted index over chat message content
+
+    Each message gets an integer document id. For every term the index keeps
+    a postings map of document id -> term positions, so term queries only
+    touch the postings of the query terms and phrase queries can be checked
+    against positions without re-reading message content.
+    """
+
+    # BM25 parameters
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, Tuple[int, ...]]] = {}
+        self.documents: Dict[int, StoredMessage] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.thread_docs: Dict[str, List[int]] = {}
+        self.total_length = 0
+        self._next_doc_id = 0
+
+    def add_message(self, message: StoredMessage) -> int:
+        """Index a message and return its document id"""
+        doc_id = self._next_doc_id
+        self._next_doc_id += 1
+
+        terms = tokenize(message.content)
+        positions: Dict[str, List[int]] = {}
+        for position, term in enumerate(terms):
+            positions.setdefault(term, []).append(position)
+
+        for term, term_positions in positions.items():
+            self.postings.setdefault(term, {})[doc_id] = tuple(term_positions)
+
+        self.documents[doc_id] = message
+        self.doc_lengths[doc_id] = len(terms)
+        self.thread_docs.setdefault(message.thread_id, []).append(doc_id)
+        self.total_length += len(terms)
+
+        return doc_id
+
+    def remove_thread(self, thread_id: str) -> int:
+        """Drop every message of a thread from the index; returns how many"""
+        doc_ids = self.thread_docs.pop(thread_id, [])
+        for doc_id in doc_ids:
+            message = self.documents.pop(doc_id)
+            for term in set(tokenize(message.content)):
+                postings = self.postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+        return len(doc_ids)
+
+    def search(
+        self,
+        query: str,
+        thread_id: Optional[str] = None,
+        sender_id: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Search indexed messages
+
+        Bare words are matched as terms and double-quoted text as phrases.
+        All terms and phrases must match. Hits are ranked with BM25 and
+        returned as one page together with the total number of matches.
+        """
+        phrases = [tokenize(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+        phrases = [phrase for phrase in phrases if phrase]
+        terms = tokenize(PHRASE_PATTERN.sub(" ", query))
+
+        query_terms = set(terms)
+        for phrase in phrases:
+            query_terms.update(phrase)
+
+        if not query_terms:
+            return {"total": 0, "hits": []}
+
+        # Every term must occur, so an unknown term means no results
+        term_postings = []
+        for term in query_terms:
+            postings = self.postings.get(term)
+            if not postings:
+                return {"total": 0, "hits": []}
+            term_postings.append((term, postings))
+
+        # Intersect starting from the rarest term
+        term_postings.sort(key=lambda item: len(item[1]))
+        rarest = term_postings[0][1]
+        doc_ids = rarest.keys()
+        if thread_id is not None:
+            # A thread filter can be narrower than the rarest postings list
+            thread_doc_ids = self.thread_docs.get(thread_id, [])
+            if len(thread_doc_ids) < len(rarest):
+                doc_ids = [doc_id for doc_id in thread_doc_ids if doc_id in rarest]
+        candidates = self._filter_candidates(doc_ids, thread_id, sender_id)
+        for _, postings in term_postings[1:]:
+            candidates = [doc_id for doc_id in candidates if doc_id in postings]
+            if not candidates:
+                return {"total": 0, "hits": []}
+
+        for phrase in phrases:
+            candidates = [
+                doc_id for doc_id in candidates
+                if self._matches_phrase(doc_id, phrase)
+            ]
+
+        scored = self._score(candidates, term_postings)
+        page = heapq.nlargest(offset + limit, scored, key=lambda item: (item[1], item[0]))[offset:]
+
+        return {
+            "total": len(scored),
+            "hits": [
+                {"message": self.documents[doc_id].to_message(), "score": score}
+                for doc_id, score in page
+            ]
+        }
+
+    def _filter_candidates(
+        self,
+        doc_ids,
+        thread_id: Optional[str],
+        sender_id: Optional[str]
+    ) -> List[int]:
+        """Apply thread and sender filters to a set of document ids"""
+        candidates = []
+        for doc_id in doc_ids:
+            message = self.documents[doc_id]
+            if thread_id is not None and message.thread_id != thread_id:
+                continue
+            if sender_id is not None and message.sender_id != sender_id:
+                continue
+            candidates.append(doc_id)
+        return candidates
+
+    def _matches_phrase(self, doc_id: int, phrase: List[str]) -> bool:
+        """Check whether the phrase terms occur consecutively in a document"""
+        starts = set(self.postings[phrase[0]][doc_id])
+        for offset, term in enumerate(phrase[1:], start=1):
+            positions = self.postings[term][doc_id]
+            starts &= {position - offset for position in positions}
+            if not starts:
+                return False
+        return True
+
+    def _score(
+        self,
+        candidates: List[int],
+        term_postings: List[Tuple[str, Dict[int, Tuple[int, ...]]]]
+    ) -> List[Tuple[int, float]]:
+        """Score candidate documents with BM25"""
+        document_count = len(self.documents)
+        average_length = self.total_length / document_count if document_count else 0.0
+
+        idfs = [
+            math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for _, postings in term_postings
+        ]
+
+        scored = []
+        for doc_id in candidates:
+            length_norm = 1 - self.B + self.B * (self.doc_lengths[doc_id] / average_length if average_length else 0.0)
+            score = 0.0
+            for idf, (_, postings) in zip(idfs, term_postings):
+                frequency = len(postings[doc_id])
+                score += idf * frequency * (self.K1 + 1) / (frequency + self.K1 * length_norm)
+            scored.append((doc_id, score))
+
+        return scored
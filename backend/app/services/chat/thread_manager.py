@@ -1,10 +1,12 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Set
 import uuid
 from datetime import datetime
 import asyncio
 
 from app.schemas.chat import ChatMessage, Thread
 from app.core.config import settings
+from app.services.chat.message_store import StoredMessage, normalize_timestamp, pack_id
+from app.services.chat.search_index import SearchIndex
 
 
 class ThreadManager:
@@ -14,7 +16,16 @@ class ThreadManager:
         # In-memory storage for threads and messages
         # In a production environment, this would use a database
         self.threads: Dict[str, Thread] = {}
-        self.messages: Dict[str, List[ChatMessage]] = {}
+        # Messages are held in compact form and materialized on read
+        self.messages: Dict[str, List[StoredMessage]] = {}
+        
+        # Full-text index, updated incrementally as messages are added
+        self.search_index = SearchIndex()
+        
+        # Callbacks notified after each message is saved
+        self.message_listeners: List[Callable[[StoredMessage], None]] = []
+        # Callbacks notified with the id of each deleted thread
+        self.delete_listeners: List[Callable[[str], None]] = []
     
     async def create_thread(self, topic: str) -> str:
         """Create a new discussion thread"""
@@ -29,6 +40,21 @@ class ThreadManager:
         
         return thread_id
     
+    async def import_thread(self, thread: Thread) -> bool:
+        """Add a thread with its original id and timestamps, e.g. from an archive
+        
+        Returns False if a thread with the same id already exists.
+        """
+        if thread.id in self.threads:
+            return False
+        
+        thread.created_at = normalize_timestamp(thread.created_at)
+        thread.updated_at = normalize_timestamp(thread.updated_at)
+        self.threads[thread.id] = thread
+        self.messages[thread.id] = []
+        
+        return True
+    
     async def get_thread(self, thread_id: str) -> Thread:
         """Get a thread by ID"""
         if thread_id not in self.threads:
@@ -40,8 +66,34 @@ class ThreadManager:
         """List all threads"""
         return list(self.threads.values())
     
+    async def delete_thread(self, thread_id: str):
+        """Delete a thread with its messages and index entries"""
+        if thread_id not in self.threads:
+            raise ValueError(f"Thread {thread_id} not found")
+        
+        del self.threads[thread_id]
+        self.messages.pop(thread_id, None)
+        self.search_index.remove_thread(thread_id)
+        
+        for listener in self.delete_listeners:
+            listener(thread_id)
+    
+    def add_message_listener(self, listener: Callable[[StoredMessage], None]):
+        """Register a callback invoked with every saved message"""
+        self.message_listeners.append(listener)
+    
+    def add_delete_listener(self, listener: Callable[[str], None]):
+        """Register a callback invoked with the id of every deleted thread"""
+        self.delete_listeners.append(listener)
+    
     async def add_message(self, message: ChatMessage) -> ChatMessage:
         """Add a message to a thread"""
+        await self.store_message(message)
+        
+        return message
+    
+    async def store_message(self, message: ChatMessage) -> StoredMessage:
+        """Add a message to a thread and return its stored form"""
         if message.thread_id not in self.threads:
             raise ValueError(f"Thread {message.thread_id} not found")
         
@@ -49,16 +101,99 @@ class ThreadManager:
         self.threads[message.thread_id].updated_at = datetime.now()
         
         # Add message to thread
-        if message.thread_id not in self.messages:
-            self.messages[message.thread_id] = []
+        record = StoredMessage.from_message(message)
+        self._store(record)
         
-        self.messages[message.thread_id].append(message)
+        # Serialize once at save time for broadcasts and history
+        record.to_json()
         
-        return message
+        return record
+    
+    async def add_messages(self, messages: List[ChatMessage]) -> int:
+        """Add a batch of messages with their original timestamps, e.g. from an archive"""
+        for message in messages:
+            if message.thread_id not in self.threads:
+                raise ValueError(f"Thread {message.thread_id} not found")
+        
+        for message in messages:
+            record = StoredMessage.from_message(message)
+            thread = self.threads[record.thread_id]
+            if record.created_at > thread.updated_at:
+                thread.updated_at = record.created_at
+            self._store(record)
+        
+        return len(messages)
+    
+    def _store(self, record: StoredMessage):
+        """Append a stored message to its thread and notify the index and listeners"""
+        records = self.messages.setdefault(record.thread_id, [])
+        records.append(record)
+        record.seq = len(records)
+        self.search_index.add_message(record)
+        
+        for listener in self.message_listeners:
+            listener(record)
     
     async def get_messages(self, thread_id: str) -> List[ChatMessage]:
         """Get all messages in a thread"""
         if thread_id not in self.threads:
             raise ValueError(f"Thread {thread_id} not found")
         
-        return self.messages.get(thread_id, [])
+        return [record.to_message() for record in self.messages.get(thread_id, [])]
+    
+    def iter_message_records(self, thread_id: str, start: int = 0) -> Iterator[StoredMessage]:
+        """Iterate over a thread's stored messages without materializing them
+        
+        Messages appended while iterating are included.
+        """
+        if thread_id not in self.threads:
+            raise ValueError(f"Thread {thread_id} not found")
+        
+        records = self.messages.get(thread_id, [])
+        index = start
+        while index < len(records):
+            yield records[index]
+            index += 1
+    
+    def get_message_records(self, thread_id: str, after_seq: int = 0, limit: Optional[int] = None) -> List[StoredMessage]:
+        """Get a page of stored messages with sequence numbers after after_seq"""
+        if thread_id not in self.threads:
+            raise ValueError(f"Thread {thread_id} not found")
+        
+        records = self.messages.get(thread_id, [])
+        end = len(records) if limit is None else after_seq + limit
+        return records[after_seq:end]
+    
+    def last_seq(self, thread_id: str) -> int:
+        """Sequence number of the newest message in a thread"""
+        return len(self.messages.get(thread_id, []))
+    
+    def existing_message_ids(self, thread_id: str, message_ids: Iterable[str]) -> Set[str]:
+        """Those of the given message ids already stored in a thread, found in one pass"""
+        wanted = {pack_id(message_id): message_id for message_id in message_ids}
+        return {wanted[record._id] for record in self.messages.get(thread_id, []) if record._id in wanted}
+    
+    def find_seq(self, thread_id: str, message_id: str) -> Optional[int]:
+        """Sequence number of a message, searching from the newest"""
+        packed_id = pack_id(message_id)
+        for record in reversed(self.messages.get(thread_id, [])):
+            if record._id == packed_id:
+                return record.seq
+        return None
+    
+    async def search_messages(
+        self,
+        query: str,
+        thread_id: Optional[str] = None,
+        sender_id: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Search message content across threads"""
+        return self.search_index.search(
+            query,
+            thread_id=thread_id,
+            sender_id=sender_id,
+            limit=limit,
+            offset=offset
+        )
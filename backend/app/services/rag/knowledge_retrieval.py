@@ -5,6 +5,7 @@ import faiss
 from sentence_transformers import SentenceTransformer
 
 from app.core.config import settings
+from app.core.metrics import metrics
 
 
 class KnowledgeRetrieval:
@@ -74,28 +75,52 @@ class KnowledgeRetrieval:
     
     async def retrieve_context(self, query: str, max_results: int = None) -> List[Dict[str, Any]]:
         """Retrieve relevant context for a query"""
+        return (await self.retrieve_contexts([query], max_results))[0]
+    
+    async def retrieve_contexts(self, queries: List[str], max_results: int = None) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve relevant context for several queries with one batched search
+        
+        Distinct queries are encoded in one model call and searched in one
+        FAISS call; results come back in the order of the queries.
+        """
         if max_results is None:
             max_results = settings.MAX_CONTEXT_DOCUMENTS
         
-        if not self.model or not self.index:
+        if not self.model or not self.index or not queries:
             # If not initialized, return empty context
-            return []
+            return [[] for _ in queries]
         
-        # Create query embedding
-        query_embedding = self.model.encode([query])
+        # Create query embeddings, once per distinct query
+        distinct = list(dict.fromkeys(queries))
+        query_embeddings = await asyncio.to_thread(self.model.encode, distinct)
         
         # Search for similar documents
         distances, indices = self.index.search(
-            np.array(query_embedding).astype('float32'), 
+            np.array(query_embeddings).astype('float32'),
             k=max_results
         )
+        metrics.increment("rag.searches")
+        metrics.increment("rag.queries", len(distinct))
         
         # Retrieve matching documents
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.documents):
-                doc = self.documents[idx].copy()
-                doc["score"] = float(distances[0][i])
-                results.append(doc)
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        for row, query in enumerate(distinct):
+            matches = []
+            for i, idx in enumerate(indices[row]):
+                # FAISS pads with -1 when the index holds fewer than k documents
+                if 0 <= idx < len(self.documents):
+                    doc = self.documents[idx].copy()
+                    doc["score"] = float(distances[row][i])
+                    # Cosine similarity, comparable with other sources' relevance
+                    doc["relevance"] = self._cosine(query_embeddings[row], self.index.reconstruct(int(idx)))
+                    matches.append(doc)
+            results[query] = matches
         
-        return results
+        # Callers with the same query get separate lists
+        return [list(results[query]) for query in queries]
+    
+    @staticmethod
+    def _cosine(a, b) -> float:
+        norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+        return float(np.dot(a, b)) / norm if norm else 0.0
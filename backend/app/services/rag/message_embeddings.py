@@ -0,0 +1,187 @@
+from typing import List, Dict, Any, Optional, Set
+import numpy as np
+import asyncio
+import logging
+import faiss
+
+from app.core.config import settings
+from app.services.chat.message_store import StoredMessage
+from app.services.rag.knowledge_retrieval import KnowledgeRetrieval
+
+logger = logging.getLogger(__name__)
+
+
+class MessageEmbeddingIndex:
+    """Vector index over conversation history
+
+    Messages are queued when they are added to a thread and embedded in
+    batches by a background worker, so saving a message never waits on the
+    embedding model. The index is kept separate from the knowledge base
+    documents used by KnowledgeRetrieval.
+    """
+
+    def __init__(self, knowledge_retrieval: KnowledgeRetrieval):
+        # Reuse the sentence transformer already loaded for RAG
+        self.knowledge_retrieval = knowledge_retrieval
+        self.index = None
+        self.messages: List[StoredMessage] = []
+        self.pending: List[StoredMessage] = []
+        # Threads deleted while a batch of their messages was being embedded
+        self.removed_threads: Set[str] = set()
+        self._flushes = 0
+        self._worker: Optional[asyncio.Task] = None
+
+    def enqueue(self, message: StoredMessage):
+        """Queue a saved message for embedding"""
+        if not settings.MESSAGE_EMBEDDING_ENABLED:
+            return
+        if settings.MESSAGE_EMBEDDING_SYNTHESES_ONLY and not self._is_synthesis(message):
+            return
+        if not message.content:
+            return
+
+        self.pending.append(message)
+
+    def remove_thread(self, thread_id: str):
+        """Drop a deleted thread's messages; registered as a ThreadManager delete listener"""
+        self.pending = [message for message in self.pending if message.thread_id != thread_id]
+        if self._flushes:
+            self.removed_threads.add(thread_id)
+
+        positions = [index for index, message in enumerate(self.messages) if message.thread_id == thread_id]
+        if not positions:
+            return
+        # Flat indexes compact in order on removal, so the messages list stays aligned
+        self.index.remove_ids(np.array(positions, dtype='int64'))
+        self.messages = [message for message in self.messages if message.thread_id != thread_id]
+
+    def start(self):
+        """Start the background embedding worker"""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background worker after embedding what is pending"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush()
+
+    async def _run(self):
+        """Periodically embed pending messages"""
+        while True:
+            await asyncio.sleep(settings.MESSAGE_EMBEDDING_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                # Keep the worker alive; the batch stays pending for the next flush
+                logger.exception("Message embedding failed")
+
+    async def flush(self):
+        """Embed all pending messages in batches"""
+        model = self.knowledge_retrieval.model
+        if model is None:
+            # Not initialized yet; keep messages queued
+            return
+
+        if self.index is None:
+            self.index = faiss.IndexFlatIP(model.get_sentence_embedding_dimension())
+
+        batch_size = settings.MESSAGE_EMBEDDING_BATCH_SIZE
+        self._flushes += 1
+        try:
+            while self.pending:
+                # Taken out of the queue first, since remove_thread may replace it meanwhile
+                batch = self.pending[:batch_size]
+                del self.pending[:len(batch)]
+                try:
+                    embeddings = await asyncio.to_thread(
+                        model.encode,
+                        [message.content for message in batch],
+                        normalize_embeddings=True
+                    )
+                except BaseException:
+                    # Failed or cancelled: the batch goes back to the front of the queue
+                    self.pending[:0] = [message for message in batch if message.thread_id not in self.removed_threads]
+                    raise
+
+                keep = [index for index, message in enumerate(batch) if message.thread_id not in self.removed_threads]
+                if keep:
+                    self.index.add(np.array(embeddings)[keep].astype('float32'))
+                    self.messages.extend(batch[index] for index in keep)
+        finally:
+            self._flushes -= 1
+            if not self._flushes:
+                self.removed_threads.clear()
+
+    async def search(
+        self,
+        query: str,
+        max_results: int = 10,
+        thread_id: Optional[str] = None,
+        syntheses_only: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Find embedded messages semantically similar to a query"""
+        model = self.knowledge_retrieval.model
+        if model is None or self.index is None or self.index.ntotal == 0:
+            return []
+
+        query_embedding = await asyncio.to_thread(model.encode, [query], normalize_embeddings=True)
+
+        # Over-fetch when filtering so enough hits survive the filters
+        filtered = thread_id is not None or syntheses_only
+        k = min(self.index.ntotal, max_results * 4 if filtered else max_results)
+        scores, indices = self.index.search(np.array(query_embedding).astype('float32'), k=k)
+
+        results = []
+        for score, idx in zip(scores[0], indices[0]):
+            if idx < 0:
+                continue
+            message = self.messages[idx]
+            if thread_id is not None and message.thread_id != thread_id:
+                continue
+            if syntheses_only and not self._is_synthesis(message):
+                continue
+            results.append({"message": message.to_message(), "score": float(score)})
+            if len(results) >= max_results:
+                break
+
+        return results
+
+    async def retrieve_syntheses(
+        self,
+        query: str,
+        max_results: int = None,
+        min_score: float = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve earlier syntheses relevant to a query as context documents"""
+        if max_results is None:
+            max_results = settings.SYNTHESIS_MEMORY_MAX_RESULTS
+        if min_score is None:
+            min_score = settings.SYNTHESIS_MEMORY_MIN_SCORE
+
+        hits = await self.search(query, max_results=max_results, syntheses_only=True)
+
+        return [
+            {
+                "id": hit["message"].id,
+                "content": hit["message"].content,
+                "metadata": {
+                    "source": "Previous synthesis",
+                    "thread_id": hit["message"].thread_id
+                },
+                "score": hit["score"],
+                # Embeddings are normalized, so the score is the cosine similarity
+                "relevance": hit["score"]
+            }
+            for hit in hits
+            if hit["score"] >= min_score
+        ]
+
+    def _is_synthesis(self, message: StoredMessage) -> bool:
+        """Check whether a message is an agent discussion synthesis"""
+        return message.metadata.get("type") == "synthesis"
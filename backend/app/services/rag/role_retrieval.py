@@ -0,0 +1,53 @@
+from typing import Dict, List, Any, Sequence
+import asyncio
+
+from app.core.config import settings
+from app.schemas.agent import Agent
+from app.services.agent.roles import retrieval_query
+from app.services.agent.transcript import DiscussionTranscript
+from app.services.rag.knowledge_retrieval import KnowledgeRetrieval
+
+
+class RoleContextRetriever:
+    """Per-agent retrieval context for one discussion
+
+    Each agent's query combines the user's question with its role's focus
+    and, from the first discussion round on, the latest messages. The
+    queries of every agent in a round are searched together in one
+    batched call, started by the first turn of the round that needs its
+    context; later turns of the round share the result.
+    """
+
+    def __init__(
+        self,
+        knowledge_retrieval: KnowledgeRetrieval,
+        agents: Sequence[Agent],
+        question: str,
+        transcript: DiscussionTranscript,
+        extra: Sequence[Dict[str, Any]] = ()
+    ):
+        self.knowledge_retrieval = knowledge_retrieval
+        self.agents = list(agents)
+        self.question = question
+        self.transcript = transcript
+        self.extra = list(extra)  # context every agent gets, e.g. earlier syntheses
+        self.rounds: Dict[int, asyncio.Task] = {}  # round -> search of its contexts by agent id
+
+    async def context_for(self, agent_id: str, round_num: int = 0) -> List[Dict[str, Any]]:
+        """Context for an agent's turn in a round"""
+        if not settings.ROLE_RETRIEVAL_PER_ROUND:
+            round_num = 0
+        search = self.rounds.get(round_num)
+        if search is None:
+            search = self.rounds[round_num] = asyncio.create_task(self._search(round_num))
+        # Shielded, so a cancelled turn does not cancel the search for the rest of the round
+        contexts = await asyncio.shield(search)
+        return contexts.get(agent_id, []) + self.extra
+
+    async def _search(self, round_num: int) -> Dict[str, List[Dict[str, Any]]]:
+        recent = []
+        if round_num and settings.ROLE_RETRIEVAL_RECENT_MESSAGES > 0:
+            recent = self.transcript.summaries[-settings.ROLE_RETRIEVAL_RECENT_MESSAGES:]
+        queries = [retrieval_query(agent.role, self.question, recent) for agent in self.agents]
+        results = await self.knowledge_retrieval.retrieve_contexts(queries)
+        return {agent.id: context for agent, context in zip(self.agents, results)}
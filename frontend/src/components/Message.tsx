@@ -69,6 +69,11 @@ const Message: React.FC<MessageProps> = ({ message, isCurrentUser }) => {
       <div className={`max-w-3/4 rounded-lg px-4 py-2 ${getMessageStyle()}`}>
         <div className="font-bold text-sm mb-1">{getSenderName()}</div>
         <div className="text-sm">{formatContent(message.content)}</div>
+        {message.metadata?.partial && (
+          <div className="text-xs mt-1 text-gray-500 italic">
+            Incomplete: the discussion was stopped before this reply finished.
+          </div>
+        )}
         {message.metadata?.round && (
           <div className="text-xs mt-1 text-gray-500">
             Round: {message.metadata.round}
@@ -6,12 +6,16 @@ interface MessageThreadProps {
   messages: ChatMessage[];
   sendMessage?: (content: string, parentId?: string) => void;
   connected?: boolean;
+  queuePosition?: number | null;
+  runningSynthesis?: string | null;
 }
 
 const MessageThread: React.FC<MessageThreadProps> = ({ 
   messages, 
   sendMessage,
-  connected = false
+  connected = false,
+  queuePosition = null,
+  runningSynthesis = null
 }) => {
   const [newMessage, setNewMessage] = useState('');
   const messagesEndRef = useRef<HTMLDivElement>(null);
@@ -109,6 +113,17 @@ const MessageThread: React.FC<MessageThreadProps> = ({
             Disconnected. Reconnecting...
           </div>
         )}
+        {connected && queuePosition !== null && (
+          <div className="text-gray-500 text-sm mt-2">
+            Agents are busy. Your discussion is number {queuePosition} in the queue.
+          </div>
+        )}
+        {connected && runningSynthesis && (
+          <details className="text-gray-500 text-sm mt-2">
+            <summary>Summary so far</summary>
+            <div className="whitespace-pre-wrap mt-1">{runningSynthesis}</div>
+          </details>
+        )}
       </div>
     </div>
   );
@@ -82,9 +82,18 @@ export const ChatProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
     }
   };
 
-  // Add a new message to the current thread
+  // Add a new message to the current thread, replacing any earlier version
+  // of it such as the draft shown while an agent's reply was streaming
   const addMessage = (message: ChatMessage) => {
-    setMessages(prevMessages => [...prevMessages, message]);
+    setMessages(prevMessages => {
+      const index = prevMessages.findIndex(existing => existing.id === message.id);
+      if (index === -1) {
+        return [...prevMessages, message];
+      }
+      const updated = prevMessages.slice();
+      updated[index] = message;
+      return updated;
+    });
   };
 
   return (
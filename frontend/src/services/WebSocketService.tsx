@@ -1,19 +1,38 @@
 import React, { useEffect, useRef, useState } from 'react';
+import { decode } from '@msgpack/msgpack';
 import { useChat } from '../contexts/ChatContext';
-import { ChatMessage } from '../types/chat';
+import { ChatMessage, WebSocketEncoding } from '../types/chat';
+
+const DEFAULT_ENCODING: WebSocketEncoding =
+  process.env.REACT_APP_WS_ENCODING === 'msgpack' ? 'msgpack' : 'json';
+
+const RECONNECT_DELAY_MS = 1000;
 
 interface WebSocketServiceProps {
   threadId: string;
   onMessage: (message: ChatMessage) => void;
+  encoding?: WebSocketEncoding;
   children: React.ReactNode;
 }
 
+// Binary frames are MessagePack, text frames are JSON. The server falls back
+// to JSON when it cannot serve MessagePack, so both are always handled.
+const parseFrame = (data: string | ArrayBuffer): any => {
+  if (typeof data === 'string') {
+    return JSON.parse(data);
+  }
+  return decode(new Uint8Array(data));
+};
+
 const WebSocketService: React.FC<WebSocketServiceProps> = ({ 
   threadId, 
   onMessage, 
+  encoding = DEFAULT_ENCODING,
   children 
 }) => {
   const [connected, setConnected] = useState(false);
+  const [queuePosition, setQueuePosition] = useState<number | null>(null);
+  const [runningSynthesis, setRunningSynthesis] = useState<string | null>(null);
   const wsRef = useRef<WebSocket | null>(null);
   const { addMessage } = useChat();
   
@@ -23,56 +42,123 @@ const WebSocketService: React.FC<WebSocketServiceProps> = ({
       wsRef.current.close();
     }
     
-    // Create new WebSocket connection
-    const wsUrl = `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/ws/${threadId}`;
-    const ws = new WebSocket(wsUrl);
+    // Sequence number of the last message received, used to resume after a drop
+    let lastSeq: number | null = null;
+    let disposed = false;
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
     
-    ws.onopen = () => {
-      console.log('WebSocket connected');
-      setConnected(true);
-    };
+    // Content received so far for messages that are still being generated
+    const drafts = new Map<string, string>();
     
-    ws.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data);
-        
-        if (data.type === 'new_message' && data.message) {
-          addMessage(data.message);
-          onMessage(data.message);
-        } 
-        else if (data.type === 'thread_history' && data.messages) {
-          // Handle initial thread history
-          data.messages.forEach((msg: ChatMessage) => {
-            addMessage(msg);
-          });
-        }
-        else if (data.type === 'error') {
-          console.error('WebSocket error:', data.error);
-        }
-      } catch (err) {
-        console.error('Error parsing WebSocket message:', err);
+    // Skip messages already received, e.g. when a catch-up overlaps a broadcast
+    const acceptMessage = (msg: ChatMessage, seq: number) => {
+      drafts.delete(msg.id);
+      if (lastSeq !== null && seq <= lastSeq) {
+        return;
+      }
+      lastSeq = seq;
+      if (msg.metadata?.type === 'synthesis') {
+        setRunningSynthesis(null);
       }
+      addMessage(msg);
+      onMessage(msg);
     };
     
-    ws.onerror = (error) => {
-      console.error('WebSocket error:', error);
-      setConnected(false);
+    // Append streamed text to a draft; after a missed delta the draft stops
+    // growing until the complete message arrives and replaces it
+    const acceptDelta = (draft: ChatMessage, offset: number, delta: string) => {
+      const content = drafts.get(draft.id) ?? '';
+      if (offset !== content.length) {
+        return;
+      }
+      drafts.set(draft.id, content + delta);
+      addMessage({ ...draft, content: content + delta });
     };
     
-    ws.onclose = () => {
-      console.log('WebSocket disconnected');
-      setConnected(false);
+    const connect = () => {
+      // Create new WebSocket connection, resuming from the last seen message if any
+      const base = `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/ws/${threadId}`;
+      const wsUrl = lastSeq === null ? base : `${base}?since_seq=${lastSeq}`;
+      const ws = encoding === 'msgpack' ? new WebSocket(wsUrl, 'msgpack') : new WebSocket(wsUrl);
+      ws.binaryType = 'arraybuffer';
+      
+      ws.onopen = () => {
+        console.log('WebSocket connected');
+        setConnected(true);
+      };
+      
+      ws.onmessage = (event) => {
+        try {
+          const data = parseFrame(event.data);
+          
+          if (data.type === 'new_message' && data.message) {
+            acceptMessage(data.message, data.seq);
+          } 
+          else if (data.type === 'message_delta' && data.message) {
+            acceptDelta(data.message, data.offset, data.delta);
+          }
+          else if (data.type === 'thread_history' && data.messages) {
+            // Handle initial thread history
+            data.messages.forEach((msg: ChatMessage) => {
+              addMessage(msg);
+            });
+            lastSeq = data.last_seq;
+          }
+          else if (data.type === 'thread_catchup' && data.messages) {
+            // Messages missed while disconnected, ending at last_seq
+            const firstSeq = data.last_seq - data.messages.length + 1;
+            data.messages.forEach((msg: ChatMessage, index: number) => {
+              acceptMessage(msg, firstSeq + index);
+            });
+          }
+          else if (data.type === 'discussion_status') {
+            // Position of a discussion waiting for agents; cleared once it starts
+            setQueuePosition(data.status === 'queued' ? data.position : null);
+            if (data.status === 'cancelled') {
+              setRunningSynthesis(null);
+            }
+          }
+          else if (data.type === 'synthesis_update') {
+            // Summary of the discussion so far, replaced by the final synthesis
+            setRunningSynthesis(data.content);
+          }
+          else if (data.type === 'error') {
+            console.error('WebSocket error:', data.error);
+          }
+        } catch (err) {
+          console.error('Error parsing WebSocket message:', err);
+        }
+      };
+      
+      ws.onerror = (error) => {
+        console.error('WebSocket error:', error);
+        setConnected(false);
+      };
+      
+      ws.onclose = () => {
+        console.log('WebSocket disconnected');
+        setConnected(false);
+        if (!disposed) {
+          reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+        }
+      };
+      
+      wsRef.current = ws;
     };
     
-    wsRef.current = ws;
+    connect();
     
     // Cleanup on unmount
     return () => {
+      disposed = true;
+      if (reconnectTimer) {
+        clearTimeout(reconnectTimer);
+      }
       if (wsRef.current) {
         wsRef.current.close();
       }
     };
-  }, [threadId, addMessage, onMessage]);
+  }, [threadId, encoding, addMessage, onMessage]);
   
   // Function to send a message through WebSocket
   const sendMessage = (content: string, parentId?: string) => {
@@ -96,7 +182,9 @@ const WebSocketService: React.FC<WebSocketServiceProps> = ({
         if (React.isValidElement(child)) {
           return React.cloneElement(child as React.ReactElement<any>, { 
             sendMessage,
-            connected
+            connected,
+            queuePosition,
+            runningSynthesis
           });
         }
         return child;
@@ -38,3 +38,8 @@ export const createThread = async (topic: string, userId: string = 'anonymous'):
   const response = await api.post('/api/threads', threadData);
   return response.data;
 };
+
+// Delete a thread, its messages and its agents
+export const deleteThread = async (threadId: string): Promise<void> => {
+  await api.delete(`/api/threads/${threadId}`);
+};
@@ -44,8 +44,20 @@ export interface ThreadDetailResponse {
   messages: ChatMessage[];
 }
 
+export type WebSocketEncoding = 'json' | 'msgpack';
+
 export interface WebSocketMessage {
-  type: 'new_message' | 'thread_history' | 'error';
+  type: 'new_message' | 'message_delta' | 'thread_history' | 'thread_catchup' | 'discussion_status' | 'synthesis_update' | 'error';
+  seq?: number;
+  offset?: number;
+  delta?: string;
+  content?: string;
+  folded?: number;
+  message_id?: string;
+  status?: 'queued' | 'running' | 'cancelled';
+  position?: number | null;
+  last_seq?: number;
+  complete?: boolean;
   message?: ChatMessage;
   thread?: Thread;
   messages?: ChatMessage[];
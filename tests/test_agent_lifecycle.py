@@ -0,0 +1,109 @@
+import unittest
+import asyncio
+from app.services.agent.agent_manager import AgentManager
+from app.services.agent.roles import ROLE_DEFINITIONS, PromptTemplates
+from app.services.chat.thread_manager import ThreadManager
+from app.services.chat.resume_buffer import ResumeBuffer
+from app.schemas.agent import AgentRole
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+
+class TestAgentLifecycle(unittest.TestCase):
+    """Test cases for shared role definitions and per-thread cleanup"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.agent_manager = AgentManager()
+
+    def test_templates_only_for_used_roles(self):
+        """Test that prompt templates cover the thread's roles and render on read"""
+        templates = asyncio.run(self.agent_manager.generate_prompt_templates("Tides"))
+
+        self.assertIsInstance(templates, PromptTemplates)
+        self.assertEqual(len(templates), settings.DEFAULT_AGENT_COUNT)
+        self.assertNotIn(AgentRole.GENERALIST, templates)
+        self.assertIn("Tides", templates[AgentRole.RESEARCHER])
+
+    def test_agents_share_role_definitions(self):
+        """Test that agents reference shared definitions and keep only the topic"""
+        async def run():
+            first = await self.agent_manager.initialize_agents(
+                "thread-1", await self.agent_manager.generate_prompt_templates("Tides")
+            )
+            second = await self.agent_manager.initialize_agents(
+                "thread-2", await self.agent_manager.generate_prompt_templates("Tides")
+            )
+            return first, second
+
+        first, second = asyncio.run(run())
+        stored = [self.agent_manager.agents[agent.id] for agent in first + second]
+
+        self.assertTrue(all(agent.definition is ROLE_DEFINITIONS[agent.role] for agent in stored))
+        self.assertIs(stored[0].prompt_template, stored[len(first)].prompt_template)
+        self.assertIn("Tides", first[0].prompt_template)
+        self.assertNotEqual(first[0].id, second[0].id)
+
+    def test_custom_templates_are_kept(self):
+        """Test that explicitly given templates override the role definition"""
+        agents = asyncio.run(self.agent_manager.initialize_agents(
+            "thread-1", {AgentRole.CRITIC: "You are a harsh critic."}
+        ))
+
+        self.assertEqual(len(agents), 1)
+        self.assertEqual(agents[0].prompt_template, "You are a harsh critic.")
+        self.assertEqual(self.agent_manager.get_agent(agents[0].id).name, "Critic Agent")
+
+    def test_release_thread_frees_agents(self):
+        """Test that releasing or re-initializing a thread drops its agents"""
+        async def run():
+            templates = await self.agent_manager.generate_prompt_templates("Tides")
+            await self.agent_manager.initialize_agents("thread-1", templates)
+            await self.agent_manager.initialize_agents("thread-1", templates)
+            await self.agent_manager.initialize_agents("thread-2", templates)
+            after_reinit = len(self.agent_manager.agents)
+            released = self.agent_manager.release_thread("thread-1")
+            return after_reinit, released, await self.agent_manager.get_thread_agents("thread-1")
+
+        after_reinit, released, remaining = asyncio.run(run())
+
+        self.assertEqual(after_reinit, 2 * settings.DEFAULT_AGENT_COUNT)
+        self.assertEqual(released, settings.DEFAULT_AGENT_COUNT)
+        self.assertEqual(remaining, [])
+        self.assertEqual(len(self.agent_manager.agents), settings.DEFAULT_AGENT_COUNT)
+
+    def test_delete_thread_clears_state(self):
+        """Test that deleting a thread removes its messages, index entries and buffer"""
+        thread_manager = ThreadManager()
+        resume_buffer = ResumeBuffer(thread_manager)
+        thread_manager.add_message_listener(resume_buffer.append)
+        thread_manager.add_delete_listener(resume_buffer.remove_thread)
+
+        async def run():
+            doomed = await thread_manager.create_thread("Doomed")
+            kept = await thread_manager.create_thread("Kept")
+            for thread_id in (doomed, kept):
+                await thread_manager.add_message(ChatMessage(
+                    thread_id=thread_id,
+                    sender_type="user",
+                    sender_id="test_user",
+                    content=f"shared words and {thread_id}"
+                ))
+            await thread_manager.delete_thread(doomed)
+            return doomed, kept
+
+        doomed, kept = asyncio.run(run())
+        index = thread_manager.search_index
+
+        self.assertNotIn(doomed, thread_manager.threads)
+        self.assertNotIn(doomed, thread_manager.messages)
+        self.assertNotIn(doomed, resume_buffer.threads)
+        self.assertNotIn(doomed.split("-")[0], index.postings)
+        self.assertEqual(len(index.documents), 1)
+        self.assertEqual(asyncio.run(thread_manager.search_messages("shared"))["total"], 1)
+        self.assertEqual(index.total_length, sum(index.doc_lengths.values()))
+        with self.assertRaises(ValueError):
+            asyncio.run(thread_manager.delete_thread(doomed))
+        self.assertIn(kept, resume_buffer.threads)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+import unittest
+import asyncio
+import json
+import time
+from app.services.chat.connection_manager import ConnectionManager, SlowConsumerPolicy
+from app.services.chat.frames import Frame, FrameEncoding, message_frame, history_frame
+from app.core.serialization import MSGPACK_AVAILABLE
+from app.services.chat.thread_manager import ThreadManager
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+
+class FakeWebSocket:
+    """Minimal stand-in for a websocket that records sent messages"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+        self.raw = []
+        self.closed = False
+
+    async def send_text(self, message):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("connection closed")
+        self.raw.append(message)
+        self.sent.append(json.loads(message))
+
+    async def close(self):
+        self.closed = True
+
+class TestConnectionManager(unittest.TestCase):
+    """Test cases for the per-thread connection registry"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.connection_manager = ConnectionManager()
+        self.original_settings = (
+            settings.WS_SEND_TIMEOUT,
+            settings.WS_OUTBOUND_QUEUE_SIZE,
+            settings.WS_SLOW_CONSUMER_POLICY
+        )
+        settings.WS_SEND_TIMEOUT = 0.2
+        settings.WS_OUTBOUND_QUEUE_SIZE = 2
+
+    def tearDown(self):
+        (
+            settings.WS_SEND_TIMEOUT,
+            settings.WS_OUTBOUND_QUEUE_SIZE,
+            settings.WS_SLOW_CONSUMER_POLICY
+        ) = self.original_settings
+
+    def test_broadcast_is_scoped_to_thread(self):
+        """Test that only clients of the target thread receive a broadcast"""
+        in_thread = FakeWebSocket()
+        other_thread = FakeWebSocket()
+
+        async def run():
+            self.connection_manager.connect("thread_a", in_thread)
+            self.connection_manager.connect("thread_b", other_thread)
+            await self.connection_manager.broadcast("thread_a", {"type": "new_message"})
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+
+        self.assertEqual(in_thread.sent, [{"type": "new_message"}])
+        self.assertEqual(other_thread.sent, [])
+
+    def test_broadcast_does_not_wait_for_clients(self):
+        """Test that slow clients do not delay the broadcaster or others"""
+        fast = FakeWebSocket()
+        slow = FakeWebSocket(delay=0.1)
+
+        async def run():
+            self.connection_manager.connect("thread_a", fast)
+            self.connection_manager.connect("thread_a", slow)
+            start = time.perf_counter()
+            await self.connection_manager.broadcast("thread_a", {"seq": 1})
+            elapsed = time.perf_counter() - start
+            await asyncio.sleep(0.05)
+            return elapsed
+
+        elapsed = asyncio.run(run())
+
+        self.assertLess(elapsed, 0.05)
+        self.assertEqual(fast.sent, [{"seq": 1}])
+        self.assertEqual(slow.sent, [])
+
+    def test_broadcast_encodes_once(self):
+        """Test that every client receives the same encoded frame"""
+        first = FakeWebSocket()
+        second = FakeWebSocket()
+
+        async def run():
+            self.connection_manager.connect("thread_a", first)
+            self.connection_manager.connect("thread_a", second)
+            await self.connection_manager.broadcast("thread_a", {"type": "new_message"})
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+
+        self.assertIs(first.raw[0], second.raw[0])
+
+    def test_frames_reuse_cached_json(self):
+        """Test that frames embed each stored message's cached encoding"""
+        thread_manager = ThreadManager()
+        thread_id = asyncio.run(thread_manager.create_thread("Frames"))
+        message = ChatMessage(
+            thread_id=thread_id,
+            sender_type="agent",
+            sender_id="agent_1",
+            content="Hello",
+            metadata={"role": "critic"}
+        )
+        record = asyncio.run(thread_manager.store_message(message))
+
+        frame = json.loads(message_frame(record).encode(FrameEncoding.JSON))
+        self.assertEqual(frame["message"], message.model_dump(mode="json"))
+        self.assertIs(record.to_json(), record.to_json())
+
+        thread = asyncio.run(thread_manager.get_thread(thread_id))
+        history = history_frame(thread, thread_manager.iter_message_records(thread_id), 1)
+        decoded = json.loads(history.encode(FrameEncoding.JSON))
+        self.assertEqual(decoded["thread"]["id"], thread_id)
+        self.assertEqual(decoded["messages"], [message.model_dump(mode="json")])
+        self.assertEqual(decoded["last_seq"], 1)
+
+    @unittest.skipUnless(MSGPACK_AVAILABLE, "msgpack is not installed")
+    def test_msgpack_frames_match_json(self):
+        """Test that binary frames decode to the same content as JSON frames"""
+        import msgpack
+
+        thread_manager = ThreadManager()
+        thread_id = asyncio.run(thread_manager.create_thread("Frames"))
+        record = asyncio.run(thread_manager.store_message(ChatMessage(
+            thread_id=thread_id,
+            sender_type="agent",
+            sender_id="agent_1",
+            content="Hello",
+            metadata={"role": "critic", "round": 1}
+        )))
+        thread = asyncio.run(thread_manager.get_thread(thread_id))
+
+        for frame in (message_frame(record), history_frame(thread, [record, record], 2)):
+            binary = frame.encode(FrameEncoding.MSGPACK)
+            self.assertIsInstance(binary, bytes)
+            self.assertEqual(msgpack.unpackb(binary), json.loads(frame.encode(FrameEncoding.JSON)))
+
+    def test_failing_client_is_dropped(self):
+        """Test that a client whose send fails is disconnected"""
+        broken = FakeWebSocket(fail=True)
+
+        async def run():
+            self.connection_manager.connect("thread_a", broken)
+            await self.connection_manager.broadcast("thread_a", {"type": "new_message"})
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+
+        self.assertEqual(self.connection_manager.connection_count("thread_a"), 0)
+        self.assertTrue(broken.closed)
+
+    def fill_slow_queue(self, policy, frames):
+        """Queue frames for a client that never finishes sending"""
+        settings.WS_SLOW_CONSUMER_POLICY = policy
+        settings.WS_SEND_TIMEOUT = 10.0
+        slow = FakeWebSocket(delay=10.0)
+
+        async def run():
+            connection = self.connection_manager.connect("thread_a", slow)
+            # The first frame is picked up by the writer and blocks it
+            connection.enqueue(Frame.from_dict({"blocking": True}))
+            await asyncio.sleep(0)
+            for message, coalesce_key in frames:
+                await self.connection_manager.broadcast("thread_a", message, coalesce_key)
+            queued = [json.loads(frame.encode(FrameEncoding.JSON)) for _, frame in connection.queue]
+            connection.stop()
+            return queued
+
+        return asyncio.run(run())
+
+    def test_drop_policy(self):
+        """Test that intermediate frames are dropped to keep final ones"""
+        queued = self.fill_slow_queue(SlowConsumerPolicy.DROP, [
+            ({"delta": 1}, "m1"),
+            ({"final": 1}, None),
+            ({"delta": 2}, "m1"),
+            ({"final": 2}, None),
+        ])
+
+        self.assertEqual(queued, [{"final": 1}, {"final": 2}])
+        self.assertEqual(self.connection_manager.connection_count("thread_a"), 1)
+
+    def test_coalesce_policy(self):
+        """Test that frames with the same key replace each other"""
+        queued = self.fill_slow_queue(SlowConsumerPolicy.COALESCE, [
+            ({"delta": 1}, "m1"),
+            ({"final": 1}, None),
+            ({"delta": 2}, "m1"),
+        ])
+
+        self.assertEqual(queued, [{"delta": 2}, {"final": 1}])
+
+    def test_disconnect_policy(self):
+        """Test that a full queue disconnects the client"""
+        self.fill_slow_queue(SlowConsumerPolicy.DISCONNECT, [
+            ({"final": 1}, None),
+            ({"final": 2}, None),
+            ({"final": 3}, None),
+        ])
+
+        self.assertEqual(self.connection_manager.connection_count("thread_a"), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import asyncio
+import numpy as np
+from app.services.agent.convergence import ConvergenceDetector, jaccard
+from app.services.rag.knowledge_retrieval import KnowledgeRetrieval
+from app.schemas.chat import ChatMessage
+
+class KeywordEncoder:
+    """Tiny stand-in for the sentence transformer: one axis per keyword"""
+
+    KEYWORDS = ["cost", "speed", "safety"]
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, normalize_embeddings=False):
+        self.batches.append(len(texts))
+        vectors = np.array([
+            [text.lower().count(keyword) + 0.01 for keyword in self.KEYWORDS]
+            for text in texts
+        ], dtype="float32")
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+class TestConvergence(unittest.TestCase):
+    """Test cases for stopping discussion rounds once responses converge"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.knowledge_retrieval = KnowledgeRetrieval()
+        self.detector = ConvergenceDetector(self.knowledge_retrieval)
+
+    def round(self, *contents):
+        """Messages of one round, one per agent"""
+        return [
+            ChatMessage(
+                thread_id="thread",
+                sender_type="agent",
+                sender_id=f"agent_{i}",
+                content=content
+            )
+            for i, content in enumerate(contents)
+        ]
+
+    def test_jaccard(self):
+        """Test word-set overlap"""
+        self.assertEqual(jaccard(frozenset("ab"), frozenset("ab")), 1.0)
+        self.assertEqual(jaccard(frozenset("ab"), frozenset("cd")), 0.0)
+        self.assertAlmostEqual(jaccard(frozenset("abc"), frozenset("abd")), 0.5)
+
+    def test_repeated_rounds_converge_without_model(self):
+        """Test that near-duplicate rounds converge using words alone"""
+        first = self.round("We should focus on cost and speed", "Safety matters most here")
+        repeat = self.round("We should focus on cost and speed.", "Safety matters most here")
+
+        self.assertFalse(asyncio.run(self.detector.observe(first)))
+        self.assertTrue(asyncio.run(self.detector.observe(repeat)))
+
+    def test_changing_rounds_do_not_converge(self):
+        """Test that rounds with new content keep the discussion going"""
+        first = self.round("We should focus on cost", "Safety matters most")
+        second = self.round("Actually speed is the bottleneck", "Consider regulation first")
+
+        asyncio.run(self.detector.observe(first))
+        self.assertFalse(asyncio.run(self.detector.observe(second)))
+
+    def test_semantic_convergence(self):
+        """Test that rewordings with the same meaning converge, embedding each round once"""
+        encoder = KeywordEncoder()
+        self.knowledge_retrieval.model = encoder
+        first = self.round("Cost is the main concern", "Speed drives everything")
+        reworded = self.round("Our worry remains cost", "Everything hinges on speed")
+        changed = self.round("Safety now outweighs cost", "Safety again")
+
+        asyncio.run(self.detector.observe(first))
+        self.assertTrue(asyncio.run(self.detector.observe(reworded)))
+        self.assertFalse(asyncio.run(self.detector.observe(changed)))
+        self.assertEqual(encoder.batches, [2, 2, 2])
+
+if __name__ == '__main__':
+    unittest.main()
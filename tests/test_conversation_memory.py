@@ -0,0 +1,112 @@
+import unittest
+import asyncio
+import time
+import numpy as np
+from app.services.chat.thread_manager import ThreadManager
+from app.services.rag.knowledge_retrieval import KnowledgeRetrieval
+from app.services.rag.message_embeddings import MessageEmbeddingIndex
+from app.schemas.chat import ChatMessage
+
+class SlowEncoder:
+    """Stand-in for the sentence transformer that takes a while to encode"""
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, texts, normalize_embeddings=False):
+        time.sleep(0.1)
+        return np.ones((len(texts), 2), dtype="float32") / np.sqrt(2)
+
+class TestConversationMemory(unittest.TestCase):
+    """Test cases for semantic search over conversation history"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.thread_manager = ThreadManager()
+        self.knowledge_retrieval = KnowledgeRetrieval()
+        self.message_index = MessageEmbeddingIndex(self.knowledge_retrieval)
+        self.thread_manager.add_message_listener(self.message_index.enqueue)
+
+    async def add_discussion(self):
+        """Create a thread with a question and its synthesis"""
+        thread_id = await self.thread_manager.create_thread("Memory Test")
+        question = await self.thread_manager.add_message(ChatMessage(
+            thread_id=thread_id,
+            sender_type="user",
+            sender_id="test_user",
+            content="How do vector databases index embeddings?"
+        ))
+        await self.thread_manager.add_message(ChatMessage(
+            thread_id=thread_id,
+            sender_type="system",
+            sender_id="synthesis",
+            content="Vector databases index embeddings with approximate nearest neighbour structures.",
+            parent_id=question.id,
+            metadata={"type": "synthesis"}
+        ))
+        await self.thread_manager.add_message(ChatMessage(
+            thread_id=thread_id,
+            sender_type="user",
+            sender_id="test_user",
+            content="Unrelated remark about cooking pasta."
+        ))
+        return thread_id
+
+    def test_messages_queued_until_model_ready(self):
+        """Test that saved messages wait in the queue until embedded"""
+        asyncio.run(self.add_discussion())
+
+        # Model is not loaded, so nothing can be embedded yet
+        asyncio.run(self.message_index.flush())
+        self.assertEqual(len(self.message_index.pending), 3)
+        self.assertEqual(asyncio.run(self.message_index.search("vector databases")), [])
+
+    def test_semantic_search(self):
+        """Test that embedded messages are found by meaning"""
+        asyncio.run(self.knowledge_retrieval.initialize())
+        asyncio.run(self.add_discussion())
+        asyncio.run(self.message_index.flush())
+
+        self.assertEqual(self.message_index.pending, [])
+
+        hits = asyncio.run(self.message_index.search("how are embeddings stored for similarity search", max_results=2))
+        self.assertTrue(len(hits) > 0)
+        self.assertIn("embeddings", hits[0]["message"].content)
+
+    def test_synthesis_retrieval(self):
+        """Test that only earlier syntheses are returned as context"""
+        asyncio.run(self.knowledge_retrieval.initialize())
+        asyncio.run(self.add_discussion())
+        asyncio.run(self.message_index.flush())
+
+        context = asyncio.run(self.message_index.retrieve_syntheses(
+            "How do vector databases index embeddings?",
+            min_score=0.0
+        ))
+        self.assertTrue(len(context) > 0)
+        for item in context:
+            self.assertEqual(item["metadata"]["source"], "Previous synthesis")
+
+    def test_thread_deleted_during_flush(self):
+        """Test that deleting a thread mid-embedding drops only that thread's messages"""
+        self.knowledge_retrieval.model = SlowEncoder()
+
+        async def run():
+            doomed = await self.add_discussion()
+            flush = asyncio.create_task(self.message_index.flush())
+            await asyncio.sleep(0.02)
+            self.message_index.remove_thread(doomed)
+            kept = await self.add_discussion()
+            await flush
+            await self.message_index.flush()
+            return kept
+
+        kept = asyncio.run(run())
+
+        self.assertEqual(self.message_index.pending, [])
+        self.assertEqual([message.thread_id for message in self.message_index.messages], [kept] * 3)
+        self.assertEqual(self.message_index.index.ntotal, 3)
+        self.assertEqual(self.message_index.removed_threads, set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import unittest
+import asyncio
+from app.services.agent.discussion_scheduler import DiscussionScheduler, DiscussionRejected, CancelReason
+
+class TestDiscussionScheduler(unittest.TestCase):
+    """Test cases for bounded, fair scheduling of agent discussions"""
+
+    def job(self, log, name, delay=0.02):
+        """Discussion that records when it starts and finishes"""
+        async def run():
+            log.append(("start", name))
+            await asyncio.sleep(delay)
+            log.append(("end", name))
+        return run
+
+    def test_global_cap_and_thread_serialization(self):
+        """Test that the cap holds and a thread runs one discussion at a time"""
+        scheduler = DiscussionScheduler(max_concurrent=2, max_queued=10, max_queued_per_thread=5)
+        peak = {"running": 0}
+
+        async def run():
+            def job(thread_id):
+                async def work():
+                    peak["running"] = max(peak["running"], len(scheduler.running))
+                    await asyncio.sleep(0.02)
+                return work
+
+            positions = [
+                scheduler.submit("a", job("a")).position,
+                scheduler.submit("a", job("a")).position,
+                scheduler.submit("b", job("b")).position,
+                scheduler.submit("c", job("c")).position,
+            ]
+            await scheduler.drain(timeout=1.0)
+            return positions
+
+        positions = asyncio.run(run())
+
+        # a and b start; the second a waits for the first, c for a free slot
+        self.assertEqual(positions[0], 0)
+        self.assertEqual(positions[2], 0)
+        self.assertGreater(positions[1], 0)
+        self.assertGreater(positions[3], 0)
+        self.assertEqual(peak["running"], 2)
+
+    def test_threads_take_turns(self):
+        """Test that a busy thread does not starve others"""
+        scheduler = DiscussionScheduler(max_concurrent=1, max_queued=10, max_queued_per_thread=5)
+        log = []
+
+        async def run():
+            scheduler.submit("busy", self.job(log, "busy_1"))
+            scheduler.submit("busy", self.job(log, "busy_2"))
+            scheduler.submit("busy", self.job(log, "busy_3"))
+            scheduler.submit("quiet", self.job(log, "quiet_1"))
+            await scheduler.drain(timeout=1.0)
+
+        asyncio.run(run())
+
+        started = [name for event, name in log if event == "start"]
+        self.assertEqual(started, ["busy_1", "quiet_1", "busy_2", "busy_3"])
+
+    def test_queue_positions_are_reported(self):
+        """Test that queued discussions learn their position as it changes"""
+        scheduler = DiscussionScheduler(max_concurrent=1, max_queued=10, max_queued_per_thread=5)
+        updates = {"a": [], "b": [], "c": []}
+
+        async def run():
+            for name in ("a", "b", "c"):
+                scheduler.submit(name, self.job([], name), updates[name].append)
+            await scheduler.drain(timeout=1.0)
+
+        asyncio.run(run())
+
+        self.assertEqual(updates["a"], [])
+        self.assertEqual(updates["b"], [1, 0])
+        self.assertEqual(updates["c"], [2, 1, 0])
+
+    def test_admission_control(self):
+        """Test that discussions are refused once the queues are full"""
+        scheduler = DiscussionScheduler(max_concurrent=1, max_queued=2, max_queued_per_thread=1)
+
+        async def run():
+            scheduler.submit("a", self.job([], "a1"))
+            scheduler.submit("a", self.job([], "a2"))
+            self.assertFalse(scheduler.has_capacity("a"))
+            with self.assertRaises(DiscussionRejected):
+                scheduler.submit("a", self.job([], "a3"))
+
+            scheduler.submit("b", self.job([], "b1"))
+            self.assertFalse(scheduler.has_capacity("c"))
+            await scheduler.drain(timeout=1.0)
+
+        asyncio.run(run())
+
+    def test_drain_cancels_after_timeout(self):
+        """Test that shutdown waits briefly, then cancels what is left"""
+        scheduler = DiscussionScheduler(max_concurrent=1, max_queued=10, max_queued_per_thread=5)
+        log = []
+
+        async def run():
+            scheduler.submit("a", self.job(log, "long", delay=10.0))
+            scheduler.submit("b", self.job(log, "waiting"))
+            await scheduler.drain(timeout=0.05)
+            self.assertFalse(scheduler.has_capacity("c"))
+
+        asyncio.run(run())
+
+        self.assertEqual(log, [("start", "long")])
+        self.assertEqual(scheduler.running, {})
+        self.assertEqual(scheduler.queued, 0)
+
+    def test_supersede_cancels_earlier_discussions(self):
+        """Test that a new discussion replaces the thread's running and queued ones"""
+        scheduler = DiscussionScheduler(max_concurrent=1, max_queued=10, max_queued_per_thread=5)
+        log = []
+        updates = {"first": [], "second": [], "third": []}
+        reasons = []
+
+        async def run():
+            async def first():
+                log.append(("start", "first"))
+                try:
+                    await asyncio.sleep(10.0)
+                except asyncio.CancelledError as e:
+                    reasons.append(e.args[0] if e.args else None)
+                    raise
+
+            scheduler.submit("a", first, updates["first"].append)
+            scheduler.submit("a", self.job(log, "second"), updates["second"].append)
+            await asyncio.sleep(0)
+            job = scheduler.submit("a", self.job(log, "third"), updates["third"].append, supersede=True)
+            await scheduler.drain(timeout=1.0)
+            return job
+
+        job = asyncio.run(run())
+
+        started = [name for event, name in log if event == "start"]
+        self.assertEqual(started, ["first", "third"])
+        self.assertEqual(reasons, [CancelReason.SUPERSEDED])
+        self.assertEqual(updates["first"][-1], None)
+        self.assertEqual(updates["second"], [1, None])
+        self.assertEqual(updates["third"], [1, 0])
+        self.assertFalse(job.cancelled)
+
+    def test_cancel_before_start(self):
+        """Test that a job cancelled right after starting still frees its slot"""
+        scheduler = DiscussionScheduler(max_concurrent=1, max_queued=10, max_queued_per_thread=5)
+        log = []
+
+        async def run():
+            job = scheduler.submit("a", self.job(log, "cancelled"))
+            job.cancel(CancelReason.NO_LISTENERS)
+            scheduler.submit("b", self.job(log, "next"))
+            await scheduler.drain(timeout=1.0)
+
+        asyncio.run(run())
+
+        self.assertEqual(log, [("start", "next"), ("end", "next")])
+        self.assertEqual(scheduler.running, {})
+
+if __name__ == '__main__':
+    unittest.main()
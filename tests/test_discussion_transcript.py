@@ -0,0 +1,77 @@
+import unittest
+from app.services.agent.transcript import DiscussionTranscript
+from app.services.agent.a2a_protocol import A2AProtocol
+from app.schemas.agent import AgentRole
+from app.schemas.chat import ChatMessage
+
+class TestDiscussionTranscript(unittest.TestCase):
+    """Test cases for the incrementally formatted discussion transcript"""
+
+    def setUp(self):
+        """Set up a discussion's messages"""
+        roles = [AgentRole.RESEARCHER, AgentRole.CRITIC, AgentRole.CREATIVE]
+        self.messages = [
+            ChatMessage(
+                thread_id="thread",
+                sender_type="agent",
+                sender_id=f"agent-{i % 3}",
+                content=f"Point number {i}",
+                metadata={"role": roles[i % 3], "round": i // 3}
+            )
+            for i in range(12)
+        ]
+        self.protocol = A2AProtocol()
+
+    def as_dicts(self, messages):
+        return [
+            {
+                "content": msg.content,
+                "sender_id": msg.sender_id,
+                "sender_type": msg.sender_type,
+                "metadata": msg.metadata
+            }
+            for msg in messages
+        ]
+
+    def test_matches_protocol_formatting(self):
+        """Test that rendered windows equal formatting the messages from scratch"""
+        transcript = DiscussionTranscript(self.messages)
+        window = self.messages[-A2AProtocol.DISCUSSION_WINDOW:]
+
+        self.assertEqual(
+            transcript.render(self.messages, last=A2AProtocol.DISCUSSION_WINDOW),
+            self.protocol._format_messages(self.as_dicts(window))
+        )
+        self.assertEqual(transcript.render(self.messages), self.protocol._format_messages(self.as_dicts(self.messages)))
+        self.assertTrue(transcript.render(self.messages[:1]).startswith("Researcher: Point number 0"))
+
+    def test_messages_are_formatted_once(self):
+        """Test that appending is idempotent and rendering reuses stored entries"""
+        transcript = DiscussionTranscript()
+        for message in self.messages[:6]:
+            transcript.append(message)
+        transcript.append(self.messages[0])
+        stored = transcript.entries[2]
+
+        text = transcript.render(self.messages[:8], last=3)
+
+        self.assertEqual(len(transcript), 8)
+        self.assertIs(transcript.entries[2], stored)
+        self.assertIn(self.messages[7].id, transcript)
+        self.assertEqual(text, "".join(transcript.entries[5:8]))
+
+    def test_window_of_read_subset(self):
+        """Test that a turn reading a subset of messages sees only those"""
+        transcript = DiscussionTranscript(self.messages)
+        reads = [self.messages[1], self.messages[4], self.messages[9]]
+
+        text = transcript.render(reads, last=2)
+
+        self.assertNotIn("Point number 1\n", text)
+        self.assertIn("Point number 4", text)
+        self.assertIn("Point number 9", text)
+        self.assertEqual(transcript.tail(2), "".join(transcript.entries[-2:]))
+        self.assertEqual(transcript.tail(0), "")
+
+if __name__ == '__main__':
+    unittest.main()
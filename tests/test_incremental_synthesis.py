@@ -0,0 +1,124 @@
+import unittest
+import asyncio
+from app.services.agent.a2a_protocol import A2AProtocol
+from app.services.agent.synthesizer import IncrementalSynthesizer
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+
+class RecordingProtocol:
+    """Stand-in protocol whose updates append sender ids after a short delay"""
+
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    async def update_synthesis(self, summary, messages, bypass_cache=False):
+        self.batches.append([msg["sender_id"] for msg in messages])
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return summary + "".join(f"[{msg['sender_id']}]" for msg in messages)
+
+def message(sender_id):
+    return ChatMessage(thread_id="thread", sender_type="agent", sender_id=sender_id, content=f"From {sender_id}")
+
+class TestIncrementalSynthesis(unittest.TestCase):
+    """Test cases for the running synthesis folded as messages arrive"""
+
+    def test_messages_arriving_during_a_fold_are_coalesced(self):
+        """Test that a burst of messages costs one fold after the one in progress"""
+        protocol = RecordingProtocol()
+        updates = []
+        synthesizer = IncrementalSynthesizer(protocol, on_update=lambda summary, count: updates.append(count))
+        messages = [message(f"agent-{i}") for i in range(4)]
+
+        async def run():
+            for msg in messages:
+                synthesizer.add(msg)
+                synthesizer.add(msg)  # duplicates are ignored
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.2)
+            return await synthesizer.final(messages)
+
+        summary = asyncio.run(run())
+
+        self.assertEqual(protocol.batches, [["agent-0"], ["agent-1", "agent-2", "agent-3"]])
+        self.assertEqual(updates, [1, 4])
+        self.assertEqual(summary, "[agent-0][agent-1][agent-2][agent-3]")
+
+    def test_final_replaces_a_stale_fold(self):
+        """Test that final folds everything at once instead of waiting behind a stale fold"""
+        protocol = RecordingProtocol(delay=0.5)
+        synthesizer = IncrementalSynthesizer(protocol)
+        messages = [message("first"), message("second")]
+
+        async def run():
+            synthesizer.add(messages[0])
+            await asyncio.sleep(0)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            summary = await synthesizer.final(messages)
+            return summary, loop.time() - start
+
+        summary, elapsed = asyncio.run(run())
+
+        self.assertEqual(protocol.batches, [["first"], ["first", "second"]])
+        self.assertEqual(summary, "[first][second]")
+        self.assertLess(elapsed, 0.75)
+
+    def test_failed_update_is_retried_by_final(self):
+        """Test that a failing background fold keeps its messages for the final synthesis"""
+        protocol = RecordingProtocol(fail=True)
+        synthesizer = IncrementalSynthesizer(protocol)
+        critic = message("critic")
+
+        async def run():
+            synthesizer.add(critic)
+            await asyncio.sleep(0.1)
+            protocol.fail = False
+            return await synthesizer.final([critic])
+
+        summary = asyncio.run(run())
+
+        self.assertEqual(protocol.batches, [["critic"], ["critic"]])
+        self.assertEqual(summary, "[critic]")
+        self.assertEqual(synthesizer.folded, {critic.id})
+
+    def test_close_cancels_the_fold(self):
+        """Test that closing stops the fold in progress and keeps its messages"""
+        protocol = RecordingProtocol(delay=1.0)
+        updates = []
+        synthesizer = IncrementalSynthesizer(protocol, on_update=lambda summary, count: updates.append(count))
+
+        async def run():
+            synthesizer.add(message("researcher"))
+            await asyncio.sleep(0)
+            await synthesizer.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(updates, [])
+        self.assertEqual([msg.sender_id for msg in synthesizer.pending], ["researcher"])
+
+    def test_simulated_updates_build_the_summary(self):
+        """Test the protocol's simulated update against the synthesis format"""
+        original = settings.MCP_BACKEND_ENABLED
+        settings.MCP_BACKEND_ENABLED = False
+        try:
+            synthesizer = IncrementalSynthesizer(A2AProtocol())
+            messages = [message("researcher"), message("critic")]
+            chunks = asyncio.run(self._collect(synthesizer.stream_final(messages)))
+        finally:
+            settings.MCP_BACKEND_ENABLED = original
+
+        summary = "".join(chunks)
+        self.assertEqual(summary, synthesizer.summary)
+        self.assertTrue(summary.startswith("# Discussion Summary"))
+
+    @staticmethod
+    async def _collect(chunks):
+        return [chunk async for chunk in chunks]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import asyncio
+import time
+import httpx
+from app.mcp_stub_server import create_app, StubProfile
+from app.services.agent.mcp_client import MCPClient
+from app.services.agent.mcp_backends import MCPBackend, BreakerState
+from app.core.config import settings
+from app.core.metrics import metrics
+
+class TestMCPBackends(unittest.TestCase):
+    """Test cases for hedged requests and circuit breaking across MCP backends"""
+
+    SETTINGS = (
+        "MCP_BACKEND_ENABLED",
+        "MCP_BATCHING_ENABLED",
+        "MCP_HEDGING_ENABLED",
+        "MCP_HEDGE_DELAY",
+        "MCP_HEDGE_MIN_SAMPLES",
+        "MCP_BREAKER_MIN_REQUESTS",
+        "MCP_BREAKER_MAX_LATENCY",
+        "MCP_BREAKER_COOLDOWN",
+        "MCP_RETRY_BACKOFF"
+    )
+
+    def setUp(self):
+        """Set up test environment"""
+        self.original_settings = {name: getattr(settings, name) for name in self.SETTINGS}
+        settings.MCP_BACKEND_ENABLED = True
+        settings.MCP_BATCHING_ENABLED = False
+        settings.MCP_HEDGING_ENABLED = True
+        settings.MCP_HEDGE_DELAY = 0.05
+        settings.MCP_HEDGE_MIN_SAMPLES = 20
+        settings.MCP_BREAKER_MIN_REQUESTS = 3
+        settings.MCP_RETRY_BACKOFF = 0.001
+
+    def tearDown(self):
+        for name, value in self.original_settings.items():
+            setattr(settings, name, value)
+
+    def client(self, *profiles):
+        """MCP client spread over one in-process stub server per profile"""
+        apps = [create_app(profile, seed=1) for profile in profiles]
+        backends = [
+            MCPBackend(f"http://backend-{i}/mcp", httpx.ASGITransport(app=app))
+            for i, app in enumerate(apps)
+        ]
+        return MCPClient(backends=backends), apps, backends
+
+    def test_slow_backend_is_hedged(self):
+        """Test that a slow request is duplicated and the faster answer wins"""
+        client, apps, _ = self.client(StubProfile(latency=1.0), StubProfile())
+        wins = metrics.counters["mcp.hedge_wins"]
+
+        async def run():
+            start = time.monotonic()
+            content = await client.generate("response", "Quick?", "critic")
+            chunks = [chunk async for chunk in client.stream_generate("response", "Quick?", "critic")]
+            elapsed = time.monotonic() - start
+            await client.close()
+            return content, chunks, elapsed
+
+        content, chunks, elapsed = asyncio.run(run())
+
+        self.assertEqual(content, "Critic stub response about: Quick? [response]")
+        self.assertEqual("".join(chunks), content)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(metrics.counters["mcp.hedge_wins"] - wins, 2)
+        self.assertEqual(apps[1].state.requests, 2)
+
+    def test_hedge_delay_follows_latency_percentile(self):
+        """Test that the hedge delay tracks the backend's recent latencies"""
+        backend = MCPBackend("http://backend/mcp")
+        for i in range(19):
+            backend.record(True, 0.01 * (i + 1))
+        self.assertIsNone(backend.latency_percentile(0.95))
+
+        backend.record(True, 0.2)
+
+        self.assertAlmostEqual(backend.latency_percentile(0.95), 0.2)
+        self.assertAlmostEqual(backend.latency_percentile(0.5), 0.11)
+
+    def test_failing_backend_is_ejected(self):
+        """Test that errors open the breaker and retries move to a healthy backend"""
+        settings.MCP_HEDGING_ENABLED = False
+        client, apps, backends = self.client(StubProfile(error_rate=1.0), StubProfile())
+
+        async def run():
+            results = [await client.generate("response", f"Question {i}") for i in range(10)]
+            await client.close()
+            return results
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(backends[0].state, BreakerState.OPEN)
+        self.assertEqual(apps[0].state.requests, settings.MCP_BREAKER_MIN_REQUESTS)
+        self.assertEqual(apps[1].state.requests, 10)
+
+    def test_slow_backend_is_ejected(self):
+        """Test that a backend whose median latency degrades is ejected"""
+        settings.MCP_HEDGING_ENABLED = False
+        settings.MCP_BREAKER_MAX_LATENCY = 0.02
+        client, apps, backends = self.client(StubProfile(latency=0.05), StubProfile())
+
+        async def run():
+            for i in range(6):
+                await client.generate("response", f"Question {i}")
+            await client.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(backends[0].state, BreakerState.OPEN)
+        self.assertEqual(apps[0].state.requests, settings.MCP_BREAKER_MIN_REQUESTS)
+
+    def test_ejected_backend_recovers_after_trial(self):
+        """Test that a cooled-down backend gets one trial request, then rejoins"""
+        settings.MCP_BREAKER_COOLDOWN = 0.01
+        backend = MCPBackend("http://backend/mcp")
+        for _ in range(3):
+            backend.record(False)
+        self.assertEqual(backend.state, BreakerState.OPEN)
+
+        time.sleep(0.02)
+        self.assertTrue(backend.available)
+        backend.begin()
+        self.assertFalse(backend.available)
+        backend.finish()
+        backend.record(True, 0.01)
+
+        self.assertEqual(backend.state, BreakerState.CLOSED)
+        self.assertEqual(list(backend.outcomes), [])
+
+if __name__ == '__main__':
+    unittest.main()
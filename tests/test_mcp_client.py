@@ -0,0 +1,108 @@
+import unittest
+import asyncio
+import httpx
+from app.mcp_stub_server import create_app, StubProfile
+from app.services.agent.mcp_client import MCPClient
+from app.services.agent.a2a_protocol import A2AProtocol
+from app.schemas.agent import Agent, AgentRole
+from app.core.config import settings
+
+class TestMCPClient(unittest.TestCase):
+    """Test cases for the pooled MCP client against the stub server"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.original_settings = (
+            settings.MCP_BACKEND_ENABLED,
+            settings.MCP_MAX_RETRIES,
+            settings.MCP_RETRY_BACKOFF
+        )
+        settings.MCP_BACKEND_ENABLED = True
+        settings.MCP_RETRY_BACKOFF = 0.001
+        self.agent = Agent(
+            name="Critic Agent",
+            role=AgentRole.CRITIC,
+            description="Specialist in critic thinking",
+            prompt_template="You are a critic."
+        )
+
+    def tearDown(self):
+        (
+            settings.MCP_BACKEND_ENABLED,
+            settings.MCP_MAX_RETRIES,
+            settings.MCP_RETRY_BACKOFF
+        ) = self.original_settings
+
+    def client(self, profile=None):
+        """MCP client wired to an in-process stub server"""
+        app = create_app(profile or StubProfile(), seed=1)
+        return MCPClient(transport=httpx.ASGITransport(app=app)), app
+
+    def test_generate_and_stream_agree(self):
+        """Test that streamed output joins to the non-streamed response"""
+        client, _ = self.client()
+
+        async def run():
+            content = await client.get_agent_response(self.agent, "Is this sound?", [])
+            chunks = [chunk async for chunk in client.stream_agent_response(self.agent, "Is this sound?", [])]
+            pool = client.http_client
+            await client.generate("response", "again")
+            same_pool = client.http_client is pool
+            await client.close()
+            return content, chunks, same_pool
+
+        content, chunks, same_pool = asyncio.run(run())
+
+        self.assertTrue(content.startswith("Critic stub response"))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), content)
+        self.assertTrue(same_pool)
+
+    def test_transient_errors_are_retried(self):
+        """Test that failures within the retry budget are invisible to callers"""
+        settings.MCP_MAX_RETRIES = 3
+        client, app = self.client(StubProfile(fail_first=2))
+
+        async def run():
+            content = await client.generate("response", "hello")
+            await client.close()
+            return content
+
+        self.assertIn("stub response", asyncio.run(run()))
+        self.assertEqual(app.state.requests, 3)
+
+    def test_retries_give_up(self):
+        """Test that persistent failures surface once retries are exhausted"""
+        settings.MCP_MAX_RETRIES = 1
+        client, app = self.client(StubProfile(fail_first=5, error_status=503))
+
+        async def run():
+            try:
+                with self.assertRaises(httpx.HTTPStatusError):
+                    await client.generate("response", "hello")
+            finally:
+                await client.close()
+
+        asyncio.run(run())
+        self.assertEqual(app.state.requests, 2)
+
+    def test_a2a_uses_backend(self):
+        """Test that discussion and synthesis calls go through the MCP client"""
+        client, app = self.client()
+        protocol = A2AProtocol(client)
+        messages = [{"content": "First point", "sender_type": "agent", "sender_id": "a", "metadata": {"role": "researcher"}}]
+
+        async def run():
+            discussion = await protocol.process_discussion(self.agent, messages, [])
+            synthesis = "".join([chunk async for chunk in protocol.stream_synthesis(messages)])
+            await client.close()
+            return discussion, synthesis
+
+        discussion, synthesis = asyncio.run(run())
+
+        self.assertIn("[discussion]", discussion)
+        self.assertIn("[synthesis]", synthesis)
+        self.assertEqual(app.state.requests, 2)
+
+if __name__ == '__main__':
+    unittest.main()
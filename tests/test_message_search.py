@@ -0,0 +1,80 @@
+import unittest
+import asyncio
+from app.services.chat.thread_manager import ThreadManager
+from app.schemas.chat import ChatMessage
+
+class TestMessageSearch(unittest.TestCase):
+    """Test cases for full-text message search"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.thread_manager = ThreadManager()
+        asyncio.run(self.async_setUp())
+
+    async def async_setUp(self):
+        """Create two threads with a few messages each"""
+        self.thread_id_1 = await self.thread_manager.create_thread("Thread 1")
+        self.thread_id_2 = await self.thread_manager.create_thread("Thread 2")
+
+        contents = [
+            (self.thread_id_1, "user_a", "How does the vector database scale?"),
+            (self.thread_id_1, "agent_1", "The database scales with sharding and a vector index."),
+            (self.thread_id_2, "user_b", "Vector search latency matters for the database."),
+            (self.thread_id_2, "agent_2", "Creative ideas about music."),
+        ]
+        for thread_id, sender_id, content in contents:
+            await self.thread_manager.add_message(ChatMessage(
+                thread_id=thread_id,
+                sender_type="user" if sender_id.startswith("user") else "agent",
+                sender_id=sender_id,
+                content=content
+            ))
+
+    def test_term_search(self):
+        """Test that all messages containing every term are returned"""
+        results = asyncio.run(self.thread_manager.search_messages("vector database"))
+
+        self.assertEqual(results["total"], 3)
+        for hit in results["hits"]:
+            self.assertIn("vector", hit["message"].content.lower())
+            self.assertIn("database", hit["message"].content.lower())
+
+    def test_phrase_search(self):
+        """Test that quoted phrases only match consecutive terms"""
+        results = asyncio.run(self.thread_manager.search_messages('"vector index"'))
+
+        self.assertEqual(results["total"], 1)
+        self.assertEqual(results["hits"][0]["message"].sender_id, "agent_1")
+
+    def test_filters(self):
+        """Test thread and sender filters"""
+        by_thread = asyncio.run(self.thread_manager.search_messages("database", thread_id=self.thread_id_2))
+        by_sender = asyncio.run(self.thread_manager.search_messages("database", sender_id="user_a"))
+
+        self.assertEqual(by_thread["total"], 1)
+        self.assertEqual(by_thread["hits"][0]["message"].thread_id, self.thread_id_2)
+        self.assertEqual(by_sender["total"], 1)
+        self.assertEqual(by_sender["hits"][0]["message"].sender_id, "user_a")
+
+    def test_pagination_and_ranking(self):
+        """Test that pages are disjoint and ordered by score"""
+        full = asyncio.run(self.thread_manager.search_messages("database"))
+        first = asyncio.run(self.thread_manager.search_messages("database", limit=2))
+        second = asyncio.run(self.thread_manager.search_messages("database", limit=2, offset=2))
+
+        scores = [hit["score"] for hit in full["hits"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(len(first["hits"]), 2)
+        self.assertEqual(len(second["hits"]), 1)
+        ids = [hit["message"].id for hit in first["hits"] + second["hits"]]
+        self.assertEqual(ids, [hit["message"].id for hit in full["hits"]])
+
+    def test_unknown_term(self):
+        """Test that a query with an unindexed term has no hits"""
+        results = asyncio.run(self.thread_manager.search_messages("database nonexistentterm"))
+
+        self.assertEqual(results["total"], 0)
+        self.assertEqual(results["hits"], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+import asyncio
+import json
+from app.services.agent.streaming import split_tokens
+from app.services.agent.agent_manager import AgentManager
+from app.services.chat.connection_manager import ConnectionManager
+from app.services.chat.message_stream import MessageStream
+from app.services.chat.thread_manager import ThreadManager
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+
+class RecordingWebSocket:
+    """Stand-in for a websocket that records decoded frames"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, message):
+        self.sent.append(json.loads(message))
+
+    async def close(self):
+        pass
+
+async def chunks(parts, delay=0.0):
+    """Async generator yielding the given text chunks"""
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+
+class TestMessageStreaming(unittest.TestCase):
+    """Test cases for streaming agent output as message_delta frames"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.thread_manager = ThreadManager()
+        self.connection_manager = ConnectionManager()
+        self.thread_id = asyncio.run(self.thread_manager.create_thread("Streaming"))
+        self.original_interval = settings.WS_DELTA_INTERVAL
+
+    def tearDown(self):
+        settings.WS_DELTA_INTERVAL = self.original_interval
+
+    def relay(self, parts, delay=0.0):
+        """Relay chunks to one connected client and return its frames and the stored record"""
+        websocket = RecordingWebSocket()
+        message = ChatMessage(
+            thread_id=self.thread_id,
+            sender_type="agent",
+            sender_id="agent_1",
+            content="",
+            metadata={"role": "critic"}
+        )
+
+        async def run():
+            self.connection_manager.connect(self.thread_id, websocket)
+            stream = MessageStream(self.thread_manager, self.connection_manager, message)
+            record = await stream.relay(chunks(parts, delay))
+            await asyncio.sleep(0.05)
+            return record
+
+        record = asyncio.run(run())
+        return websocket.sent, record, message
+
+    def test_split_tokens_round_trip(self):
+        """Test that token chunks join back to the original text"""
+        text = "First line.\n\nSecond  line with   spaces "
+        self.assertEqual("".join(split_tokens(text)), text)
+
+    def test_deltas_then_final_message(self):
+        """Test that deltas are sent in order and the full message is stored once"""
+        settings.WS_DELTA_INTERVAL = 0.0
+        sent, record, message = self.relay(["Hello ", "streaming ", "world"])
+
+        deltas = [frame for frame in sent if frame["type"] == "message_delta"]
+        self.assertEqual([frame["delta"] for frame in deltas], ["Hello ", "streaming ", "world"])
+        self.assertEqual([frame["offset"] for frame in deltas], [0, 6, 16])
+        self.assertTrue(all(frame["message"]["id"] == message.id for frame in deltas))
+        self.assertEqual(deltas[0]["message"]["content"], "")
+
+        self.assertEqual(sent[-1]["type"], "new_message")
+        self.assertEqual(sent[-1]["message"]["content"], "Hello streaming world")
+        self.assertEqual(record.content, "Hello streaming world")
+
+        stored = asyncio.run(self.thread_manager.get_messages(self.thread_id))
+        self.assertEqual([msg.id for msg in stored], [message.id])
+
+    def test_deltas_are_batched(self):
+        """Test that fast chunks are merged into fewer frames, sending the first at once"""
+        settings.WS_DELTA_INTERVAL = 10.0
+        sent, record, _ = self.relay(["a", "b", "c", "d"])
+
+        deltas = [frame["delta"] for frame in sent if frame["type"] == "message_delta"]
+        self.assertEqual(deltas, ["a", "bcd"])
+        self.assertEqual(record.content, "abcd")
+
+    def test_agent_stream_matches_response(self):
+        """Test that a streamed agent response equals the non-streaming one"""
+        agent_manager = AgentManager()
+        prompt_templates = asyncio.run(agent_manager.generate_prompt_templates("Streaming"))
+        agents = asyncio.run(agent_manager.initialize_agents(self.thread_id, prompt_templates))
+        user_message = ChatMessage(
+            thread_id=self.thread_id,
+            sender_type="user",
+            sender_id="test_user",
+            content="What is streaming?"
+        )
+
+        async def collect():
+            return [chunk async for chunk in agent_manager.stream_agent_response(agents[0].id, user_message, [])]
+
+        streamed = asyncio.run(collect())
+        response = asyncio.run(agent_manager.get_agent_response(agents[0].id, self.thread_id, user_message, []))
+        self.assertGreater(len(streamed), 1)
+        self.assertEqual("".join(streamed), response.content)
+
+    def test_cancelled_stream_is_stored_as_partial(self):
+        """Test that cancelling a relay closes the stream and keeps the partial text"""
+        settings.WS_DELTA_INTERVAL = 0.0
+        closed = []
+        message = ChatMessage(
+            thread_id=self.thread_id,
+            sender_type="agent",
+            sender_id="agent_1",
+            content="",
+            metadata={"role": "critic"}
+        )
+
+        async def endless():
+            try:
+                yield "Partial "
+                yield "answer"
+                await asyncio.sleep(10.0)
+                yield "never sent"
+            finally:
+                closed.append(True)
+
+        async def run():
+            stream = MessageStream(self.thread_manager, self.connection_manager, message)
+            task = asyncio.create_task(stream.relay(endless()))
+            await asyncio.sleep(0.05)
+            task.cancel("superseded")
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+
+        self.assertEqual(closed, [True])
+        stored = asyncio.run(self.thread_manager.get_messages(self.thread_id))
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(stored[0].content, "Partial answer")
+        self.assertEqual(stored[0].metadata, {"role": "critic", "partial": True, "cancel_reason": "superseded"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+import asyncio
+import time
+from app.services.agent.discussion_plan import DiscussionExecutor, rounds_plan, pipelined_plan
+from app.schemas.agent import Agent, AgentRole, AgentTurn, TurnKind
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+
+def make_agents(*roles):
+    """Agents with readable ids"""
+    return [
+        Agent(id=role.value, name=role.value, role=role, description="", prompt_template="")
+        for role in roles
+    ]
+
+class FakeTurns:
+    """Runs plan turns after per-turn delays and records what each one read"""
+
+    def __init__(self, delays=None, default_delay=0.01, failing=()):
+        self.delays = delays or {}
+        self.default_delay = default_delay
+        self.failing = set(failing)
+        self.started = {}
+        self.inputs = {}
+        self.origin = time.perf_counter()
+
+    async def __call__(self, turn, inputs):
+        self.started[turn.id] = time.perf_counter() - self.origin
+        self.inputs[turn.id] = [message.content for message in inputs]
+        await asyncio.sleep(self.delays.get(turn.id, self.default_delay))
+        if turn.id in self.failing:
+            raise RuntimeError("backend unavailable")
+        return ChatMessage(thread_id="thread", sender_type="agent", sender_id=turn.agent_id or "synthesis", content=turn.id)
+
+class TestParallelDiscussion(unittest.TestCase):
+    """Test cases for running discussion plans as a DAG of agent turns"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.original_limit = settings.AGENT_CONCURRENCY_LIMIT
+        settings.AGENT_CONCURRENCY_LIMIT = 10
+        self.agents = make_agents(AgentRole.RESEARCHER, AgentRole.CRITIC, AgentRole.CREATIVE)
+
+    def tearDown(self):
+        settings.AGENT_CONCURRENCY_LIMIT = self.original_limit
+
+    def test_turns_run_concurrently(self):
+        """Test that independent turns overlap and complete in finishing order"""
+        turns = FakeTurns(delays={"r0:researcher": 0.2, "r0:critic": 0.05, "r0:creative": 0.1})
+        plan = rounds_plan(self.agents, 0)
+
+        start = time.perf_counter()
+        messages = asyncio.run(DiscussionExecutor(plan, turns).run())
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.35)
+        self.assertEqual(
+            [message.content for message in messages],
+            ["r0:critic", "r0:creative", "r0:researcher", "synthesis"]
+        )
+        self.assertEqual(turns.inputs["synthesis"], ["r0:critic", "r0:creative", "r0:researcher"])
+
+    def test_concurrency_limit(self):
+        """Test that the limit bounds how many turns run at once"""
+        settings.AGENT_CONCURRENCY_LIMIT = 1
+        turns = FakeTurns(default_delay=0.05)
+        plan = rounds_plan(self.agents, 0)[:-1]
+
+        start = time.perf_counter()
+        asyncio.run(DiscussionExecutor(plan, turns).run())
+
+        self.assertGreaterEqual(time.perf_counter() - start, 0.15)
+
+    def test_failed_turn_is_skipped(self):
+        """Test that one failing agent does not stop the turns that read it"""
+        turns = FakeTurns(failing={"r0:critic"})
+        plan = rounds_plan(self.agents, 1, parallel_rounds=True)
+
+        messages = asyncio.run(DiscussionExecutor(plan, turns).run())
+
+        self.assertNotIn("r0:critic", [message.content for message in messages])
+        self.assertEqual(sorted(turns.inputs["r1:critic"]), ["r0:creative", "r0:researcher"])
+        self.assertEqual(messages[-1].content, "synthesis")
+
+    def test_rounds_plan_reads(self):
+        """Test that parallel rounds read earlier rounds and sequential turns read everything before them"""
+        parallel = {turn.id: turn.reads for turn in rounds_plan(self.agents, 2, parallel_rounds=True)}
+        self.assertEqual(parallel["r1:creative"], ["r0:researcher", "r0:critic", "r0:creative"])
+        self.assertEqual(len(parallel["r2:researcher"]), 6)
+
+        sequential = {turn.id: turn.reads for turn in rounds_plan(self.agents, 1, parallel_rounds=False)}
+        self.assertEqual(sequential["r1:critic"], ["r0:researcher", "r0:critic", "r0:creative", "r1:researcher"])
+
+    def test_pipelined_plan_skips_barriers(self):
+        """Test that the critic answers the researcher without waiting for the creative agent"""
+        turns = FakeTurns(delays={"r0:researcher": 0.02, "r0:critic": 0.02, "r0:creative": 0.3})
+        plan = pipelined_plan(self.agents, 1)
+
+        asyncio.run(DiscussionExecutor(plan, turns).run())
+
+        self.assertEqual(sorted(turns.inputs["r1:critic"]), ["r0:critic", "r0:researcher"])
+        self.assertLess(turns.started["r1:critic"], 0.2)
+        self.assertGreater(turns.started["r1:researcher"], 0.3)
+
+    def test_early_stop_skips_later_rounds(self):
+        """Test that a converged round skips what is left but still synthesizes"""
+        turns = FakeTurns()
+        plan = rounds_plan(self.agents, 3)
+
+        async def round_complete(round_num, messages):
+            return round_num == 1
+
+        executor = DiscussionExecutor(plan, turns, round_complete)
+        messages = asyncio.run(executor.run())
+
+        self.assertEqual(executor.skipped_rounds, 2)
+        self.assertNotIn("r2:researcher", turns.started)
+        self.assertEqual(messages[-1].content, "synthesis")
+        self.assertEqual(len(turns.inputs["synthesis"]), 6)
+
+    def test_failing_round_check_keeps_going(self):
+        """Test that a raising on_round_complete neither stops nor stalls the discussion"""
+        turns = FakeTurns()
+        plan = rounds_plan(self.agents, 2)
+
+        async def round_complete(round_num, messages):
+            raise RuntimeError("encoder unavailable")
+
+        executor = DiscussionExecutor(plan, turns, round_complete)
+
+        async def run():
+            return await asyncio.wait_for(executor.run(), timeout=2)
+
+        messages = asyncio.run(run())
+
+        self.assertEqual(executor.skipped, [])
+        self.assertEqual(len(messages), 10)
+        self.assertEqual(messages[-1].content, "synthesis")
+
+    def test_plan_must_read_earlier_turns(self):
+        """Test that plans reading later or unknown turns are rejected"""
+        plan = [
+            AgentTurn(id="a", kind=TurnKind.RESPONSE, agent_id="researcher", round=0, reads=["b"]),
+            AgentTurn(id="b", kind=TurnKind.RESPONSE, agent_id="critic", round=0),
+        ]
+        with self.assertRaises(ValueError):
+            DiscussionExecutor(plan, FakeTurns())
+
+if __name__ == '__main__':
+    unittest.main()
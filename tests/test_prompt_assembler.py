@@ -0,0 +1,134 @@
+import unittest
+from app.services.agent.prompt_assembler import PromptAssembler, ApproximateTokenizer, summarize_line
+from app.services.agent.mcp_client import MCPClient
+from app.services.agent.a2a_protocol import A2AProtocol
+from app.schemas.agent import Agent, AgentRole
+from app.core.config import settings
+
+class TestPromptAssembler(unittest.TestCase):
+    """Test cases for token-budgeted prompt assembly"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.original_settings = (
+            settings.PROMPT_BUDGET_ENABLED,
+            settings.PROMPT_TOKEN_BUDGET,
+            settings.PROMPT_ROLE_BUDGETS
+        )
+        settings.PROMPT_BUDGET_ENABLED = True
+        settings.PROMPT_TOKEN_BUDGET = 400
+        settings.PROMPT_ROLE_BUDGETS = {}
+        self.tokenizer = ApproximateTokenizer()
+        self.assembler = PromptAssembler(self.tokenizer)
+        self.documents = [
+            {"content": f"Document {i} " + "relevant detail " * 60, "relevance": 1 - i / 10}
+            for i in range(5)
+        ]
+        self.history = [
+            (f"Critic: message {i} " + "with some argument " * 20 + "\n\n", summarize_line("Critic", f"message {i} with some argument"))
+            for i in range(10)
+        ]
+
+    def tearDown(self):
+        (
+            settings.PROMPT_BUDGET_ENABLED,
+            settings.PROMPT_TOKEN_BUDGET,
+            settings.PROMPT_ROLE_BUDGETS
+        ) = self.original_settings
+
+    def test_tokenizer_truncates_within_limit(self):
+        """Test that truncated text never exceeds the requested token count"""
+        text = "Supercalifragilistic words, with punctuation! " * 50
+
+        for limit in (1, 7, 50, 200):
+            truncated = self.tokenizer.truncate(text, limit)
+            self.assertLessEqual(self.tokenizer.count(truncated), limit)
+            self.assertTrue(truncated.endswith("…"))
+        self.assertEqual(self.tokenizer.truncate("short", 10), "short")
+        self.assertEqual(self.tokenizer.truncate("short", 0), "")
+
+    def test_context_drops_lowest_ranked_documents(self):
+        """Test that documents are kept in order until the budget runs out"""
+        parts = self.assembler.assemble("critic", "You are a critic.", "Question?", self.documents)
+
+        self.assertLess(len(parts.context), len(self.documents))
+        self.assertTrue(parts.context[0].startswith("Document 0"))
+        self.assertTrue(parts.context[-1].endswith("…"))
+        self.assertLessEqual(parts.tokens, 400)
+
+    def test_context_keeps_most_relevant_documents(self):
+        """Test that documents are dropped by relevance, not by position"""
+        documents = list(reversed(self.documents)) + [{"content": "Unscored note"}]
+
+        parts = self.assembler.assemble("critic", "You are a critic.", "Question?", documents)
+
+        self.assertTrue(parts.context[0].startswith("Document 0"))
+        self.assertNotIn("Unscored note", parts.context)
+
+    def test_history_summarizes_older_messages(self):
+        """Test that recent messages stay verbatim and older ones become summary lines"""
+        older = iter([summarize_line("User", "the original question")])
+
+        parts = self.assembler.assemble("critic", "You are a critic.", history=self.history, older=older)
+
+        self.assertTrue(parts.history.startswith(PromptAssembler.SUMMARY_HEADER))
+        self.assertIn("User: the original question\nCritic: message 0 with some argument\n", parts.history)
+        self.assertTrue(parts.history.endswith(self.history[-1][0]))
+        self.assertNotIn(self.history[0][0], parts.history)
+        self.assertLessEqual(self.tokenizer.count(parts.template + parts.history), 400)
+
+    def test_role_budgets(self):
+        """Test that per-role budgets override the default"""
+        settings.PROMPT_ROLE_BUDGETS = {"synthesis": 2000}
+
+        small = self.assembler.assemble("critic", "Summarize.", history=self.history)
+        large = self.assembler.assemble("synthesis", "Summarize.", history=self.history)
+
+        self.assertEqual(self.assembler.budget_for("synthesis"), 2000)
+        self.assertGreater(large.tokens, small.tokens)
+        self.assertNotIn(PromptAssembler.SUMMARY_HEADER, large.history)
+
+    def test_agent_prompts_fit_budget(self):
+        """Test that MCP and A2A prompts stay within budget however long the inputs"""
+        settings.PROMPT_TOKEN_BUDGET = 800
+        agent = Agent(
+            name="Critic Agent",
+            role=AgentRole.CRITIC,
+            description="Specialist in critic thinking",
+            prompt_template="You are a critic."
+        )
+        client = MCPClient()
+        protocol = A2AProtocol(client)
+        messages = [
+            {"content": "An argument " * 100, "sender_type": "agent", "sender_id": str(i), "metadata": {"role": "researcher"}}
+            for i in range(30)
+        ]
+        history, older = protocol._history(messages)
+
+        response_prompt = client._format_prompt(agent.prompt_template, "Question? " * 500, self.documents, "critic")
+        discussion_prompt = protocol._discussion_prompt(agent, history, older, self.documents)
+
+        # Allow for the fixed labels around the budgeted pieces
+        self.assertLessEqual(self.tokenizer.count(response_prompt), 820)
+        self.assertLessEqual(self.tokenizer.count(discussion_prompt), 820)
+        self.assertIn("Earlier in the discussion", discussion_prompt)
+
+        settings.PROMPT_BUDGET_ENABLED = False
+        unbounded = client._format_prompt(agent.prompt_template, "Question? " * 500, self.documents, "critic")
+        self.assertGreater(self.tokenizer.count(unbounded), 1000)
+
+    def test_synthesis_update_keeps_running_summary(self):
+        """Test that a fold never cuts the running summary, only the new messages"""
+        protocol = A2AProtocol(MCPClient())
+        summary = "".join(f"- Point {i}\n" for i in range(1500))
+
+        prompt = protocol._synthesis_update_prompt(summary, self.history)
+        short = protocol._synthesis_update_prompt("- Point 0\n", self.history)
+
+        self.assertIn(summary, prompt)
+        self.assertIn("Critic: message 9", prompt)
+        self.assertLess(len(prompt) - len(summary), len(short))
+        self.assertLessEqual(self.tokenizer.count(short), 420)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+import asyncio
+import time
+import httpx
+from app.mcp_stub_server import create_app, StubProfile
+from app.services.agent.mcp_client import MCPClient
+from app.services.agent.mcp_backends import MCPBackend
+from app.services.agent.rate_limiter import PriorityRateLimiter, CallPriority, call_thread
+from app.core.config import settings
+from app.core.metrics import metrics
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for the priority-aware backend rate limiter"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.original_settings = (settings.MCP_BACKEND_ENABLED, settings.MCP_BATCHING_ENABLED)
+        settings.MCP_BACKEND_ENABLED = True
+        settings.MCP_BATCHING_ENABLED = False
+
+    def tearDown(self):
+        settings.MCP_BACKEND_ENABLED, settings.MCP_BATCHING_ENABLED = self.original_settings
+
+    def test_priority_order_and_thread_fairness(self):
+        """Test that classes are served most urgent first and threads take turns within a class"""
+        limiter = PriorityRateLimiter(rate=0, max_concurrent=1)
+        order = []
+
+        async def call(name, priority, thread_id):
+            async with limiter.slot(priority, thread_id):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        async def run():
+            await limiter.acquire(CallPriority.DISCUSSION)
+            calls = [
+                call("background", CallPriority.BACKGROUND, None),
+                call("synthesis", CallPriority.SYNTHESIS, "a"),
+                call("a1", CallPriority.DISCUSSION, "a"),
+                call("a2", CallPriority.DISCUSSION, "a"),
+                call("b1", CallPriority.DISCUSSION, "b"),
+                call("first", CallPriority.INITIAL_RESPONSE, "c"),
+            ]
+            tasks = [asyncio.create_task(c) for c in calls]
+            await asyncio.sleep(0.01)
+            limiter.release()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+        self.assertEqual(order, ["first", "a1", "b1", "a2", "synthesis", "background"])
+        self.assertEqual((limiter.in_flight, limiter.queued), (0, 0))
+
+    def test_token_bucket_limits_rate(self):
+        """Test that calls beyond the burst wait for refilled tokens"""
+        limiter = PriorityRateLimiter(rate=50, burst=2, max_concurrent=0)
+        before = metrics.counters["rate_limit.background.wait_seconds"]
+
+        async def run():
+            start = time.monotonic()
+            for _ in range(5):
+                async with limiter.slot(CallPriority.BACKGROUND):
+                    pass
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(run())
+
+        # Two calls use the burst, the other three wait 20ms each
+        self.assertGreaterEqual(elapsed, 0.05)
+        self.assertGreater(metrics.counters["rate_limit.background.wait_seconds"], before)
+
+    def test_cancelled_waiter_frees_its_place(self):
+        """Test that a caller giving up while queued does not leak a slot"""
+        limiter = PriorityRateLimiter(rate=0, max_concurrent=1)
+
+        async def run():
+            await limiter.acquire(CallPriority.DISCUSSION)
+            waiting = asyncio.create_task(limiter.acquire(CallPriority.SYNTHESIS, "a"))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            queued = limiter.queued
+            limiter.release()
+            async with limiter.slot(CallPriority.BACKGROUND):
+                in_flight = limiter.in_flight
+            return queued, in_flight
+
+        queued, in_flight = asyncio.run(run())
+
+        self.assertEqual(queued, 0)
+        self.assertEqual(in_flight, 1)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_first_responses_overtake_discussion_backlog(self):
+        """Test that MCP calls for first responses skip ahead of queued discussion turns"""
+        limiter = PriorityRateLimiter(rate=0, max_concurrent=1)
+        app = create_app(StubProfile(latency=0.02), seed=1)
+        client = MCPClient(transport=httpx.ASGITransport(app=app), limiter=limiter)
+        finished = []
+
+        async def call(kind, prompt, thread_id):
+            call_thread.set(thread_id)
+            await client.generate(kind, prompt)
+            finished.append(prompt)
+
+        async def run():
+            tasks = [asyncio.create_task(call("discussion", f"round {i}", "busy")) for i in range(4)]
+            await asyncio.sleep(0.005)
+            tasks.append(asyncio.create_task(call("response", "first answer", "new")))
+            await asyncio.gather(*tasks)
+            await client.close()
+
+        asyncio.run(run())
+
+        # Only the discussion call already in flight finishes before the first response
+        self.assertEqual(finished.index("first answer"), 1)
+
+    def test_retries_and_hedges_take_tokens(self):
+        """Test that retries wait for tokens and hedges are skipped without one"""
+        original = (settings.MCP_MAX_RETRIES, settings.MCP_RETRY_BACKOFF, settings.MCP_HEDGING_ENABLED, settings.MCP_HEDGE_DELAY)
+        settings.MCP_MAX_RETRIES = 3
+        settings.MCP_RETRY_BACKOFF = 0.001
+        try:
+            limiter = PriorityRateLimiter(rate=100, burst=2, max_concurrent=0)
+            app = create_app(StubProfile(error_rate=1.0, error_status=429), seed=1)
+            client = MCPClient(transport=httpx.ASGITransport(app=app), limiter=limiter)
+
+            async def storm():
+                start = time.monotonic()
+                results = await asyncio.gather(*[client.generate("discussion", f"turn {i}") for i in range(4)], return_exceptions=True)
+                await client.close()
+                return results, time.monotonic() - start
+
+            results, elapsed = asyncio.run(storm())
+
+            # Sixteen requests, two from the burst, the rest at 100 per second
+            self.assertTrue(all(isinstance(result, httpx.HTTPStatusError) for result in results))
+            self.assertEqual(app.state.requests, 16)
+            self.assertGreaterEqual(elapsed, 0.13)
+
+            settings.MCP_HEDGING_ENABLED = True
+            settings.MCP_HEDGE_DELAY = 0.02
+            limiter = PriorityRateLimiter(rate=1, burst=1, max_concurrent=0)
+            apps = [create_app(StubProfile(latency=0.1), seed=1), create_app(StubProfile(), seed=1)]
+            client = MCPClient(
+                limiter=limiter,
+                backends=[MCPBackend(f"http://backend-{i}/mcp", httpx.ASGITransport(app=app)) for i, app in enumerate(apps)]
+            )
+
+            async def hedged():
+                await client.generate("response", "Slow?")
+                await client.close()
+
+            asyncio.run(hedged())
+
+            self.assertEqual([app.state.requests for app in apps], [1, 0])
+        finally:
+            settings.MCP_MAX_RETRIES, settings.MCP_RETRY_BACKOFF, settings.MCP_HEDGING_ENABLED, settings.MCP_HEDGE_DELAY = original
+
+if __name__ == '__main__':
+    unittest.main()
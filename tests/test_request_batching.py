@@ -0,0 +1,149 @@
+import unittest
+import asyncio
+import time
+import httpx
+from app.mcp_stub_server import create_app, StubProfile
+from app.services.agent.mcp_client import MCPClient
+from app.services.agent.batch_dispatcher import BatchItemError
+from app.core.config import settings
+
+class TestRequestBatching(unittest.TestCase):
+    """Test cases for coalescing concurrent MCP requests into batches"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.original_settings = (
+            settings.MCP_BACKEND_ENABLED,
+            settings.MCP_BATCHING_ENABLED,
+            settings.MCP_BATCH_MAX_SIZE,
+            settings.MCP_BATCH_MAX_WAIT,
+            settings.MCP_MAX_RETRIES
+        )
+        settings.MCP_BACKEND_ENABLED = True
+        settings.MCP_BATCHING_ENABLED = True
+        settings.MCP_BATCH_MAX_SIZE = 4
+        settings.MCP_BATCH_MAX_WAIT = 0.05
+
+    def tearDown(self):
+        (
+            settings.MCP_BACKEND_ENABLED,
+            settings.MCP_BATCHING_ENABLED,
+            settings.MCP_BATCH_MAX_SIZE,
+            settings.MCP_BATCH_MAX_WAIT,
+            settings.MCP_MAX_RETRIES
+        ) = self.original_settings
+
+    def client(self, profile=None):
+        """Batching MCP client wired to an in-process stub server"""
+        app = create_app(profile or StubProfile(), seed=1)
+        return MCPClient(transport=httpx.ASGITransport(app=app)), app
+
+    async def join(self, chunks):
+        """Text of a chunk stream"""
+        return "".join([chunk async for chunk in chunks])
+
+    def test_concurrent_requests_share_batches(self):
+        """Test that concurrent requests are batched and answered individually"""
+        client, app = self.client()
+
+        async def run():
+            results = await asyncio.gather(*[
+                client.generate("response", f"Question {i}", "critic")
+                for i in range(6)
+            ])
+            await client.close()
+            return results
+
+        results = asyncio.run(run())
+
+        self.assertEqual(app.state.batches, 2)
+        for i, content in enumerate(results):
+            self.assertEqual(content, f"Critic stub response about: Question {i} [response]")
+
+    def test_batched_streams_match_unbatched(self):
+        """Test that interleaved batch deltas are routed back to their streams"""
+        client, app = self.client(StubProfile(token_interval=0.001))
+
+        async def collect(prompt):
+            return "".join([chunk async for chunk in client.stream_generate("response", prompt, "creative")])
+
+        async def run():
+            streamed = await asyncio.gather(collect("Short"), collect("A much longer question to stream"), collect("Mid length"))
+            settings.MCP_BATCHING_ENABLED = False
+            plain = MCPClient(transport=httpx.ASGITransport(app=app))
+            expected = [await plain.generate("response", prompt, "creative") for prompt in ("Short", "A much longer question to stream", "Mid length")]
+            await client.close()
+            await plain.close()
+            return streamed, expected
+
+        streamed, expected = asyncio.run(run())
+
+        self.assertEqual(app.state.batches, 1)
+        self.assertEqual(streamed, expected)
+
+    def test_batch_is_faster_than_sequential_calls(self):
+        """Test that a batch costs one backend latency rather than one per request"""
+        client, app = self.client(StubProfile(latency=0.2))
+
+        async def run():
+            start = time.monotonic()
+            await asyncio.gather(*[client.generate("response", f"Question {i}") for i in range(4)])
+            elapsed = time.monotonic() - start
+            await client.close()
+            return elapsed
+
+        elapsed = asyncio.run(run())
+
+        self.assertEqual(app.state.batches, 1)
+        self.assertLess(elapsed, 0.5)
+
+    def test_abandoned_stream_and_failed_batch(self):
+        """Test that abandoning one stream keeps the batch going and failures reach every caller"""
+        settings.MCP_MAX_RETRIES = 0
+        client, _ = self.client(StubProfile(token_interval=0.001))
+        failing, _ = self.client(StubProfile(error_rate=1.0))
+
+        async def first_chunk():
+            chunks = client.stream_generate("response", "Abandon me", "critic")
+            chunk = await chunks.__anext__()
+            await chunks.aclose()
+            return chunk
+
+        async def run():
+            chunk, content = await asyncio.gather(
+                first_chunk(),
+                self.join(client.stream_generate("response", "Keep me", "critic"))
+            )
+            errors = await asyncio.gather(
+                failing.generate("response", "One"),
+                failing.generate("response", "Two"),
+                return_exceptions=True
+            )
+            await client.close()
+            await failing.close()
+            return chunk, content, errors
+
+        chunk, content, errors = asyncio.run(run())
+
+        self.assertTrue(chunk)
+        self.assertEqual(content, "Critic stub response about: Keep me [response]")
+        self.assertTrue(all(isinstance(error, httpx.HTTPStatusError) for error in errors))
+
+    def test_close_fails_pending_requests(self):
+        """Test that closing the client does not leave callers waiting"""
+        settings.MCP_BATCH_MAX_WAIT = 10
+        client, app = self.client()
+
+        async def run():
+            pending = asyncio.create_task(client.generate("response", "Never sent"))
+            await asyncio.sleep(0)
+            await client.close()
+            return await asyncio.gather(pending, return_exceptions=True)
+
+        result, = asyncio.run(run())
+
+        self.assertIsInstance(result, BatchItemError)
+        self.assertEqual(app.state.batches, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import time
+import httpx
+from app.mcp_stub_server import create_app, StubProfile
+from app.services.agent.mcp_client import MCPClient
+from app.services.agent.response_cache import ResponseCache
+from app.schemas.agent import Agent, AgentRole
+from app.core.config import settings
+
+class TestResponseCache(unittest.TestCase):
+    """Test cases for the content-addressed response cache"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.original_settings = (
+            settings.MCP_BACKEND_ENABLED,
+            settings.MCP_TEMPERATURE,
+            settings.RESPONSE_CACHE_SAMPLED
+        )
+        settings.MCP_BACKEND_ENABLED = True
+        settings.MCP_TEMPERATURE = 0.0
+        self.params = {"model": "default", "temperature": 0.0}
+        self.agent = Agent(
+            name="Analyst Agent",
+            role=AgentRole.ANALYST,
+            description="Specialist in analyst thinking",
+            prompt_template="You are an analyst."
+        )
+
+    def tearDown(self):
+        (
+            settings.MCP_BACKEND_ENABLED,
+            settings.MCP_TEMPERATURE,
+            settings.RESPONSE_CACHE_SAMPLED
+        ) = self.original_settings
+
+    def client(self, cache=None):
+        """MCP client with a cache, wired to an in-process stub server"""
+        app = create_app(StubProfile(), seed=1)
+        client = MCPClient(transport=httpx.ASGITransport(app=app), cache=cache or ResponseCache(directory=""))
+        return client, app
+
+    def test_key_covers_prompt_and_params(self):
+        """Test that the key changes with the prompt, role and model parameters"""
+        key = ResponseCache.key("response", "prompt", "critic", self.params)
+
+        self.assertEqual(key, ResponseCache.key("response", "prompt", "critic", dict(self.params)))
+        self.assertNotEqual(key, ResponseCache.key("response", "prompt!", "critic", self.params))
+        self.assertNotEqual(key, ResponseCache.key("response", "prompt", "analyst", self.params))
+        self.assertNotEqual(key, ResponseCache.key("response", "prompt", "critic", {"model": "default", "temperature": 0.5}))
+
+    def test_lru_eviction_and_ttl(self):
+        """Test that the memory tier evicts the least recently used and expired entries"""
+        cache = ResponseCache(max_entries=2, ttl=60, directory="")
+
+        async def run():
+            await cache.set("a", "A")
+            await cache.set("b", "B")
+            await cache.get("a")
+            await cache.set("c", "C")
+            evicted = await cache.get("b")
+            kept = await cache.get("a")
+            cache.entries["c"] = ("C", time.time() - 120)
+            expired = await cache.get("c")
+            return evicted, kept, expired
+
+        evicted, kept, expired = asyncio.run(run())
+
+        self.assertIsNone(evicted)
+        self.assertEqual(kept, "A")
+        self.assertIsNone(expired)
+        self.assertNotIn("c", cache.entries)
+
+    def test_disk_tier_survives_restart(self):
+        """Test that entries written to disk are found by a fresh cache"""
+        with tempfile.TemporaryDirectory() as directory:
+            async def run():
+                await ResponseCache(directory=directory).set("abc123", "persisted")
+                fresh = ResponseCache(directory=directory)
+                content = await fresh.get("abc123")
+                expired = await ResponseCache(ttl=1e-9, directory=directory).get("abc123")
+                return content, "abc123" in fresh.entries, expired
+
+            content, promoted, expired = asyncio.run(run())
+
+        self.assertEqual(content, "persisted")
+        self.assertTrue(promoted)
+        self.assertIsNone(expired)
+
+    def test_disk_tier_deletes_expired_and_caps_files(self):
+        """Test that expired files are deleted on read and the oldest evicted beyond the cap"""
+        with tempfile.TemporaryDirectory() as directory:
+            def files():
+                return sorted(name for prefix in os.listdir(directory) for name in os.listdir(os.path.join(directory, prefix)))
+
+            async def run():
+                await ResponseCache(directory=directory).set("aa-expired", "old")
+                missed = await ResponseCache(ttl=1e-9, directory=directory).get("aa-expired")
+                after_read = files()
+
+                cache = ResponseCache(directory=directory, disk_max_entries=10)
+                for i in range(11):
+                    await cache.set(f"k{i:02d}", str(i))
+                    # Distinct modification times, oldest first
+                    os.utime(cache._path(f"k{i:02d}"), (i, i))
+                return missed, after_read, cache.disk_entries
+
+            missed, after_read, disk_entries = asyncio.run(run())
+            remaining = files()
+
+        self.assertIsNone(missed)
+        self.assertEqual(after_read, [])
+        self.assertEqual(disk_entries, 9)
+        self.assertEqual(remaining, [f"k{i:02d}.json" for i in range(2, 11)])
+
+    def test_concurrent_disk_writes_of_one_key(self):
+        """Test that writes of the same key at once do not collide on a temp file"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory=directory)
+
+            async def run():
+                # Straight to the disk tier, whose errors set would only log
+                await asyncio.gather(*[
+                    asyncio.to_thread(cache._write, "abc123", (f"answer {i} " * 2000, time.time()))
+                    for i in range(32)
+                ])
+                return await ResponseCache(directory=directory).get("abc123")
+
+            content = asyncio.run(run())
+            leftovers = [name for name in os.listdir(os.path.join(directory, "ab")) if name.endswith(".tmp")]
+
+        self.assertTrue(content.startswith("answer"))
+        self.assertEqual(leftovers, [])
+
+    def test_simulated_answers_are_not_served_by_backend(self):
+        """Test that answers cached while simulating are not reused once the backend is on"""
+        client, app = self.client()
+
+        async def run():
+            settings.MCP_BACKEND_ENABLED = False
+            simulated = await client.complete("response", "Question", simulate=lambda: "simulated", simulated_delay=0)
+            settings.MCP_BACKEND_ENABLED = True
+            real = await client.complete("response", "Question", simulate=lambda: "simulated", simulated_delay=0)
+            again = await client.complete("response", "Question", simulate=lambda: "simulated", simulated_delay=0)
+            await client.close()
+            return simulated, real, again
+
+        simulated, real, again = asyncio.run(run())
+
+        self.assertEqual(simulated, "simulated")
+        self.assertNotEqual(real, "simulated")
+        self.assertEqual(again, real)
+        self.assertEqual(app.state.requests, 1)
+
+    def test_repeated_prompts_skip_backend(self):
+        """Test that identical requests are answered once, streamed or not"""
+        client, app = self.client()
+
+        async def run():
+            first = await client.get_agent_response(self.agent, "Same question", [])
+            second = await client.get_agent_response(self.agent, "Same question", [])
+            streamed = "".join([chunk async for chunk in client.stream_agent_response(self.agent, "Same question", [])])
+            bypassed = await client.get_agent_response(self.agent, "Same question", [], bypass_cache=True)
+            await client.close()
+            return first, second, streamed, bypassed
+
+        first, second, streamed, bypassed = asyncio.run(run())
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, streamed)
+        self.assertEqual(first, bypassed)
+        self.assertEqual(app.state.requests, 2)
+
+    def test_sampled_generations_bypass_cache(self):
+        """Test that sampling skips the cache unless explicitly allowed"""
+        settings.MCP_TEMPERATURE = 0.7
+        settings.RESPONSE_CACHE_SAMPLED = False
+        client, app = self.client()
+
+        async def run():
+            await client.generate("response", "warm up")
+            for _ in range(2):
+                await client.complete("response", "Sampled question")
+            settings.RESPONSE_CACHE_SAMPLED = True
+            for _ in range(2):
+                await client.complete("response", "Sampled question")
+            await client.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(app.state.requests, 4)
+
+    def test_abandoned_stream_is_not_cached(self):
+        """Test that a stream closed early leaves no cache entry"""
+        settings.MCP_BACKEND_ENABLED = False
+        client, _ = self.client()
+
+        async def run():
+            chunks = client.stream_complete("synthesis", "Summarize", simulate=lambda: "one two three four", simulated_delay=0.01)
+            await chunks.__anext__()
+            await chunks.aclose()
+            partial_entries = len(client.cache.entries)
+            full = "".join([chunk async for chunk in client.stream_complete("synthesis", "Summarize", simulate=lambda: "one two three four", simulated_delay=0.01)])
+            return partial_entries, full
+
+        partial_entries, full = asyncio.run(run())
+
+        self.assertEqual(partial_entries, 0)
+        self.assertEqual(full, "one two three four")
+        self.assertEqual(list(client.cache.entries.values())[0][0], "one two three four")
+
+if __name__ == '__main__':
+    unittest.main()
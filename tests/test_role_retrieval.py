@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+import faiss
+import numpy as np
+from app.services.rag.knowledge_retrieval import KnowledgeRetrieval
+from app.services.rag.role_retrieval import RoleContextRetriever
+from app.services.agent.roles import ROLE_DEFINITIONS, retrieval_query
+from app.services.agent.transcript import DiscussionTranscript
+from app.schemas.agent import Agent, AgentRole
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+
+class FocusEncoder:
+    """Tiny stand-in for the sentence transformer: one axis per role focus word"""
+
+    KEYWORDS = ["evidence", "risks", "novel"]
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, normalize_embeddings=False):
+        self.batches.append(list(texts))
+        vectors = np.array([
+            [text.lower().count(keyword) + 0.01 for keyword in self.KEYWORDS]
+            for text in texts
+        ], dtype="float32")
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+class TestRoleRetrieval(unittest.TestCase):
+    """Test cases for per-role retrieval queries searched in one batch"""
+
+    def setUp(self):
+        """Set up a knowledge base and agents"""
+        self.original_per_round = settings.ROLE_RETRIEVAL_PER_ROUND
+        self.encoder = FocusEncoder()
+        self.knowledge_retrieval = KnowledgeRetrieval()
+        self.knowledge_retrieval.model = self.encoder
+        self.knowledge_retrieval.index = faiss.IndexFlatL2(len(FocusEncoder.KEYWORDS))
+        self.knowledge_retrieval.documents = [
+            {"id": "evidence", "content": "Studies give evidence", "metadata": {}},
+            {"id": "risks", "content": "Known risks", "metadata": {}},
+            {"id": "novel", "content": "A novel approach", "metadata": {}}
+        ]
+        self.knowledge_retrieval.index.add(self.encoder.encode([doc["content"] for doc in self.knowledge_retrieval.documents]))
+        self.encoder.batches.clear()
+        self.agents = [
+            Agent(
+                id=role.value,
+                name=ROLE_DEFINITIONS[role].name,
+                role=role,
+                description=ROLE_DEFINITIONS[role].description,
+                prompt_template=ROLE_DEFINITIONS[role].render("testing")
+            )
+            for role in (AgentRole.RESEARCHER, AgentRole.CRITIC, AgentRole.CREATIVE)
+        ]
+
+    def tearDown(self):
+        settings.ROLE_RETRIEVAL_PER_ROUND = self.original_per_round
+
+    def test_queries_are_searched_in_one_batch(self):
+        """Test that several queries take one encode call and match single searches"""
+        queries = ["evidence please", "risks please", "evidence please", "novel please"]
+
+        async def run():
+            batched = await self.knowledge_retrieval.retrieve_contexts(queries, max_results=5)
+            single = [await self.knowledge_retrieval.retrieve_context(query, max_results=5) for query in queries]
+            return batched, single
+
+        batched, single = asyncio.run(run())
+
+        self.assertEqual(self.encoder.batches[0], ["evidence please", "risks please", "novel please"])
+        self.assertEqual(batched, single)
+        self.assertEqual(len(batched[0]), 3)  # -1 padding is skipped
+        self.assertEqual([context[0]["id"] for context in batched], ["evidence", "risks", "evidence", "novel"])
+        self.assertIsNot(batched[0], batched[2])
+        self.assertGreater(batched[0][0]["relevance"], batched[0][1]["relevance"])
+        self.assertAlmostEqual(batched[0][0]["relevance"], 1.0, places=3)
+
+    def test_agents_get_role_specific_context_per_round(self):
+        """Test that each role's context follows its focus, with one search per round"""
+        transcript = DiscussionTranscript()
+        extra = [{"id": "memory", "content": "An earlier synthesis"}]
+        retriever = RoleContextRetriever(self.knowledge_retrieval, self.agents, "What should we do?", transcript, extra)
+
+        async def run():
+            first = await asyncio.gather(*[retriever.context_for(agent.id, 0) for agent in self.agents])
+            transcript.append(ChatMessage(
+                thread_id="thread",
+                sender_type="agent",
+                sender_id="critic",
+                content="Mind the risks here",
+                metadata={"role": AgentRole.CRITIC}
+            ))
+            second = await asyncio.gather(*[retriever.context_for(agent.id, 1) for agent in self.agents])
+            return first, second
+
+        first, second = asyncio.run(run())
+
+        self.assertEqual(len(self.encoder.batches), 2)
+        self.assertEqual([context[0]["id"] for context in first], ["evidence", "risks", "novel"])
+        self.assertTrue(all(context[-1]["id"] == "memory" for context in first + second))
+        self.assertIn("Critic: Mind the risks here", self.encoder.batches[1][0])
+        self.assertEqual(
+            self.encoder.batches[0][0],
+            retrieval_query(AgentRole.RESEARCHER, "What should we do?")
+        )
+
+    def test_rounds_can_reuse_first_search(self):
+        """Test that with per-round retrieval off, every round shares one search"""
+        settings.ROLE_RETRIEVAL_PER_ROUND = False
+        retriever = RoleContextRetriever(self.knowledge_retrieval, self.agents, "What now?", DiscussionTranscript())
+
+        async def run():
+            for round_num in range(3):
+                await retriever.context_for(self.agents[0].id, round_num)
+
+        asyncio.run(run())
+
+        self.assertEqual(len(self.encoder.batches), 1)
+
+if __name__ == '__main__':
+    unittest.main()
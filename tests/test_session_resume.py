@@ -0,0 +1,79 @@
+import unittest
+import asyncio
+import json
+from app.services.chat.thread_manager import ThreadManager
+from app.services.chat.resume_buffer import ResumeBuffer
+from app.services.chat.frames import FrameEncoding, catchup_frame
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+
+class TestSessionResume(unittest.TestCase):
+    """Test cases for resuming websocket sessions from a sequence cursor"""
+
+    def setUp(self):
+        """Set up a thread with more messages than the resume buffer holds"""
+        self.thread_manager = ThreadManager()
+        self.resume_buffer = ResumeBuffer(self.thread_manager, size=10)
+        self.thread_manager.add_message_listener(self.resume_buffer.append)
+        self.thread_id = asyncio.run(self.thread_manager.create_thread("Resume Test"))
+
+        self.message_ids = []
+        for i in range(25):
+            message = ChatMessage(
+                thread_id=self.thread_id,
+                sender_type="user",
+                sender_id="test_user",
+                content=f"Message {i + 1}"
+            )
+            asyncio.run(self.thread_manager.add_message(message))
+            self.message_ids.append(message.id)
+
+        self.original_page_size = settings.WS_RESUME_PAGE_SIZE
+        settings.WS_RESUME_PAGE_SIZE = 4
+
+    def tearDown(self):
+        settings.WS_RESUME_PAGE_SIZE = self.original_page_size
+
+    def test_sequence_numbers(self):
+        """Test that messages are numbered by position in their thread"""
+        self.assertEqual(self.thread_manager.last_seq(self.thread_id), 25)
+        self.assertEqual(self.thread_manager.find_seq(self.thread_id, self.message_ids[19]), 20)
+        self.assertIsNone(self.thread_manager.find_seq(self.thread_id, "unknown"))
+
+    def test_recent_gap_served_from_buffer(self):
+        """Test that a small gap is sent as a single page from the buffer"""
+        pages = list(self.resume_buffer.catchup(self.thread_id, 20))
+
+        self.assertEqual(len(pages), 1)
+        records, last_seq, complete = pages[0]
+        self.assertEqual([record.seq for record in records], [21, 22, 23, 24, 25])
+        self.assertEqual(last_seq, 25)
+        self.assertTrue(complete)
+
+    def test_old_gap_paginated_from_storage(self):
+        """Test that a gap older than the buffer is read from storage in pages"""
+        pages = list(self.resume_buffer.catchup(self.thread_id, 5))
+
+        seqs = [record.seq for records, _, _ in pages for record in records]
+        self.assertEqual(seqs, list(range(6, 26)))
+        self.assertEqual([len(records) for records, _, _ in pages], [4, 4, 4, 4, 4])
+        self.assertEqual([complete for _, _, complete in pages], [False] * 4 + [True])
+
+    def test_up_to_date_client(self):
+        """Test that a client that missed nothing gets an empty catch-up"""
+        pages = list(self.resume_buffer.catchup(self.thread_id, 25))
+
+        self.assertEqual(pages, [([], 25, True)])
+
+    def test_catchup_frame(self):
+        """Test the catch-up frame layout"""
+        records, last_seq, complete = next(self.resume_buffer.catchup(self.thread_id, 23))
+        frame = json.loads(catchup_frame(records, last_seq, complete).encode(FrameEncoding.JSON))
+
+        self.assertEqual(frame["type"], "thread_catchup")
+        self.assertEqual(frame["last_seq"], 25)
+        self.assertTrue(frame["complete"])
+        self.assertEqual([msg["content"] for msg in frame["messages"]], ["Message 24", "Message 25"])
+
+if __name__ == '__main__':
+    unittest.main()
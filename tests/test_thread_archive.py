@@ -0,0 +1,118 @@
+import unittest
+import asyncio
+import json
+from app.services.chat.thread_manager import ThreadManager
+from app.services.chat.archive import ThreadArchive, ArchiveFormatError
+from app.schemas.chat import ChatMessage
+from app.core.config import settings
+
+async def collect(stream):
+    """Collect an async byte stream into a list of chunks"""
+    return [chunk async for chunk in stream]
+
+async def replay(chunks):
+    """Turn a list of chunks back into an async byte stream"""
+    for chunk in chunks:
+        yield chunk
+
+class TestThreadArchive(unittest.TestCase):
+    """Test cases for NDJSON thread export and import"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.source = ThreadManager()
+        self.thread_id = asyncio.run(self.source.create_thread("Archive Test"))
+
+        for i in range(25):
+            asyncio.run(self.source.add_message(ChatMessage(
+                thread_id=self.thread_id,
+                sender_type="agent",
+                sender_id=f"agent_{i % 3}",
+                content=f"Message {i}",
+                metadata={"role": "critic", "round": i % 2}
+            )))
+
+    def test_export_format(self):
+        """Test that the export is one thread line followed by message lines"""
+        chunks = asyncio.run(collect(ThreadArchive(self.source).export_ndjson()))
+        lines = b"".join(chunks).decode().splitlines()
+
+        self.assertEqual(len(lines), 26)
+        self.assertEqual(json.loads(lines[0])["type"], "thread")
+        self.assertEqual(json.loads(lines[1])["message"]["content"], "Message 0")
+
+    def test_round_trip(self):
+        """Test that an exported archive imports into an identical copy"""
+        chunks = asyncio.run(collect(ThreadArchive(self.source).export_ndjson()))
+
+        # Re-split the stream at arbitrary byte boundaries
+        data = b"".join(chunks)
+        pieces = [data[i:i + 97] for i in range(0, len(data), 97)]
+
+        target = ThreadManager()
+        result = asyncio.run(ThreadArchive(target).import_ndjson(replay(pieces)))
+
+        self.assertEqual(result["created_threads"], [self.thread_id])
+        self.assertEqual(result["messages"], 25)
+
+        original = asyncio.run(self.source.get_messages(self.thread_id))
+        imported = asyncio.run(target.get_messages(self.thread_id))
+        self.assertEqual(
+            [msg.model_dump() for msg in imported],
+            [msg.model_dump() for msg in original]
+        )
+
+    def test_malformed_line(self):
+        """Test that a malformed line reports its line number"""
+        target = ThreadManager()
+        chunks = [b'{"type": "thread", "thread": {"id": "t1", "topic": "x"}}\n', b'not json\n']
+
+        created = []
+
+        with self.assertRaises(ArchiveFormatError) as error:
+            asyncio.run(ThreadArchive(target).import_ndjson(replay(chunks), created))
+        self.assertEqual(error.exception.line_number, 2)
+        self.assertEqual(created, ["t1"])
+
+    def test_reimport_skips_existing_messages(self):
+        """Test that importing the same archive twice does not duplicate messages"""
+        data = b"".join(asyncio.run(collect(ThreadArchive(self.source).export_ndjson())))
+        target = ThreadManager()
+        archive = ThreadArchive(target)
+
+        first = asyncio.run(archive.import_ndjson(replay([data])))
+        second = asyncio.run(archive.import_ndjson(replay([data, data])))
+
+        self.assertEqual((first["messages"], first["skipped_messages"]), (25, 0))
+        self.assertEqual(second["created_threads"], [])
+        self.assertEqual((second["messages"], second["skipped_messages"]), (0, 50))
+        self.assertEqual(target.last_seq(self.thread_id), 25)
+        self.assertEqual(asyncio.run(target.search_messages("Message"))["total"], 25)
+
+    def test_import_adds_only_new_messages_to_existing_thread(self):
+        """Test that a grown archive appends just its new messages, batch by batch"""
+        target = ThreadManager()
+        archive = ThreadArchive(target)
+        original_batch_size = settings.ARCHIVE_IMPORT_BATCH_SIZE
+        settings.ARCHIVE_IMPORT_BATCH_SIZE = 4
+        try:
+            asyncio.run(archive.import_ndjson(replay(asyncio.run(collect(ThreadArchive(self.source).export_ndjson())))))
+            for i in range(5):
+                asyncio.run(self.source.add_message(ChatMessage(
+                    thread_id=self.thread_id,
+                    sender_type="user",
+                    sender_id="test_user",
+                    content=f"Later {i}"
+                )))
+            result = asyncio.run(archive.import_ndjson(replay(asyncio.run(collect(ThreadArchive(self.source).export_ndjson())))))
+        finally:
+            settings.ARCHIVE_IMPORT_BATCH_SIZE = original_batch_size
+
+        self.assertEqual((result["messages"], result["skipped_messages"]), (5, 25))
+        self.assertEqual(
+            [msg.id for msg in asyncio.run(target.get_messages(self.thread_id))],
+            [msg.id for msg in asyncio.run(self.source.get_messages(self.thread_id))]
+        )
+
+if __name__ == '__main__':
+    unittest.main()
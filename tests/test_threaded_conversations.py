@@ -146,5 +146,55 @@ class TestThreadedConversations(unittest.TestCase):
         self.assertIn("Thread B", thread_topics)
         self.assertIn("Thread C", thread_topics)
 
+    def test_message_round_trip(self):
+        """Test that stored messages are returned unchanged"""
+        # Run async setup
+        asyncio.run(self.async_setUp())
+        
+        # Create an agent message with metadata
+        agent_message = ChatMessage(
+            thread_id=self.thread_id,
+            sender_type="agent",
+            sender_id="agent_1",
+            content="Round trip",
+            parent_id="not-a-uuid",
+            metadata={"role": "critic", "round": 1}
+        )
+        
+        asyncio.run(self.thread_manager.add_message(agent_message))
+        
+        # Verify all fields survive storage
+        messages = asyncio.run(self.thread_manager.get_messages(self.thread_id))
+        self.assertEqual(messages[0].model_dump(), agent_message.model_dump())
+        
+        # Verify returned metadata can be modified without affecting storage
+        messages[0].metadata["round"] = 2
+        messages = asyncio.run(self.thread_manager.get_messages(self.thread_id))
+        self.assertEqual(messages[0].metadata["round"], 1)
+
+    def test_record_dict_does_not_expose_shared_metadata(self):
+        """Test that serialized records cannot change metadata shared between messages"""
+        # Run async setup
+        asyncio.run(self.async_setUp())
+        
+        # Store two messages with identical metadata
+        for content in ("First", "Second"):
+            asyncio.run(self.thread_manager.store_message(ChatMessage(
+                thread_id=self.thread_id,
+                sender_type="agent",
+                sender_id="agent_1",
+                content=content,
+                metadata={"role": "critic", "round": 1}
+            )))
+        first, second = self.thread_manager.get_message_records(self.thread_id)
+        
+        # Verify editing one serialized record leaves the other message alone
+        first.to_dict()["metadata"]["round"] = 2
+        self.assertEqual(second.to_dict()["metadata"]["round"], 1)
+        
+        # Verify the stored metadata itself is read-only
+        with self.assertRaises(TypeError):
+            first.metadata["round"] = 2
+
 if __name__ == '__main__':
     unittest.main()